@@ -0,0 +1,191 @@
+"""
+Cold-start benchmark for the Python handlers
+
+Imports each <function>/lambda_function.py in a fresh interpreter with
+-X importtime, once with LAZY_IMPORTS=false and once with lazy imports on
+(the default), and reports per function:
+  - init time: wall time of `import lambda_function`, module-level code
+    (config parsing, client placeholders) included
+  - the packages that cost the most import time in lazy mode
+
+The lazy - eager delta is what the lazy-import mode saves on a cold start.
+--save writes the results as a baseline; --baseline compares against one
+and exits 1 when a function's lazy init time grows by more than
+--threshold-ms, so import-time regressions show up before a deploy.
+
+Run from lambda-functions/ with the functions' requirements installed:
+    python benchmark_cold_start.py
+    python benchmark_cold_start.py processImage updateUserProfile --runs 9
+    python benchmark_cold_start.py --save cold_start.json
+    python benchmark_cold_start.py --baseline cold_start.json --threshold-ms 25
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MARKER = '--- handler import ---'
+CHILD = (
+    'import sys, time\n'
+    f'sys.stderr.write({MARKER!r} + "\\n"); sys.stderr.flush()\n'
+    'start = time.perf_counter()\n'
+    'import lambda_function\n'
+    'print(f"INIT_MS {(time.perf_counter() - start) * 1000:.3f}")\n'
+)
+# Keeps module-level setup offline: placeholder credentials and no
+# instance metadata lookups
+CHILD_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'AWS_EC2_METADATA_DISABLED': 'true',
+}
+
+
+def discover() -> List[str]:
+    return sorted(
+        name for name in os.listdir(ROOT)
+        if os.path.isfile(os.path.join(ROOT, name, 'lambda_function.py'))
+    )
+
+
+def _parse_importtime(stderr: str) -> Dict[str, float]:
+    """Self time (ms) per top-level package for imports made by the handler"""
+    per_package: Dict[str, float] = defaultdict(float)
+    seen_marker = False
+
+    for line in stderr.splitlines():
+        if line == MARKER:
+            seen_marker = True
+            continue
+        if not seen_marker or not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header row
+        package = fields[2].strip().split('.')[0]
+        per_package[package] += int(fields[0]) / 1000
+
+    return dict(per_package)
+
+
+def measure_once(function: str, lazy: bool) -> Tuple[float, Dict[str, float]]:
+    """
+    One cold import in a fresh interpreter
+
+    Raises:
+        RuntimeError: If the handler fails to import
+    """
+    env = {**os.environ, **CHILD_ENV}
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    env['LAZY_IMPORTS'] = 'true' if lazy else 'false'
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD],
+        cwd=os.path.join(ROOT, function),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    init_lines = [line for line in result.stdout.splitlines() if line.startswith('INIT_MS ')]
+    if result.returncode != 0 or not init_lines:
+        error = (result.stderr.strip().splitlines() or ['no output'])[-1]
+        raise RuntimeError(error)
+
+    return float(init_lines[-1].split()[1]), _parse_importtime(result.stderr)
+
+
+def measure(function: str, runs: int) -> Dict[str, Any]:
+    """Median init time in both modes, plus lazy-mode per-package import times"""
+    results: Dict[str, Any] = {}
+
+    for lazy in (False, True):
+        measure_once(function, lazy)  # warm the bytecode cache
+        samples = [measure_once(function, lazy) for _ in range(runs)]
+        results['lazyMs' if lazy else 'eagerMs'] = round(statistics.median(ms for ms, _ in samples), 2)
+
+        if lazy:
+            packages: Dict[str, List[float]] = defaultdict(list)
+            for _, per_package in samples:
+                for package, ms in per_package.items():
+                    packages[package].append(ms)
+            results['packagesMs'] = {
+                package: round(statistics.median(values), 2)
+                for package, values in sorted(packages.items(), key=lambda item: -statistics.median(item[1]))
+            }
+
+    results['deltaMs'] = round(results['lazyMs'] - results['eagerMs'], 2)
+    return results
+
+
+def report(results: Dict[str, Dict[str, Any]], top: int) -> None:
+    print(f'{"function":<24}{"eager ms":>10}{"lazy ms":>10}{"delta ms":>10}  top imports (lazy, ms)')
+    for function, result in results.items():
+        if 'error' in result:
+            print(f'{function:<24}{"failed to import: " + result["error"]}')
+            continue
+        heaviest = ', '.join(
+            f'{package} {ms:.0f}' for package, ms in list(result['packagesMs'].items())[:top]
+        )
+        print(f'{function:<24}{result["eagerMs"]:>10.1f}{result["lazyMs"]:>10.1f}{result["deltaMs"]:>+10.1f}  {heaviest}')
+
+
+def regressions(
+        results: Dict[str, Dict[str, Any]],
+        baseline: Dict[str, Dict[str, Any]],
+        threshold_ms: float
+) -> List[str]:
+    found: List[str] = []
+    for function, result in results.items():
+        before: Optional[Dict[str, Any]] = baseline.get(function)
+        if not before or 'lazyMs' not in before or 'lazyMs' not in result:
+            continue
+        growth = result['lazyMs'] - before['lazyMs']
+        if growth > threshold_ms:
+            found.append(f'{function}: {before["lazyMs"]:.1f} -> {result["lazyMs"]:.1f} ms (+{growth:.1f})')
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Measure handler cold-start import and init time')
+    parser.add_argument('functions', nargs='*', help='Function directories (default: all Python handlers)')
+    parser.add_argument('--runs', type=int, default=5, help='Cold imports per mode; the median is reported')
+    parser.add_argument('--top', type=int, default=4, help='Heaviest packages listed per function')
+    parser.add_argument('--save', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against a JSON file written by --save')
+    parser.add_argument('--threshold-ms', type=float, default=25.0, help='Allowed lazy init growth over baseline')
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for function in args.functions or discover():
+        try:
+            results[function] = measure(function, max(1, args.runs))
+        except Exception as e:
+            results[function] = {'error': str(e)}
+
+    report(results, args.top)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Saved {args.save}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.threshold_ms)
+        for line in found:
+            print(f'REGRESSION {line}')
+        if found:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Dict, Any, Optional, TYPE_CHECKING
+from datetime import datetime, timezone
+if TYPE_CHECKING:
+    from mypy_boto3_dynamodb import DynamoDBClient
+    from mypy_boto3_s3 import S3Client
+
+from shared.python.responses import success_response
+from shared.python.env_config import get_optional_env
+from shared.python.aws_clients import lazy_client
+from shared.python.checkpoint import load_checkpoint, save_checkpoint, clear_checkpoint
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+from shared.python.profiling import profiler
+
+from sweeper import Progress, SegmentSweeper, SweepStats
+
+VERIFICATION_TOKENS_TABLE = get_optional_env('VERIFICATION_TOKENS_TABLE', 'VerificationTokens')
+# Parallel Scan segments, one worker each
+TOTAL_SEGMENTS = int(get_optional_env('TOTAL_SEGMENTS', '4'))
+dynamodb: DynamoDBClient = lazy_client('dynamodb', max_pool_connections=max(1, TOTAL_SEGMENTS))
+s3: S3Client = lazy_client('s3')
+# Per-segment resume keys are saved here so a run that hits the Lambda
+# timeout continues where it stopped (no checkpointing without a bucket)
+CHECKPOINT_BUCKET = get_optional_env('CHECKPOINT_BUCKET')
+CHECKPOINT_KEY = get_optional_env('CHECKPOINT_KEY', 'sweeper/verification-tokens.json')
+CHECKPOINT_INTERVAL_S = 10
+# Stop starting new pages once less than this much time is left
+TIME_SAFETY_MS = 30_000
+
+
+@metrics.handler
+@logger.handler
+@profiler.handler
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Deletes expired verification tokens (sweeper job).
+    Triggered daily by EventBridge cron, alongside cleanupOldUploads.
+    Pass {"dryRun": true} to count without deleting, and
+    {"backfillTtl": true} (or BACKFILL_TTL=true) to also set the native
+    "ttl" attribute on live rows written before it existed.
+    """
+    logger.event(event)
+
+    dry_run = bool(event.get('dryRun')) or get_optional_env('DRY_RUN', 'false').lower() == 'true'
+    backfill_ttl = bool(event.get('backfillTtl')) or get_optional_env('BACKFILL_TTL', 'false').lower() == 'true'
+
+    try:
+        return _run_sweep(dry_run, backfill_ttl, context)
+
+    except Exception as e:
+        logger.error('Sweep error: %s', e)
+        return success_response({
+            'message': 'Sweep failed',
+            'error': str(e)
+        })
+
+
+def _remaining_ms(context: Any) -> float:
+    """Time left in this invocation (unbounded when run outside Lambda)"""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return float('inf')
+    return context.get_remaining_time_in_millis()
+
+
+def _run_sweep(dry_run: bool, backfill_ttl: bool, context: Any) -> Dict[str, Any]:
+    """
+    Runs one worker per Scan segment. Each pages through its segment,
+    deleting expired rows 25 at a time under its own adaptive backoff.
+    """
+    start = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    use_checkpoint = bool(CHECKPOINT_BUCKET) and not dry_run
+
+    keys: Dict[int, Optional[Dict[str, Any]]] = {segment: None for segment in range(TOTAL_SEGMENTS)}
+    base = SweepStats()
+
+    checkpoint = load_checkpoint(s3, CHECKPOINT_BUCKET, CHECKPOINT_KEY) if use_checkpoint else None  # type: ignore
+    if checkpoint and checkpoint.get('totalSegments') == TOTAL_SEGMENTS:
+        keys = {int(segment): key or None for segment, key in checkpoint.get('segments', {}).items()}
+        base = SweepStats(**checkpoint.get('stats', {}))
+        logger.info('Resuming %s segments from checkpoint: %s already deleted', len(keys), base.deleted)
+
+    def save(state: Dict[str, Any]) -> None:
+        if use_checkpoint:
+            state.update({'totalSegments': TOTAL_SEGMENTS, 'updatedAt': datetime.now(timezone.utc).isoformat()})
+            save_checkpoint(s3, CHECKPOINT_BUCKET, CHECKPOINT_KEY, state)  # type: ignore
+
+    progress = Progress(keys, base, save, CHECKPOINT_INTERVAL_S)
+
+    def should_stop() -> bool:
+        return _remaining_ms(context) < TIME_SAFETY_MS
+
+    def sweep(segment: int) -> Optional[Dict[str, Any]]:
+        sweeper = SegmentSweeper(
+            dynamodb, VERIFICATION_TOKENS_TABLE, segment, TOTAL_SEGMENTS, now, dry_run, backfill_ttl  # type: ignore
+        )
+        resume_key = sweeper.run(keys[segment], should_stop, progress.update)
+        # Also records stats of a segment that stopped before its first page
+        progress.update(segment, resume_key, sweeper.stats)
+        return resume_key
+
+    with ThreadPoolExecutor(max_workers=max(1, len(keys))) as executor:
+        remaining = [key for key in executor.map(sweep, keys) if key is not None]
+
+    completed = not remaining
+    stats = progress.totals()
+
+    if use_checkpoint:
+        if completed:
+            # Also removes checkpoints saved mid-run
+            clear_checkpoint(s3, CHECKPOINT_BUCKET, CHECKPOINT_KEY)  # type: ignore
+        else:
+            save(progress.snapshot())
+
+    elapsed_s = time.perf_counter() - start
+    metrics.count('Scanned', stats.scanned)
+    metrics.count('Expired', stats.expired)
+    metrics.count('Deleted', stats.deleted)
+    metrics.count('Backfilled', stats.backfilled)
+    metrics.count('SweepErrors', stats.errors)
+    metrics.count('Throttled', stats.throttled)
+    status = 'complete' if completed else f'paused with {len(remaining)} segments left'
+    action = 'would be deleted' if dry_run else 'deleted'
+    count = stats.expired if dry_run else stats.deleted
+    logger.info(
+        '%sSweep %s: %s %s, %s TTL backfilled, %s errors, %s throttled, %s scanned in %.1fs',
+        '[DRY RUN] ' if dry_run else '', status, count, action,
+        stats.backfilled, stats.errors, stats.throttled, stats.scanned, elapsed_s
+    )
+
+    return success_response({
+        'message': f'Sweep {status}: {count} {action}, {stats.errors} errors',
+        'dryRun': dry_run,
+        **asdict(stats),
+        'completed': completed
+    })
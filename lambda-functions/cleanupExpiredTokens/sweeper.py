@@ -0,0 +1,310 @@
+"""
+Segmented scan + batch delete engine for the expired token sweeper
+"""
+from __future__ import annotations
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, TYPE_CHECKING
+from botocore.exceptions import ClientError
+if TYPE_CHECKING:
+    from mypy_boto3_dynamodb import DynamoDBClient
+
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+
+# BatchWriteItem accepts at most 25 requests
+WRITE_BATCH_SIZE = 25
+THROTTLE_CODES = (
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded'
+)
+# Rows without expiresAt (signed-token markers) are left to native TTL
+PROJECTION = '#token, expiresAt, #ttl'
+ATTRIBUTE_NAMES = {'#token': 'token', '#ttl': 'ttl'}
+
+
+@dataclass
+class SweepStats:
+    """Counters for one segment or a whole run"""
+
+    scanned: int = 0
+    expired: int = 0
+    deleted: int = 0
+    backfilled: int = 0
+    errors: int = 0
+    throttled: int = 0
+
+    def add(self, other: 'SweepStats') -> None:
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+
+class AdaptiveBackoff:
+    """
+    Per-worker pacing: the delay doubles (with jitter) on every throttle
+    and halves on every clean call, so a worker settles just under the
+    table's capacity instead of retrying at full speed.
+    """
+
+    def __init__(self, base_s: float = 0.05, max_s: float = 5.0):
+        self.base_s = base_s
+        self.max_s = max_s
+        self.delay_s = 0.0
+
+    def wait(self) -> None:
+        if self.delay_s:
+            time.sleep(self.delay_s * random.uniform(0.5, 1.0))
+
+    def throttled(self) -> None:
+        self.delay_s = min(self.max_s, max(self.base_s, self.delay_s * 2))
+
+    def succeeded(self) -> None:
+        self.delay_s = self.delay_s / 2 if self.delay_s > self.base_s else 0.0
+
+
+def _is_throttle(error: ClientError) -> bool:
+    return error.response.get('Error', {}).get('Code') in THROTTLE_CODES
+
+
+class SegmentSweeper:
+    """
+    Scans one segment of the tokens table, deletes expired rows 25 at a
+    time and optionally backfills the native TTL attribute on live rows.
+
+    Not thread-safe: use one per segment.
+    """
+
+    def __init__(
+            self,
+            dynamodb: DynamoDBClient,
+            table: str,
+            segment: int,
+            total_segments: int,
+            now: datetime,
+            dry_run: bool = False,
+            backfill_ttl: bool = False
+    ):
+        self.dynamodb = dynamodb
+        self.table = table
+        self.segment = segment
+        self.total_segments = total_segments
+        self.now_iso = now.isoformat()
+        self.dry_run = dry_run
+        self.backfill_ttl = backfill_ttl
+        self.stats = SweepStats()
+        self.backoff = AdaptiveBackoff()
+        self._pending: List[Dict[str, Any]] = []
+
+    def run(
+            self,
+            start_key: Optional[Dict[str, Any]],
+            should_stop: Callable[[], bool],
+            on_page: Callable[[int, Optional[Dict[str, Any]], SweepStats], None]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Scans from start_key until the segment ends or should_stop()
+
+        Args:
+            start_key: ExclusiveStartKey to resume from, None for the start
+            should_stop: Checked before every page
+            on_page: Called after every page with (segment, next key, stats)
+
+        Returns:
+            Key to resume from ({} = from the start), or None if the
+            segment is finished
+        """
+        params: Dict[str, Any] = {
+            'TableName': self.table,
+            'Segment': self.segment,
+            'TotalSegments': self.total_segments,
+            'ProjectionExpression': PROJECTION,
+            'ExpressionAttributeNames': ATTRIBUTE_NAMES
+        }
+        if not self.backfill_ttl:
+            # Only expired rows come back; backfill needs live rows too
+            params['FilterExpression'] = 'expiresAt < :now'
+            params['ExpressionAttributeValues'] = {':now': {'S': self.now_iso}}
+
+        last_key = start_key
+
+        while not should_stop():
+            if last_key:
+                params['ExclusiveStartKey'] = last_key
+
+            with metrics.phase('Scan'):
+                page = self._call(lambda: self.dynamodb.scan(**params))
+            if page is None:
+                # Throttled out of retries: resume here next run
+                break
+            self.backoff.succeeded()
+
+            for item in page.get('Items', []):
+                self.stats.scanned += 1
+                self._handle(item)
+            self.flush()
+
+            last_key = page.get('LastEvaluatedKey')
+            on_page(self.segment, last_key, self.stats)
+
+            if not last_key:
+                return None
+
+        return last_key or {}
+
+    def _handle(self, item: Dict[str, Any]) -> None:
+        expires_at = item.get('expiresAt', {}).get('S')
+        if not expires_at:
+            return
+
+        if expires_at < self.now_iso:
+            self.stats.expired += 1
+            self._pending.append({'DeleteRequest': {'Key': {'token': item['token']}}})
+            if len(self._pending) >= WRITE_BATCH_SIZE:
+                self.flush()
+        elif self.backfill_ttl and 'ttl' not in item:
+            self._backfill(item['token'], expires_at)
+
+    def _backfill(self, token: Dict[str, Any], expires_at: str) -> None:
+        try:
+            ttl = int(datetime.fromisoformat(expires_at.replace('Z', '+00:00')).timestamp())
+        except ValueError:
+            return
+
+        if self.dry_run:
+            self.stats.backfilled += 1
+            return
+
+        try:
+            response = self._call(lambda: self.dynamodb.update_item(
+                TableName=self.table,
+                Key={'token': token},
+                UpdateExpression='SET #ttl = :ttl',
+                ConditionExpression='attribute_exists(#token)',
+                ExpressionAttributeNames={'#token': 'token', '#ttl': 'ttl'},
+                ExpressionAttributeValues={':ttl': {'N': str(ttl)}}
+            ), raise_errors=True)
+            if response is not None:
+                self.backoff.succeeded()
+                self.stats.backfilled += 1
+        except ClientError as e:
+            # Row consumed by verifyEmail meanwhile: nothing to backfill
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                logger.error('TTL backfill error: %s', e)
+                self.stats.errors += 1
+
+    def flush(self) -> None:
+        """Deletes pending rows, retrying unprocessed items with backoff"""
+        if not self._pending:
+            return
+
+        requests, self._pending = self._pending, []
+
+        if self.dry_run:
+            return
+
+        for _ in range(8):
+            with metrics.phase('Delete'):
+                response = self._call(
+                    lambda: self.dynamodb.batch_write_item(RequestItems={self.table: requests})  # type: ignore
+                )
+            if response is None:
+                break
+
+            unprocessed = response.get('UnprocessedItems', {}).get(self.table, [])
+            self.stats.deleted += len(requests) - len(unprocessed)
+            if not unprocessed:
+                self.backoff.succeeded()
+                return
+
+            # Partial success is DynamoDB's throttle signal for batch writes
+            requests = unprocessed  # type: ignore[assignment]
+            self.stats.throttled += 1
+            self.backoff.throttled()
+
+        logger.info('Giving up on %s deletes in segment %s', len(requests), self.segment)
+        self.stats.errors += len(requests)
+
+    def _call(self, request: Callable[[], Any], raise_errors: bool = False) -> Any:
+        """
+        Runs a DynamoDB call under the adaptive backoff, retrying throttles.
+        Callers report a clean result to the backoff themselves, since a
+        batch write can succeed and still be throttled.
+
+        Returns:
+            The response, or None once throttling retries are exhausted
+            (or on any other error unless raise_errors)
+        """
+        for _ in range(8):
+            self.backoff.wait()
+            try:
+                return request()
+            except ClientError as e:
+                if not _is_throttle(e):
+                    if raise_errors:
+                        raise
+                    logger.error('DynamoDB error in segment %s: %s', self.segment, e)
+                    self.stats.errors += 1
+                    return None
+                self.stats.throttled += 1
+                self.backoff.throttled()
+
+        logger.info('Segment %s still throttled after retries', self.segment)
+        return None
+
+
+class Progress:
+    """
+    Shared per-segment resume keys and stats. Workers report after every
+    page; the state is handed to save() at most every interval_s.
+    """
+
+    def __init__(
+            self,
+            keys: Dict[int, Optional[Dict[str, Any]]],
+            base: SweepStats,
+            save: Callable[[Dict[str, Any]], None],
+            interval_s: float
+    ):
+        self.keys = dict(keys)
+        self.done: Set[int] = set()
+        self.base = base
+        self.stats: Dict[int, SweepStats] = {}
+        self._save = save
+        self._interval_s = interval_s
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, segment: int, last_key: Optional[Dict[str, Any]], stats: SweepStats) -> None:
+        with self._lock:
+            self.keys[segment] = last_key
+            if last_key is None:
+                self.done.add(segment)
+            self.stats[segment] = stats
+            if time.monotonic() - self._last_save >= self._interval_s:
+                self._save(self.snapshot())
+                self._last_save = time.monotonic()
+
+    def totals(self) -> SweepStats:
+        """Stats of earlier runs plus this one"""
+        total = SweepStats(**asdict(self.base))
+        for stats in list(self.stats.values()):
+            total.add(stats)
+        return total
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        JSON-serializable state. Unfinished segments map to their resume
+        key ({} = from the start); finished segments are dropped.
+        """
+        return {
+            'segments': {
+                str(segment): key or {}
+                for segment, key in self.keys.items()
+                if segment not in self.done
+            },
+            'stats': asdict(self.totals())
+        }
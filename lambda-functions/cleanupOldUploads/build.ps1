@@ -4,7 +4,7 @@ Remove-Item cleanUpOldUploads.zip -ErrorAction SilentlyContinue
 # use full python image for Pillow dependencies
 docker run --rm -v ${PWD}:/var/task python:3.14-slim pip install -r /var/task/requirements.txt -t /var/task/package/
 
-Copy-Item lambda_function.py package/ -Force
+Copy-Item lambda_function.py, deletion.py, manifest.py package/ -Force
 
 New-Item -ItemType Directory -Force -Path package/shared/python | Out-Null
 Copy-Item ../shared/python/*.py package/shared/python/ -Force
@@ -0,0 +1,194 @@
+"""
+Batched S3 deletion engine for the cleanup job
+"""
+from __future__ import annotations
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from typing import List, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+from shared.python.upload_keys import is_partition_segment
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+
+# DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+
+@dataclass
+class DeleteStats:
+    """Counters for one shard or a whole run"""
+
+    listed: int = 0
+    expired: int = 0
+    deleted: int = 0
+    errors: int = 0
+    expired_bytes: int = 0
+    delete_requests: int = 0
+
+    def add(self, other: 'DeleteStats') -> None:
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+
+class BatchDeleter:
+    """
+    Collects expired keys and removes them with DeleteObjects, 1000 per call.
+    In dry-run mode keys are only counted.
+
+    Not thread-safe: use one per worker.
+    """
+
+    def __init__(self, s3: S3Client, bucket: str, dry_run: bool = False):
+        self.s3 = s3
+        self.bucket = bucket
+        self.dry_run = dry_run
+        self.stats = DeleteStats()
+        self._pending: List[str] = []
+
+    def add(self, key: str, size: int = 0) -> None:
+        self.stats.expired += 1
+        self.stats.expired_bytes += size
+        self._pending.append(key)
+
+        if len(self._pending) >= DELETE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+
+        keys, self._pending = self._pending, []
+        self.stats.delete_requests += 1
+
+        if self.dry_run:
+            return
+
+        try:
+            with metrics.phase('Delete'):
+                response = self.s3.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={
+                        'Objects': [{'Key': key} for key in keys],
+                        'Quiet': True  # only errors are returned
+                    }
+                )
+            errors = response.get('Errors', [])
+            for error in errors[:5]:
+                logger.error('Error deleting %s: %s %s', error.get("Key"), error.get("Code"), error.get("Message"))
+            self.stats.errors += len(errors)
+            self.stats.deleted += len(keys) - len(errors)
+        except Exception as e:
+            logger.error('Error deleting batch of %s keys: %s', len(keys), e)
+            self.stats.errors += len(keys)
+
+
+def delete_keys(s3: S3Client, bucket: str, keys: List[Tuple[str, int]], dry_run: bool = False) -> DeleteStats:
+    """
+    Deletes an already-filtered list of (key, size) in 1000-key batches
+
+    Returns:
+        Stats for these keys
+    """
+    deleter = BatchDeleter(s3, bucket, dry_run)
+    for key, size in keys:
+        deleter.add(key, size)
+    deleter.flush()
+    return deleter.stats
+
+
+def clean_prefix(
+        s3: S3Client,
+        bucket: str,
+        prefix: str,
+        cutoff: datetime,
+        dry_run: bool = False
+) -> DeleteStats:
+    """
+    Lists one prefix and batch-deletes everything last modified before cutoff
+
+    Args:
+        s3: S3 client
+        bucket: Upload bucket
+        prefix: Shard prefix, e.g. uploads/user-123/
+        cutoff: Objects older than this are deleted
+        dry_run: Count only, don't delete
+
+    Returns:
+        Stats for this prefix
+    """
+    deleter = BatchDeleter(s3, bucket, dry_run)
+    paginator = s3.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            deleter.stats.listed += 1
+            key = obj.get('Key')
+            last_modified = obj.get('LastModified')
+
+            if key and last_modified and last_modified < cutoff:
+                deleter.add(key, obj.get('Size', 0))
+
+    deleter.flush()
+
+    if deleter.stats.expired:
+        action = 'Would delete' if dry_run else 'Deleted'
+        logger.info('%s %s of %s objects under %s', action, deleter.stats.expired, deleter.stats.listed, prefix)
+
+    return deleter.stats
+
+
+def _list_child_prefixes(s3: S3Client, bucket: str, prefix: str) -> List[str]:
+    paginator = s3.get_paginator('list_objects_v2')
+    return [
+        common['Prefix']
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/')
+        for common in page.get('CommonPrefixes', [])
+        if 'Prefix' in common
+    ]
+
+
+def expired_partitions(s3: S3Client, bucket: str, year_prefix: str, cutoff: datetime) -> List[str]:
+    """
+    Walks a dated upload partition (uploads/{yyyy}/) down to day prefixes
+    entirely older than cutoff, without listing any objects in newer
+    partitions
+
+    Args:
+        s3: S3 client
+        bucket: Upload bucket
+        year_prefix: e.g. uploads/2026/
+        cutoff: Objects older than this are deleted
+
+    Returns:
+        Day prefixes (uploads/{yyyy}/{mm}/{dd}/) that can be cleaned
+    """
+    year = int(year_prefix.rstrip('/').rsplit('/', 1)[-1])
+    cutoff_day = cutoff.date()
+
+    if year > cutoff_day.year:
+        return []
+
+    expired: List[str] = []
+
+    for month_prefix in _list_child_prefixes(s3, bucket, year_prefix):
+        month_segment = month_prefix.rstrip('/').rsplit('/', 1)[-1]
+        if not is_partition_segment(month_segment, 2):
+            continue
+        if (year, int(month_segment)) > (cutoff_day.year, cutoff_day.month):
+            continue
+
+        for day_prefix in _list_child_prefixes(s3, bucket, month_prefix):
+            day_segment = day_prefix.rstrip('/').rsplit('/', 1)[-1]
+            if not is_partition_segment(day_segment, 2):
+                continue
+
+            # The cutoff day itself is mixed; it is fully expired tomorrow
+            try:
+                if date(year, int(month_segment), int(day_segment)) < cutoff_day:
+                    expired.append(day_prefix)
+            except ValueError:
+                continue
+
+    return expired
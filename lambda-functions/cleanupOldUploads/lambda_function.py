@@ -1,68 +1,303 @@
-import json
-from typing import Dict, Any
+from __future__ import annotations
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Deque, Dict, Any, List, Optional, Tuple, TYPE_CHECKING
 from datetime import datetime, timezone, timedelta
-import boto3
-from mypy_boto3_s3 import S3Client
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
 
 from shared.python.responses import success_response
 from shared.python.env_config import get_optional_env
+from shared.python.aws_clients import lazy_client
+from shared.python.checkpoint import load_checkpoint, save_checkpoint, clear_checkpoint
+from shared.python.upload_keys import UPLOAD_PREFIX, is_partition_segment
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+from shared.python.profiling import profiler
 
-s3: S3Client = boto3.client('s3')  # type: ignore
+from deletion import (
+    BatchDeleter,
+    DeleteStats,
+    DELETE_BATCH_SIZE,
+    clean_prefix,
+    delete_keys,
+    expired_partitions
+)
+from manifest import iter_objects, load_manifest
 
 UPLOAD_BUCKET = get_optional_env('UPLOAD_BUCKET')
 DAYS_TO_KEEP = 7
 
+# User prefixes (uploads/{user_id}/) listed and deleted in parallel
+MAX_WORKERS = int(get_optional_env('MAX_WORKERS', '8'))
+
+# S3_ENDPOINT_URL points the job at a local S3 stand-in (MinIO, moto server)
+s3: S3Client = lazy_client(
+    's3', endpoint_url=get_optional_env('S3_ENDPOINT_URL'), max_pool_connections=max(1, MAX_WORKERS)
+)
+# Progress is saved here after every page of user prefixes so a run that
+# hits the Lambda timeout resumes where it stopped
+CHECKPOINT_KEY = get_optional_env('CHECKPOINT_KEY', 'cleanup/checkpoint.json')
+# Stop starting new pages once less than this much time is left
+TIME_SAFETY_MS = 30_000
+# Assumed DeleteObjects round-trip for dry-run duration estimates
+DRY_RUN_DELETE_LATENCY_MS = int(get_optional_env('DRY_RUN_DELETE_LATENCY_MS', '250'))
+
+
+@metrics.handler
+@logger.handler
+@profiler.handler
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Deletes old uploads from raw bucket (cleanup job).
     Triggered daily by EventBridge cron.
+    Pass {"dryRun": true} to report what would be deleted without deleting.
+    Pass {"mode": "manifest", "manifest": "s3://bucket/.../manifest.json"}
+    (or a local path) to purge from a CSV S3 Inventory report instead of
+    listing the bucket.
     """
-    print('Event:', json.dumps(event))
-    
+    logger.event(event)
+
     if not UPLOAD_BUCKET:
-        print('ERROR: UPLOAD_BUCKET not configured')
+        logger.error('UPLOAD_BUCKET not configured')
         return success_response({'message': 'Bucket not configured'})
-    
+
+    dry_run = bool(event.get('dryRun')) or get_optional_env('DRY_RUN', 'false').lower() == 'true'
     cutoff_date = datetime.now(timezone.utc) - timedelta(days=DAYS_TO_KEEP)
-    print(f'Deleting files older than: {cutoff_date.isoformat()}')
-    
-    deleted_count = 0
-    error_count = 0
-    
+    logger.info('%sDeleting files older than: %s', '[DRY RUN] ' if dry_run else '', cutoff_date.isoformat())
+
     try:
-        paginator = s3.get_paginator('list_objects_v2')
-        pages = paginator.paginate(Bucket=UPLOAD_BUCKET, Prefix='uploads/')
-        
-        for page in pages:
-            if 'Contents' not in page:
-                continue
-            
-            for obj in page['Contents']:
-                key: str | None = obj.get('Key')
-                last_modified = obj.get('LastModified')
+        if event.get('mode') == 'manifest':
+            if not event.get('manifest'):
+                return success_response({'message': 'manifest location required'})
+            return _run_manifest_cleanup(event['manifest'], cutoff_date, dry_run, context)
+
+        return _run_cleanup(cutoff_date, dry_run, context)
 
-                if not key or not last_modified:
-                    continue
-                
-                # Check if file is old enough to delete
-                if last_modified < cutoff_date:
-                    try:
-                        s3.delete_object(Bucket=UPLOAD_BUCKET, Key=key)
-                        print(f'Deleted: {key} (age: {(datetime.now(timezone.utc) - last_modified).days} days)')
-                        deleted_count += 1
-                    except Exception as e:
-                        print(f'Error deleting {key}: {str(e)}')
-                        error_count += 1
-        
-        return success_response({
-            'message': f'Cleanup complete: {deleted_count} deleted, {error_count} errors',
-            'deleted': deleted_count,
-            'errors': error_count
-        })
-        
     except Exception as e:
-        print(f'Cleanup error: {str(e)}')
+        logger.error('Cleanup error: %s', e)
         return success_response({
             'message': 'Cleanup failed',
             'error': str(e)
         })
+
+
+def _record_stats(stats: DeleteStats) -> None:
+    """Run totals as metrics (including any resumed from a checkpoint)"""
+    metrics.count('Listed', stats.listed)
+    metrics.count('Expired', stats.expired)
+    metrics.count('Deleted', stats.deleted)
+    metrics.count('DeleteErrors', stats.errors)
+    metrics.add('BytesExpired', stats.expired_bytes, 'Bytes')
+
+
+def _remaining_ms(context: Any) -> float:
+    """Time left in this invocation (unbounded when run outside Lambda)"""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return float('inf')
+    return context.get_remaining_time_in_millis()
+
+
+def _run_manifest_cleanup(location: str, cutoff_date: datetime, dry_run: bool, context: Any) -> Dict[str, Any]:
+    """
+    Streams an inventory manifest, filters rows on LastModified and feeds
+    expired upload keys to 1000-key batch deletes on the worker pool.
+    Progress is checkpointed after each inventory data file.
+    """
+    start = time.perf_counter()
+    manifest = load_manifest(s3, location)
+    stats = DeleteStats()
+    checkpoint_key = f'{CHECKPOINT_KEY}.manifest'
+    first_file = 0
+
+    checkpoint = None if dry_run else load_checkpoint(s3, UPLOAD_BUCKET, checkpoint_key)  # type: ignore
+    if checkpoint and checkpoint.get('manifest') == location:
+        first_file = checkpoint.get('fileIndex', 0)
+        for name, value in checkpoint.get('stats', {}).items():
+            setattr(stats, name, value)
+        logger.info('Resuming manifest at file %s: %s already deleted', first_file, stats.deleted)
+
+    logger.info('Manifest %s: %s %s files', location, len(manifest.files), manifest.file_format)
+    completed = True
+
+    with ThreadPoolExecutor(max_workers=max(1, MAX_WORKERS)) as executor:
+        in_flight: Deque[Future[DeleteStats]] = deque()
+
+        for index in range(first_file, len(manifest.files)):
+            if index > first_file and _remaining_ms(context) < TIME_SAFETY_MS:
+                logger.info('Approaching timeout, stopping at checkpoint')
+                completed = False
+                break
+
+            pending: List[Tuple[str, int]] = []
+
+            for key, size, last_modified in iter_objects(s3, manifest, manifest.files[index]):
+                stats.listed += 1
+                if key.startswith(UPLOAD_PREFIX) and last_modified and last_modified < cutoff_date:
+                    pending.append((key, size))
+
+                if len(pending) >= DELETE_BATCH_SIZE:
+                    in_flight.append(executor.submit(delete_keys, s3, UPLOAD_BUCKET, pending, dry_run))  # type: ignore
+                    pending = []
+
+                # Bound memory: don't read further ahead than the pool can delete
+                while len(in_flight) >= MAX_WORKERS * 2:
+                    stats.add(in_flight.popleft().result())
+
+            if pending:
+                in_flight.append(executor.submit(delete_keys, s3, UPLOAD_BUCKET, pending, dry_run))  # type: ignore
+            while in_flight:
+                stats.add(in_flight.popleft().result())
+
+            if not dry_run:
+                save_checkpoint(s3, UPLOAD_BUCKET, checkpoint_key, {  # type: ignore
+                    'manifest': location,
+                    'fileIndex': index + 1,
+                    'stats': asdict(stats),
+                    'updatedAt': datetime.now(timezone.utc).isoformat()
+                })
+
+    if completed and not dry_run:
+        clear_checkpoint(s3, UPLOAD_BUCKET, checkpoint_key)  # type: ignore
+
+    elapsed_s = time.perf_counter() - start
+    _record_stats(stats)
+    action = 'would be deleted' if dry_run else 'deleted'
+    count = stats.expired if dry_run else stats.deleted
+    logger.info(
+        'Manifest cleanup: %s %s, %s errors, %s rows in %.1fs',
+        count, action, stats.errors, stats.listed, elapsed_s
+    )
+
+    return success_response({
+        'message': f'Manifest cleanup: {count} {action}, {stats.errors} errors',
+        'dryRun': dry_run,
+        'rows': stats.listed,
+        'deleted': stats.deleted,
+        'wouldDelete': stats.expired,
+        'errors': stats.errors,
+        'completed': completed
+    })
+
+
+def _run_cleanup(cutoff_date: datetime, dry_run: bool, context: Any) -> Dict[str, Any]:
+    """
+    Lists uploads/ one level deep and fans each page of prefixes out to a
+    worker pool. Each worker pages through its prefix and deletes in
+    1000-key batches, so listing and deleting overlap across shards.
+
+    Two key layouts live side by side (see shared/python/upload_keys.py):
+    - uploads/{yyyy}/: only day partitions older than the cutoff are
+      cleaned, so newer data is never listed
+    - uploads/{user_id}/: legacy flat layout, listed in full and filtered
+      on LastModified
+    """
+    start = time.perf_counter()
+    stats = DeleteStats()
+    continuation_token: Optional[str] = None
+
+    # Dry runs always start from the top and never touch the checkpoint
+    checkpoint = None if dry_run else load_checkpoint(s3, UPLOAD_BUCKET, CHECKPOINT_KEY)  # type: ignore
+    if checkpoint:
+        continuation_token = checkpoint.get('continuationToken')
+        for name, value in checkpoint.get('stats', {}).items():
+            setattr(stats, name, value)
+        logger.info('Resuming from checkpoint: %s already deleted', stats.deleted)
+
+    completed = False
+    checkpointed = checkpoint is not None
+
+    with ThreadPoolExecutor(max_workers=max(1, MAX_WORKERS)) as executor:
+        while True:
+            params: Dict[str, Any] = {'Bucket': UPLOAD_BUCKET, 'Prefix': UPLOAD_PREFIX, 'Delimiter': '/'}
+            if continuation_token:
+                params['ContinuationToken'] = continuation_token
+
+            with metrics.phase('List'):
+                page = s3.list_objects_v2(**params)
+
+            prefixes: List[str] = []
+            for common in page.get('CommonPrefixes', []):
+                prefix = common.get('Prefix')
+                if not prefix:
+                    continue
+                if is_partition_segment(prefix[len(UPLOAD_PREFIX):].rstrip('/'), 4):
+                    prefixes.extend(expired_partitions(s3, UPLOAD_BUCKET, prefix, cutoff_date))  # type: ignore
+                else:
+                    prefixes.append(prefix)
+
+            futures = [
+                executor.submit(clean_prefix, s3, UPLOAD_BUCKET, prefix, cutoff_date, dry_run)  # type: ignore
+                for prefix in prefixes
+            ]
+
+            # Stray objects directly under uploads/ (no user prefix)
+            loose = BatchDeleter(s3, UPLOAD_BUCKET, dry_run)  # type: ignore
+            for obj in page.get('Contents', []):
+                loose.stats.listed += 1
+                key = obj.get('Key')
+                last_modified = obj.get('LastModified')
+                if key and last_modified and last_modified < cutoff_date:
+                    loose.add(key, obj.get('Size', 0))
+            loose.flush()
+            stats.add(loose.stats)
+
+            for future in futures:
+                stats.add(future.result())
+
+            continuation_token = page.get('NextContinuationToken')
+            if not continuation_token:
+                completed = True
+                break
+
+            if not dry_run:
+                save_checkpoint(s3, UPLOAD_BUCKET, CHECKPOINT_KEY, {  # type: ignore
+                    'continuationToken': continuation_token,
+                    'stats': asdict(stats),
+                    'updatedAt': datetime.now(timezone.utc).isoformat()
+                })
+                checkpointed = True
+
+            if _remaining_ms(context) < TIME_SAFETY_MS:
+                logger.info('Approaching timeout, stopping at checkpoint')
+                break
+
+    if completed and checkpointed:
+        clear_checkpoint(s3, UPLOAD_BUCKET, CHECKPOINT_KEY)  # type: ignore
+
+    elapsed_s = time.perf_counter() - start
+    _record_stats(stats)
+
+    if dry_run:
+        # Listing time was measured; deletes are estimated per 1000-key
+        # request spread over the worker pool
+        delete_s = stats.delete_requests * DRY_RUN_DELETE_LATENCY_MS / 1000 / max(1, MAX_WORKERS)
+        estimated_s = round(elapsed_s + delete_s, 1)
+        logger.info(
+            '[DRY RUN] %s of %s objects would be deleted (%s bytes), estimated %ss',
+            stats.expired, stats.listed, stats.expired_bytes, estimated_s
+        )
+        return success_response({
+            'message': f'Dry run: {stats.expired} would be deleted',
+            'dryRun': True,
+            'listed': stats.listed,
+            'wouldDelete': stats.expired,
+            'wouldDeleteBytes': stats.expired_bytes,
+            'deleteRequests': stats.delete_requests,
+            'estimatedSeconds': estimated_s
+        })
+
+    status = 'complete' if completed else 'paused at checkpoint'
+    logger.info(
+        'Cleanup %s: %s deleted, %s errors, %s listed in %.1fs',
+        status, stats.deleted, stats.errors, stats.listed, elapsed_s
+    )
+
+    return success_response({
+        'message': f'Cleanup {status}: {stats.deleted} deleted, {stats.errors} errors',
+        'deleted': stats.deleted,
+        'errors': stats.errors,
+        'completed': completed
+    })
@@ -0,0 +1,131 @@
+"""
+Streaming reader for S3 Inventory manifests
+
+Only CSV inventories are supported: Parquet and ORC readers (pyarrow)
+are too large to ship in the function package, so configure the
+inventory with CSV output.
+"""
+from __future__ import annotations
+import csv
+import gzip
+import io
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+from urllib.parse import unquote_plus
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+DEFAULT_SCHEMA = 'Bucket, Key, Size, LastModifiedDate'
+
+
+@dataclass
+class Manifest:
+    """Parsed manifest.json"""
+
+    file_format: str
+    schema: List[str]
+    files: List[str]
+    location: str
+
+
+def _split_location(location: str) -> Tuple[Optional[str], str]:
+    """'s3://bucket/key' → (bucket, key); local paths → (None, path)"""
+    if location.startswith('s3://'):
+        bucket, _, key = location[len('s3://'):].partition('/')
+        return bucket, key
+    return None, location
+
+
+def _open_binary(s3: S3Client, location: str) -> io.BufferedIOBase:
+    bucket, key = _split_location(location)
+    if bucket is None:
+        return open(key, 'rb')
+    return s3.get_object(Bucket=bucket, Key=key)['Body']  # type: ignore[return-value]
+
+
+def load_manifest(s3: S3Client, location: str) -> Manifest:
+    """
+    Reads an inventory manifest.json from S3 or the local filesystem.
+
+    A CSV data file can be given directly instead of a manifest, in which
+    case the default inventory schema is assumed.
+
+    Args:
+        s3: S3 client
+        location: s3://bucket/key or local path
+
+    Returns:
+        Manifest with data file locations resolved
+
+    Raises:
+        ValueError: If the inventory isn't CSV
+    """
+    lowered = location.lower()
+    if lowered.endswith(('.csv', '.csv.gz')):
+        return Manifest('CSV', _parse_schema(DEFAULT_SCHEMA), [location], location)
+    if lowered.endswith(('.parquet', '.orc')):
+        raise ValueError(f'{location}: only CSV inventory files are supported')
+
+    with _open_binary(s3, location) as f:
+        data: Dict[str, Any] = json.loads(f.read())
+
+    bucket, key = _split_location(location)
+    files: List[str] = []
+    for entry in data.get('files', []):
+        if bucket is None:
+            # Local stand-in: data files sit next to the manifest
+            files.append(os.path.join(os.path.dirname(key), os.path.basename(entry['key'])))
+        else:
+            # Data files live in the inventory destination bucket
+            destination = data.get('destinationBucket', '').rsplit(':', 1)[-1] or bucket
+            files.append(f's3://{destination}/{entry["key"]}')
+
+    file_format = data.get('fileFormat', 'CSV')
+    if file_format.upper() != 'CSV':
+        raise ValueError(
+            f'{location}: {file_format} inventory is not supported; configure the inventory with CSV output'
+        )
+
+    return Manifest(
+        file_format=file_format,
+        schema=_parse_schema(data.get('fileSchema', DEFAULT_SCHEMA)),
+        files=files,
+        location=location
+    )
+
+
+def _parse_schema(schema: str) -> List[str]:
+    return [column.strip() for column in schema.split(',')]
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if not value:
+        return None
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+def iter_objects(s3: S3Client, manifest: Manifest, location: str) -> Iterator[Tuple[str, int, Optional[datetime]]]:
+    """
+    Streams (key, size, last_modified) from one inventory data file
+
+    Files are decompressed and parsed row by row without loading the
+    file into memory.
+    """
+    key_index = manifest.schema.index('Key')
+    size_index = manifest.schema.index('Size') if 'Size' in manifest.schema else None
+    modified_index = manifest.schema.index('LastModifiedDate')
+
+    with _open_binary(s3, location) as raw:
+        stream: io.IOBase = gzip.GzipFile(fileobj=raw) if location.endswith('.gz') else raw  # type: ignore[assignment]
+        for row in csv.reader(io.TextIOWrapper(stream, encoding='utf-8', newline='')):  # type: ignore[arg-type]
+            if len(row) <= max(key_index, modified_index):
+                continue
+            size = int(row[size_index]) if size_index is not None and row[size_index] else 0
+            # Inventory CSV keys are URL-encoded
+            yield unquote_plus(row[key_index]), size, _parse_timestamp(row[modified_index])
+
@@ -0,0 +1,75 @@
+"""
+Benchmark per-URL presign latency: boto3 generate_presigned_url vs UrlPresigner
+
+Uses dummy credentials, so no AWS access is needed. Both paths sign the
+same SigV4 PUT (content-type + host). Not packaged with the Lambda.
+
+Usage:
+    python benchmark_presign.py [--urls 20] [--runs 50]
+"""
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Callable, List
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'AKIDEXAMPLE')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import boto3
+from botocore.config import Config
+
+from presigner import UrlPresigner
+
+BUCKET = 'benchmark-upload-bucket'
+
+
+def time_batch(sign: Callable[[int], str], urls: int, runs: int) -> List[float]:
+    """Microseconds per URL for each run of a batch of `urls` signatures"""
+    per_url = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for index in range(urls):
+            sign(index)
+        per_url.append((time.perf_counter() - start) / urls * 1_000_000)
+    return per_url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--urls', type=int, default=20, help='URLs per batch')
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    s3 = boto3.client('s3', config=Config(signature_version='s3v4'))
+    presigner = UrlPresigner(boto3.Session().get_credentials(), s3.meta.region_name, s3.meta.endpoint_url)
+    now = datetime.now(timezone.utc)
+
+    def boto3_sign(index: int) -> str:
+        return s3.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': BUCKET, 'Key': f'uploads/user/20260101-000000-{index}.jpg', 'ContentType': 'image/jpeg'},
+            ExpiresIn=300
+        )
+
+    def cached_sign(index: int) -> str:
+        return presigner.presign(
+            'PUT', BUCKET, f'uploads/user/20260101-000000-{index}.jpg', 300, now, {'Content-Type': 'image/jpeg'}
+        )
+
+    # Warm both paths (endpoint resolution, signing key) like a warm container
+    boto3_sign(0)
+    cached_sign(0)
+
+    print(f'{args.urls} URLs per batch, {args.runs} runs')
+    print(f'{"signer":<22}{"median us/url":>15}{"p95 us/url":>12}')
+    for name, sign in (('generate_presigned_url', boto3_sign), ('UrlPresigner', cached_sign)):
+        samples = sorted(time_batch(sign, args.urls, args.runs))
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f'{name:<22}{statistics.median(samples):>15.1f}{p95:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
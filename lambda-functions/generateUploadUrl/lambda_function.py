@@ -1,77 +1,307 @@
+from __future__ import annotations
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
 from datetime import datetime, timezone
-from mypy_boto3_s3 import S3Client
-import boto3
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+from botocore.exceptions import ClientError
 
 from shared.python.responses import (
     success_response,
     error_response,
     unauthorized_error,
+    forbidden_error,
+    not_found_error,
     validation_error
 )
 from shared.python.env_config import get_optional_env
+from shared.python.aws_clients import get_session, lazy_client
+from shared.python.upload_keys import (
+    MAX_MULTIPART_UPLOAD_BYTES, MAX_UPLOAD_BYTES, build_upload_key, parse_upload_key
+)
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+from shared.python.profiling import profiler
+
+from presigner import UrlPresigner
+from multipart import initiate_upload, parse_completed_parts
 
-s3: S3Client = boto3.client('s3') # type: ignore
+s3: S3Client = lazy_client('s3')
+_presigner: Optional[UrlPresigner] = None
 
 UPLOAD_BUCKET = get_optional_env('UPLOAD_BUCKET')
 ALLOWED_EXTENSIONS = ['jpg', 'jpeg', 'gif', 'png', 'webp']
-MAX_FILE_SIZE = 10 * 1024 * 1024
+MAX_FILE_SIZE = MAX_UPLOAD_BYTES
+UPLOAD_URL_EXPIRES = 300
+# Most files accepted in one batch request
+MAX_BATCH_FILES = int(get_optional_env('MAX_BATCH_FILES', '20'))
+# Large images go through multipart uploads of up to this size. Keep it at
+# or below processImage's MAX_SOURCE_BYTES (same default), or larger
+# uploads are stored only to be rejected
+MAX_MULTIPART_FILE_SIZE = int(get_optional_env('MAX_MULTIPART_FILE_SIZE', str(MAX_MULTIPART_UPLOAD_BYTES)))
+# Preferred part size (S3 minimum is 5 MiB)
+MULTIPART_PART_SIZE = int(get_optional_env('MULTIPART_PART_SIZE', str(5 * 1024 * 1024)))
+# Part URLs live longer: slow links upload many parts in sequence
+MULTIPART_URL_EXPIRES = 3600
+ACTIONS = ('put', 'post', 'multipart', 'complete', 'abort')
+# 'flat' (uploads/{user_id}/...) or 'dated' (uploads/{yyyy}/{mm}/{dd}/{user_id}/...)
+UPLOAD_KEY_LAYOUT = get_optional_env('UPLOAD_KEY_LAYOUT', 'flat')
 
+@metrics.handler
+@logger.handler
+@profiler.handler
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Generates pre-signed URL for secure S3 upload.
     User uploads directly to S3 using this temporary URL.
+
+    Actions (body "action", default "put"):
+        put: one URL, or one per entry of "files": [{filename, contentType, size?}]
+        post: presigned POST form; S3 enforces the size limit itself
+        multipart: initiate a multipart upload for a declared "size" and
+            return a presigned URL per part
+        complete / abort: finish a multipart upload with "s3Key", "uploadId"
+            (and "parts": [{partNumber, etag}] to complete)
     """
-    print('Event:', event)
+    logger.event(event)
 
     if not UPLOAD_BUCKET:
-        print('ERROR: UPLOAD_BUCKET not configured')
+        logger.error('UPLOAD_BUCKET not configured')
         return error_response('Upload service not configured')
     
     # Add token check here after testing S3 #
 
     try:
-        body = json.loads(event.get('body', '{}'))
-        filename: str = body.get('filename', '')
-        content_type: str = body.get('contentType', '')
+        body: Dict[str, Any] = json.loads(event.get('body', '{}'))
         user_id: str = body.get('userId', '')
-
-        if not filename or not content_type or not user_id:
-            return validation_error('filename, contentType, and userId required')
+        action: str = body.get('action', 'put')
         
     except Exception as e:
-        print(f'Parse error: {str(e)}')
+        logger.error('Parse error: %s', e)
         return validation_error('Invalid request body')
-    
-    extension = filename.lower().split('.')[-1]
-    if extension not in ALLOWED_EXTENSIONS:
-        return validation_error(
-            f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'
-        )
-    
-    timestamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
-    s3_key = f'uploads/{user_id}/{timestamp}.{extension}'
+
+    if action == 'put':
+        return _presign_puts(body, user_id, event)
+    if action == 'post':
+        return _presign_post(body, user_id)
+    if action == 'multipart':
+        return _start_multipart(body, user_id, event)
+    if action in ('complete', 'abort'):
+        return _finish_multipart(body, user_id, action)
+
+    return validation_error(f'Invalid action. Allowed: {", ".join(ACTIONS)}')
+
+
+def _presign_puts(body: Dict[str, Any], user_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Single or batch presigned PUT URLs; large batches are gzipped for clients that accept it"""
+    batch = 'files' in body
+
+    if batch:
+        files: List[Dict[str, Any]] = body['files']
+        if not user_id or not isinstance(files, list) or not files:
+            return validation_error('files and userId required')
+    else:
+        files = [body]
+        if not body.get('filename') or not body.get('contentType') or not user_id:
+            return validation_error('filename, contentType, and userId required')
+
+    if len(files) > MAX_BATCH_FILES:
+        return validation_error(f'Too many files. Maximum: {MAX_BATCH_FILES}')
+
+    for index, file in enumerate(files):
+        error = _validate_file(file, MAX_FILE_SIZE)
+        if error:
+            return validation_error(f'files[{index}]: {error}' if batch else error)
+
+    # One signing time for the whole batch: keys and expiry line up
+    now = datetime.now(timezone.utc)
 
     try:
-        presigned_url = s3.generate_presigned_url(
-            'put_object',
-            Params={
-                'Bucket': UPLOAD_BUCKET,
-                'Key': s3_key,
-                'ContentType': content_type,
-                'ContentLength': MAX_FILE_SIZE
-            },
-            ExpiresIn=300
-        )
-        print(f'Generated pre-signed URL for: {s3_key}')
+        uploads = []
+        with metrics.phase('Presign'):
+            for index, file in enumerate(files):
+                s3_key = build_upload_key(
+                    user_id, _extension(file['filename']), now, UPLOAD_KEY_LAYOUT,
+                    sequence=index if batch else None
+                )
+                uploads.append({
+                    'filename': file['filename'],
+                    'uploadUrl': _presign_put(s3_key, file['contentType'], file.get('size'), now),
+                    's3Key': s3_key
+                })
+        metrics.count('UrlsSigned', len(uploads))
+        logger.info('Generated %s pre-signed URL(s) for user %s', len(uploads), user_id)
+
+        if batch:
+            return success_response({'uploads': uploads, 'expiresIn': UPLOAD_URL_EXPIRES}, request=request)
+
+        return success_response({
+            'uploadUrl': uploads[0]['uploadUrl'],
+            's3Key': uploads[0]['s3Key'],
+            'expiresIn': UPLOAD_URL_EXPIRES
+        })
         
+    except Exception as e:
+        logger.error('S3 error: %s', e)
+        return error_response('Failed to generate upload URL')
+
+
+def _presign_post(body: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    """
+    Presigned POST for small files. The policy pins the key and content
+    type and carries a content-length-range, so S3 itself rejects anything
+    over MAX_FILE_SIZE.
+    """
+    if not user_id:
+        return validation_error('filename, contentType, and userId required')
+    error = _validate_file(body, MAX_FILE_SIZE)
+    if error:
+        return validation_error(error)
+
+    s3_key = build_upload_key(user_id, _extension(body['filename']), datetime.now(timezone.utc), UPLOAD_KEY_LAYOUT)
+
+    try:
+        with metrics.phase('Presign'):
+            post = s3.generate_presigned_post(
+                Bucket=UPLOAD_BUCKET,  # type: ignore
+                Key=s3_key,
+                Fields={'Content-Type': body['contentType']},
+                Conditions=[
+                    {'Content-Type': body['contentType']},
+                    ['content-length-range', 1, MAX_FILE_SIZE]
+                ],
+                ExpiresIn=UPLOAD_URL_EXPIRES
+            )
+        metrics.count('UrlsSigned')
+        logger.info('Generated pre-signed POST for: %s', s3_key)
+
         return success_response({
-            'uploadUrl': presigned_url,
+            'uploadUrl': post['url'],
+            'fields': post['fields'],
             's3Key': s3_key,
-            'expiresIn': 300
+            'maxSize': MAX_FILE_SIZE,
+            'expiresIn': UPLOAD_URL_EXPIRES
         })
-        
+
     except Exception as e:
-        print(f'S3 error: {str(e)}')
+        logger.error('S3 error: %s', e)
         return error_response('Failed to generate upload URL')
+
+
+def _start_multipart(body: Dict[str, Any], user_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """Initiates a multipart upload sized by the declared file size"""
+    if not user_id or body.get('size') is None:
+        return validation_error('filename, contentType, size, and userId required')
+    error = _validate_file(body, MAX_MULTIPART_FILE_SIZE)
+    if error:
+        return validation_error(error)
+
+    now = datetime.now(timezone.utc)
+    s3_key = build_upload_key(user_id, _extension(body['filename']), now, UPLOAD_KEY_LAYOUT)
+
+    try:
+        # Includes the CreateMultipartUpload call as well as signing
+        with metrics.phase('Presign'):
+            upload = initiate_upload(
+                s3, _get_presigner(), UPLOAD_BUCKET, s3_key, body['contentType'],  # type: ignore
+                body['size'], MULTIPART_PART_SIZE, MULTIPART_URL_EXPIRES, now
+            )
+        metrics.count('UrlsSigned', len(upload['parts']))
+        logger.info('Initiated multipart upload of %s parts for: %s', len(upload["parts"]), s3_key)
+
+        return success_response({**upload, 's3Key': s3_key, 'expiresIn': MULTIPART_URL_EXPIRES}, request=request)
+
+    except Exception as e:
+        logger.error('S3 error: %s', e)
+        return error_response('Failed to start multipart upload')
+
+
+def _finish_multipart(body: Dict[str, Any], user_id: str, action: str) -> Dict[str, Any]:
+    """Completes or aborts a multipart upload owned by user_id"""
+    s3_key: str = body.get('s3Key', '')
+    upload_id: str = body.get('uploadId', '')
+
+    if not user_id or not s3_key or not upload_id:
+        return validation_error('s3Key, uploadId, and userId required')
+
+    # Only the user the key was issued to may finish it
+    upload_key = parse_upload_key(s3_key)
+    if upload_key is None or upload_key.user_id != user_id:
+        return forbidden_error('Upload does not belong to this user')
+
+    try:
+        if action == 'abort':
+            with metrics.phase('Finish'):
+                s3.abort_multipart_upload(Bucket=UPLOAD_BUCKET, Key=s3_key, UploadId=upload_id)  # type: ignore
+            logger.info('Aborted multipart upload for: %s', s3_key)
+            return success_response({'message': 'Upload aborted', 's3Key': s3_key})
+
+        parts = parse_completed_parts(body.get('parts'))
+        if parts is None:
+            return validation_error('parts must be a list of {partNumber, etag} with unique part numbers')
+
+        with metrics.phase('Finish'):
+            s3.complete_multipart_upload(
+                Bucket=UPLOAD_BUCKET,  # type: ignore
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}  # type: ignore
+            )
+        logger.info('Completed multipart upload of %s parts for: %s', len(parts), s3_key)
+        return success_response({'message': 'Upload complete', 's3Key': s3_key})
+
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code', '')
+        logger.error('S3 error: %s %s', code, e)
+        if code == 'NoSuchUpload':
+            return not_found_error('Upload not found or already finished')
+        if code in ('InvalidPart', 'InvalidPartOrder', 'EntityTooSmall'):
+            return validation_error(f'Invalid parts: {code}')
+        return error_response(f'Failed to {action} multipart upload')
+
+    except Exception as e:
+        logger.error('S3 error: %s', e)
+        return error_response(f'Failed to {action} multipart upload')
+
+
+def _extension(filename: str) -> str:
+    return filename.lower().split('.')[-1]
+
+
+def _validate_file(file: Any, max_size: int) -> Optional[str]:
+    """Returns an error message, or None if the file entry is acceptable"""
+    if not isinstance(file, dict) or not file.get('filename') or not file.get('contentType'):
+        return 'filename and contentType required'
+
+    if _extension(str(file['filename'])) not in ALLOWED_EXTENSIONS:
+        return f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'
+
+    size = file.get('size')
+    if size is not None and (not isinstance(size, int) or isinstance(size, bool) or not 0 < size <= max_size):
+        return f'size must be between 1 and {max_size} bytes'
+
+    return None
+
+
+def _get_presigner() -> UrlPresigner:
+    """
+    Built with the S3 client on first use; credentials and the per-day
+    signing key are then reused across warm invocations
+    """
+    global _presigner
+    if _presigner is None:
+        _presigner = UrlPresigner(get_session().get_credentials(), s3.meta.region_name, s3.meta.endpoint_url)
+    return _presigner
+
+
+def _presign_put(s3_key: str, content_type: str, size: Optional[int], now: datetime) -> str:
+    """
+    Presigns a PUT for one upload. Content-Type is always signed; when the
+    client declares its size, Content-Length is signed too so S3 rejects
+    any other body size.
+    """
+    headers = {'Content-Type': content_type}
+    if size is not None:
+        headers['Content-Length'] = str(size)
+
+    return _get_presigner().presign('PUT', UPLOAD_BUCKET, s3_key, UPLOAD_URL_EXPIRES, now, headers)  # type: ignore
@@ -0,0 +1,102 @@
+"""
+Presigned multipart uploads for large images
+
+The client declares the file size up front. The upload is initiated here,
+each part gets its own presigned URL with its exact Content-Length signed,
+and the client PUTs parts in parallel, retrying only the parts that fail,
+before calling back with the part ETags to complete (or abort) the upload.
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+from presigner import UrlPresigner
+
+# S3 rejects non-final parts smaller than 5 MiB and uploads over 10000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10_000
+
+
+def plan_parts(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """
+    Splits a declared file size into (part_number, length) pairs
+
+    Args:
+        size: Total file size in bytes
+        part_size: Preferred part size; raised to S3's minimum, and further
+            if the file would otherwise need more than 10000 parts
+
+    Returns:
+        Parts numbered from 1; only the last one may be shorter
+    """
+    part_size = max(part_size, MIN_PART_SIZE, -(-size // MAX_PARTS))
+    return [
+        (number, min(part_size, size - offset))
+        for number, offset in enumerate(range(0, size, part_size), start=1)
+    ]
+
+
+def initiate_upload(
+        s3: S3Client,
+        presigner: UrlPresigner,
+        bucket: str,
+        key: str,
+        content_type: str,
+        size: int,
+        part_size: int,
+        expires_in: int,
+        now: datetime
+) -> Dict[str, Any]:
+    """
+    Starts a multipart upload and presigns a PUT for every part
+
+    Returns:
+        uploadId, partSize and parts [{partNumber, size, uploadUrl}]
+    """
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)['UploadId']
+    parts = plan_parts(size, part_size)
+
+    return {
+        'uploadId': upload_id,
+        'partSize': parts[0][1],
+        'parts': [
+            {
+                'partNumber': number,
+                'size': length,
+                'uploadUrl': presigner.presign(
+                    'PUT', bucket, key, expires_in, now,
+                    headers={'Content-Length': str(length)},
+                    query={'partNumber': str(number), 'uploadId': upload_id}
+                )
+            }
+            for number, length in parts
+        ]
+    }
+
+
+def parse_completed_parts(parts: Any) -> Optional[List[Dict[str, Any]]]:
+    """
+    Validates the client's [{partNumber, etag}] list
+
+    Returns:
+        Parts in CompleteMultipartUpload shape sorted by number, or None if
+        the list is malformed or has duplicate part numbers
+    """
+    if not isinstance(parts, list) or not parts or len(parts) > MAX_PARTS:
+        return None
+
+    completed: Dict[int, str] = {}
+    for part in parts:
+        if not isinstance(part, dict):
+            return None
+        number = part.get('partNumber')
+        etag = part.get('etag')
+        if not isinstance(number, int) or isinstance(number, bool) or not 1 <= number <= MAX_PARTS:
+            return None
+        if not isinstance(etag, str) or not etag or number in completed:
+            return None
+        completed[number] = etag
+
+    return [{'PartNumber': number, 'ETag': completed[number]} for number in sorted(completed)]
@@ -0,0 +1,117 @@
+"""
+SigV4 query-string presigner with cached signing keys
+
+botocore rebuilds the request, resolves the endpoint and re-derives the
+four-step HMAC signing key for every generate_presigned_url call. This
+presigner keeps the credentials and the per-day signing key for the life
+of the container, so each URL costs one canonical request hash and one
+HMAC.
+"""
+import hashlib
+import hmac
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+ALGORITHM = 'AWS4-HMAC-SHA256'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+
+
+def _uri_encode(value: str, safe: str = '-_.~') -> str:
+    return quote(value, safe=safe)
+
+
+class UrlPresigner:
+    """
+    Presigns S3 object URLs for one bucket endpoint.
+
+    Args:
+        credentials: botocore Credentials (refreshable credentials are
+            re-read on every batch, which is a cheap expiry check)
+        region: Bucket region
+        endpoint_url: S3 endpoint the client would use, e.g.
+            https://s3.amazonaws.com; buckets are addressed virtual-host style
+    """
+
+    def __init__(self, credentials: Any, region: str, endpoint_url: str):
+        self._credentials = credentials
+        self.region = region
+        self._endpoint_host = urlparse(endpoint_url).netloc
+        self._signing_keys: Dict[Tuple[str, str], bytes] = {}
+
+    def _signing_key(self, secret_key: str, access_key: str, datestamp: str) -> bytes:
+        cache_key = (access_key, datestamp)
+        key = self._signing_keys.get(cache_key)
+
+        if key is None:
+            key = ('AWS4' + secret_key).encode()
+            for part in (datestamp, self.region, 's3', 'aws4_request'):
+                key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+            # Signing keys are scoped to one UTC day; drop the previous one
+            self._signing_keys = {cache_key: key}
+
+        return key
+
+    def presign(
+            self,
+            method: str,
+            bucket: str,
+            key: str,
+            expires_in: int,
+            now: datetime,
+            headers: Optional[Dict[str, str]] = None,
+            query: Optional[Dict[str, str]] = None
+    ) -> str:
+        """
+        Build a presigned URL
+
+        Args:
+            method: HTTP method the client will use
+            bucket: Bucket name
+            key: Object key
+            expires_in: Validity in seconds
+            now: Signing time (UTC); pass the same value for a whole batch
+            headers: Headers the client must send exactly (e.g. content-type)
+            query: Extra signed query parameters (e.g. partNumber, uploadId)
+
+        Returns:
+            Presigned URL
+        """
+        credentials = self._credentials.get_frozen_credentials()
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        datestamp = amz_date[:8]
+        scope = f'{datestamp}/{self.region}/s3/aws4_request'
+        host = f'{bucket}.{self._endpoint_host}'
+
+        signed = {name.lower(): str(value).strip() for name, value in (headers or {}).items()}
+        signed['host'] = host
+        signed_names = ';'.join(sorted(signed))
+
+        params = dict(query or {})
+        params.update({
+            'X-Amz-Algorithm': ALGORITHM,
+            'X-Amz-Credential': f'{credentials.access_key}/{scope}',
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(expires_in),
+            'X-Amz-SignedHeaders': signed_names,
+        })
+        if credentials.token:
+            params['X-Amz-Security-Token'] = credentials.token
+
+        canonical_query = '&'.join(
+            f'{_uri_encode(name)}={_uri_encode(value)}' for name, value in sorted(params.items())
+        )
+        canonical_uri = '/' + _uri_encode(key, safe='/-_.~')
+        canonical_headers = ''.join(f'{name}:{signed[name]}\n' for name in sorted(signed))
+
+        canonical_request = '\n'.join([
+            method, canonical_uri, canonical_query, canonical_headers, signed_names, UNSIGNED_PAYLOAD
+        ])
+        string_to_sign = '\n'.join([
+            ALGORITHM, amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+
+        signing_key = self._signing_key(credentials.secret_key, credentials.access_key, datestamp)
+        signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+        return f'https://{host}{canonical_uri}?{canonical_query}&X-Amz-Signature={signature}'
@@ -0,0 +1,112 @@
+"""
+Benchmark resize tiers against a large synthetic JPEG
+
+The source image and each tier run in their own child process so peak RSS
+is measured per tier (a forked child inherits its parent's ru_maxrss).
+Not packaged with the Lambda.
+
+Usage:
+    python benchmark_resize.py [--megapixels 24] [--runs 5] [--renditions 512:webp]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from io import BytesIO
+from typing import Dict, Any, List
+
+from PIL import Image
+
+# The handler modules import shared.python from the package root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from renditions import parse_renditions, render
+from resize import RESIZE_TIERS, apply_draft
+
+
+def make_source(megapixels: float) -> bytes:
+    """Builds a noisy 4:3 JPEG roughly the size of a phone photo"""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+
+    noise = Image.effect_noise((width, height), 64)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    img = Image.merge('RGB', (noise, gradient, noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def run_tier(tier_name: str, source: bytes, renditions_spec: str, runs: int) -> Dict[str, Any]:
+    """Times decode + render for one tier inside the current process"""
+    tier = RESIZE_TIERS[tier_name]
+    renditions = parse_renditions(renditions_spec)
+    max_edge = max(rendition.size for rendition in renditions)
+    timings: List[float] = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        img = Image.open(BytesIO(source))
+        apply_draft(img, max_edge, tier)
+        img.load()
+        render(img, renditions, tier)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        'tier': tier_name,
+        'medianMs': round(timings[len(timings) // 2], 1),
+        'maxMs': round(timings[-1], 1),
+        # ru_maxrss is KiB on Linux
+        'peakRssMb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, default=24)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--renditions', default='512:webp')
+    parser.add_argument('--tier', help=argparse.SUPPRESS)
+    parser.add_argument('--source', help=argparse.SUPPRESS)
+    parser.add_argument('--generate', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.generate:
+        with open(args.generate, 'wb') as f:
+            f.write(make_source(args.megapixels))
+        return
+
+    if args.tier:
+        with open(args.source, 'rb') as f:
+            source = f.read()
+        print(json.dumps(run_tier(args.tier, source, args.renditions, args.runs)))
+        return
+
+    source_path = f'/tmp/benchmark_resize_{int(args.megapixels)}mp.jpg'
+    subprocess.run(
+        [sys.executable, __file__, '--generate', source_path, '--megapixels', str(args.megapixels)],
+        check=True
+    )
+    source_size = os.path.getsize(source_path)
+
+    print(f'Source: {args.megapixels} MP JPEG, {source_size / 1024 / 1024:.1f} MB, '
+          f'renditions {args.renditions}, {args.runs} runs')
+    print(f'{"tier":<10}{"median ms":>12}{"max ms":>10}{"peak RSS MB":>14}')
+
+    for tier_name in RESIZE_TIERS:
+        output = subprocess.run(
+            [sys.executable, __file__, '--tier', tier_name, '--source', source_path,
+             '--renditions', args.renditions, '--runs', str(args.runs)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f'{result["tier"]:<10}{result["medianMs"]:>12}{result["maxMs"]:>10}{result["peakRssMb"]:>14}')
+
+
+if __name__ == '__main__':
+    main()
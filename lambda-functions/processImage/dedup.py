@@ -0,0 +1,144 @@
+"""
+Content-hash deduplication for processed profile images
+"""
+from __future__ import annotations
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+from shared.python.logger import logger
+
+from encoding import EncodeSettings
+from renditions import FORMATS, Rendition
+from resize import ResizeTier
+
+SOURCE_HASH_KEY = 'source-sha256'
+SETTINGS_KEY = 'settings'
+PROCESSED_AT_KEY = 'processed-at'
+NOT_FOUND_CODES = ('404', 'NoSuchKey', 'NotFound')
+
+
+def source_hash(data: memoryview) -> str:
+    """SHA-256 of the raw upload bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def settings_fingerprint(
+        renditions: List[Rendition],
+        tier: ResizeTier,
+        encode_settings: EncodeSettings
+) -> str:
+    """
+    Short hash of everything that affects the processed output, so a change
+    to the rendition table, encoder options/mode or resize tier invalidates
+    previously processed images
+    """
+    settings = {
+        'renditions': [
+            [rendition.size, rendition.format, FORMATS[rendition.format][3]]
+            for rendition in renditions
+        ],
+        'tier': {**asdict(tier), 'resample': int(tier.resample)},
+        'encode': asdict(encode_settings),
+    }
+    encoded = json.dumps(settings, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+def build_metadata(content_hash: str, fingerprint: str) -> Dict[str, str]:
+    """User metadata stored on every processed rendition"""
+    return {
+        SOURCE_HASH_KEY: content_hash,
+        SETTINGS_KEY: fingerprint,
+        PROCESSED_AT_KEY: datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def find_duplicate(
+        s3: S3Client,
+        bucket: str,
+        key: str,
+        content_hash: str,
+        fingerprint: str
+) -> Optional[Dict[str, str]]:
+    """
+    Metadata of the processed object at key if it was produced from the
+    same source bytes with the same settings, else None
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        response = s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in NOT_FOUND_CODES:
+            logger.error('Dedup lookup error for %s: %s', key, e)
+        return None
+
+    metadata = response.get('Metadata', {})
+    if metadata.get(SOURCE_HASH_KEY) == content_hash and metadata.get(SETTINGS_KEY) == fingerprint:
+        return metadata
+    return None
+
+
+def _head_metadata(s3: S3Client, bucket: str, key: str) -> Optional[Dict[str, str]]:
+    """Object metadata, or None if the object doesn't exist"""
+    from botocore.exceptions import ClientError
+
+    try:
+        return s3.head_object(Bucket=bucket, Key=key).get('Metadata', {})
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in NOT_FOUND_CODES:
+            return None
+        raise
+
+
+def refresh(
+        s3: S3Client,
+        bucket: str,
+        outputs: List[Tuple[Rendition, str]],
+        metadata: Dict[str, str],
+        extra_args: Dict[str, str],
+        primary_metadata: Dict[str, str]
+) -> bool:
+    """
+    Bumps LastModified/processed-at on existing renditions with a
+    server-side in-place copy instead of re-encoding and re-uploading.
+    Per-rendition metadata (encoder parameters) is carried over.
+
+    Args:
+        outputs: (rendition, key) pairs, primary first
+        primary_metadata: The primary's metadata from find_duplicate
+
+    Returns:
+        False, before copying anything, if a rendition is missing (e.g.
+        the rendition table changed); the caller re-encodes instead
+    """
+    with ThreadPoolExecutor(max_workers=len(outputs)) as executor:
+        existing = [primary_metadata] + list(executor.map(
+            lambda output: _head_metadata(s3, bucket, output[1]), outputs[1:]
+        ))
+        if any(item is None for item in existing):
+            return False
+
+        futures = [
+            executor.submit(
+                s3.copy_object,
+                Bucket=bucket,
+                Key=key,
+                CopySource={'Bucket': bucket, 'Key': key},
+                MetadataDirective='REPLACE',
+                Metadata={**current, **metadata},  # type: ignore[dict-item]
+                ContentType=rendition.content_type,
+                **extra_args  # type: ignore[arg-type]
+            )
+            for (rendition, key), current in zip(outputs, existing)
+        ]
+        for future in futures:
+            future.result()
+
+    return True
@@ -0,0 +1,119 @@
+"""
+Adaptive WebP encoder settings targeting a byte budget
+"""
+from __future__ import annotations
+import time
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Encode time of each WebP method relative to method 0, measured on photos.
+# Used to pick the slowest (smallest output) method that fits the budget.
+METHOD_COST = {0: 1.0, 2: 1.6, 4: 2.8, 6: 5.0}
+
+MAX_SEARCH_STEPS = 4
+
+
+@dataclass(frozen=True)
+class EncodeSettings:
+    """
+    mode: 'fixed' uses each format's static options; 'adaptive' picks WebP
+        quality/method per image
+    target_bytes: Output size goal for the largest rendition; smaller
+        renditions get a budget scaled by pixel area
+    budget_ms: Latency ceiling for one adaptive encode, probes included
+    min_quality / max_quality: Bounds for the quality search
+    """
+
+    mode: str = 'fixed'
+    target_bytes: int = 40 * 1024
+    budget_ms: int = 250
+    min_quality: int = 50
+    max_quality: int = 85
+
+
+def get_encode_settings(mode: str, target_bytes: int, budget_ms: int) -> EncodeSettings:
+    """
+    Validates encoder settings from configuration
+
+    Raises:
+        ValueError: If the mode isn't fixed or adaptive
+    """
+    mode = mode.strip().lower()
+    if mode not in ('fixed', 'adaptive'):
+        raise ValueError(f'Invalid encode mode: {mode}. Allowed: fixed, adaptive')
+    return EncodeSettings(mode=mode, target_bytes=target_bytes, budget_ms=budget_ms)
+
+
+def _encode(img: Image.Image, quality: int, method: int) -> Tuple[BytesIO, float]:
+    start = time.perf_counter()
+    buffer = BytesIO()
+    img.save(buffer, format='WebP', quality=quality, method=method)
+    return buffer, (time.perf_counter() - start) * 1000
+
+
+def encode_webp_adaptive(
+        img: Image.Image,
+        target_bytes: int,
+        settings: EncodeSettings
+) -> Tuple[BytesIO, Dict[str, str]]:
+    """
+    Encodes WebP at the highest quality that fits target_bytes within the
+    latency budget.
+
+    1. Probe at max quality with method 0 (fastest). Flat graphics usually
+       fit already.
+    2. Otherwise binary search quality with method 0 probes, bounded by
+       MAX_SEARCH_STEPS and the deadline.
+    3. Final encode at the chosen quality with the slowest method whose
+       estimated cost (from the probe timing) fits the remaining budget.
+       Higher methods rarely produce larger output at the same quality, so
+       the result stays at or under the probe size.
+
+    Returns:
+        (encoded buffer, encoder parameters for object metadata)
+    """
+    deadline = time.perf_counter() + settings.budget_ms / 1000
+
+    # Best method-0 encode so far and the quality it was made at
+    probe, probe_ms = _encode(img, settings.max_quality, 0)
+    probe_quality = quality = settings.max_quality
+    probes = 1
+
+    if probe.tell() > target_bytes:
+        low, high = settings.min_quality, settings.max_quality - 1
+        quality = settings.min_quality
+
+        while low <= high and probes <= MAX_SEARCH_STEPS and time.perf_counter() < deadline:
+            mid = (low + high) // 2
+            candidate, _ = _encode(img, mid, 0)
+            probes += 1
+
+            if candidate.tell() <= target_bytes:
+                probe, probe_quality = candidate, mid
+                quality = mid
+                low = mid + 1
+            else:
+                high = mid - 1
+
+    remaining_ms = (deadline - time.perf_counter()) * 1000
+    method = max(
+        (m for m, cost in METHOD_COST.items() if probe_ms * cost <= remaining_ms),
+        default=0
+    )
+
+    if method == 0 and probe_quality == quality:
+        buffer = probe
+    else:
+        buffer, _ = _encode(img, quality, method)
+
+    buffer.seek(0)
+    return buffer, {
+        'encoder-quality': str(quality),
+        'encoder-method': str(method),
+        'encoder-probes': str(probes),
+    }
+
@@ -1,143 +1,399 @@
+from __future__ import annotations
 import json
-from io import BytesIO
-from typing import Dict, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from typing import Dict, Any, List, Optional, Set, Tuple, Union, TYPE_CHECKING
 from datetime import datetime, timezone
-import boto3
-from PIL import Image
-from mypy_boto3_s3 import S3Client
-from mypy_boto3_sqs import SQSClient
-from mypy_boto3_sns import SNSClient
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+    from mypy_boto3_sns import SNSClient
 
 from shared.python.responses import success_response, error_response
 from shared.python.env_config import get_optional_env
+from shared.python.aws_clients import lazy_client
+from shared.python.upload_keys import MAX_MULTIPART_UPLOAD_BYTES, parse_upload_key
+from shared.python.lazy_imports import ensure_loaded, lazy_import
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+from shared.python.profiling import profiler
 
-s3: S3Client = boto3.client('s3')  # type: ignore
-sqs: SQSClient = boto3.client('sqs')  # type: ignore
-sns: SNSClient = boto3.client('sns')  # type: ignore
+from dedup import build_metadata, find_duplicate, refresh, settings_fingerprint, source_hash
+from encoding import get_encode_settings
+from notifications import publish_notifications
+from preflight import RejectedImage, check_limits, inspect_upload
+from renditions import DEFAULT_RENDITIONS, Rendition, parse_renditions, prepare, render
+from resize import apply_draft, get_tier
+from streaming import MemoryViewReader, download_to_buffer, peak_rss_mb, upload_buffer
+
+Image = lazy_import('PIL.Image')
 
 UPLOAD_BUCKET = get_optional_env('UPLOAD_BUCKET')
 PROCESSED_BUCKET = get_optional_env('PROCESSED_BUCKET')
 QUEUE_URL = get_optional_env('QUEUE_URL')
 SNS_TOPIC_ARN = get_optional_env('SNS_TOPIC_ARN')
 
-MAX_SIZE = (512, 512)
-QUALITY = 85
+# Table of size:format outputs produced from each upload, e.g.
+# '512:webp,512:jpeg,192:webp,96:webp,48:webp'. The first entry is the
+# primary image written to profiles/{user_id}.{ext}.
+RENDITIONS = parse_renditions(get_optional_env('RENDITIONS', DEFAULT_RENDITIONS))
+MAX_EDGE = max(rendition.size for rendition in RENDITIONS)
+
+# high (full decode + LANCZOS), balanced or fast. The lower tiers decode
+# JPEGs at reduced DCT scale and reduce by integer factors before the
+# final LANCZOS pass, cutting latency and peak memory on large photos.
+RESIZE_TIER = get_tier(get_optional_env('RESIZE_TIER', 'high'))
+
+# fixed (static quality 85 / method 6) or adaptive, which picks WebP
+# quality and method per image to land under ENCODE_TARGET_BYTES (for the
+# largest rendition) within ENCODE_BUDGET_MS
+ENCODE_SETTINGS = get_encode_settings(
+    get_optional_env('ENCODE_MODE', 'fixed'),
+    int(get_optional_env('ENCODE_TARGET_BYTES', str(40 * 1024))),
+    int(get_optional_env('ENCODE_BUDGET_MS', '250'))
+)
+
+# Stored on processed objects; a re-upload with the same content hash and
+# settings skips decode/encode
+SETTINGS_FINGERPRINT = settings_fingerprint(RENDITIONS, RESIZE_TIER, ENCODE_SETTINGS)
+CACHE_CONTROL = 'max-age=31536000'  # Cache for 1 year
+
+# Pre-flight limits checked from a ranged GET of the header, before the
+# full download and decode. Raise MAX_SOURCE_BYTES together with
+# generateUploadUrl's MAX_MULTIPART_FILE_SIZE. The pixel limit covers
+# 100 MP originals; each worker holds a source and its decode at once, so
+# size the function's memory for MAX_CONCURRENCY of them.
+MAX_SOURCE_BYTES = int(get_optional_env('MAX_SOURCE_BYTES', str(MAX_MULTIPART_UPLOAD_BYTES)))
+MAX_SOURCE_PIXELS = int(get_optional_env('MAX_SOURCE_PIXELS', '100000000'))
+ALLOWED_FORMATS = tuple(
+    fmt.strip().lower()
+    for fmt in get_optional_env('ALLOWED_FORMATS', 'jpeg,png,gif,webp').split(',')
+)
+
+# Encoded outputs at or above this size are sent with a multipart upload
+MULTIPART_THRESHOLD = int(get_optional_env('MULTIPART_THRESHOLD', str(8 * 1024 * 1024)))
 
+# Number of S3 objects processed in parallel within one SQS batch (one
+# user's uploads are always processed one at a time).
+# Pillow releases the GIL while decoding/resizing/encoding, so threads scale
+# with the vCPUs Lambda allocates for the configured memory size.
+MAX_CONCURRENCY = int(get_optional_env('MAX_CONCURRENCY', '4'))
 
+# Each object in flight downloads once, then uploads every rendition in
+# parallel, so the S3 pool is sized for both
+s3: S3Client = lazy_client('s3', max_pool_connections=MAX_CONCURRENCY * (len(RENDITIONS) + 1))
+sns: SNSClient = lazy_client('sns')
+
+# (messageId, bucket, key, eventTime)
+WorkItem = Tuple[str, str, str, str]
+
+
+@metrics.handler
+@logger.handler
+@profiler.handler
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Processes images from SQS queue triggered by S3 uploads.
     Resizes, optimizes, and saves to processed bucket.
     """
-    print('Event:', json.dumps(event))
+    logger.event(event)
     
     if not UPLOAD_BUCKET or not PROCESSED_BUCKET:
-        print('ERROR: Buckets not configured')
+        logger.error('Buckets not configured')
         return error_response('Image processing not configured')
     
     records = event.get('Records', [])
     
     if not records:
-        print('No records to process')
+        logger.info('No records to process')
         return success_response({'message': 'No records'})
     
-    processed_count = 0
-    failed_count = 0
+    # Pillow is deferred by lazy imports; load it here, before the worker
+    # threads first touch it
+    ensure_loaded(Image)
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
     
+    # Flatten SQS messages into (messageId, bucket, key, eventTime) work
+    # items. A message that can't be parsed is failed on its own without
+    # affecting the rest of the batch.
+    work_items: List[WorkItem] = []
+    failed_message_ids: Set[str] = set()
+
     for record in records:
+        message_id = record.get('messageId', '')
         try:
             message_body = json.loads(record['body'])
-            
-            s3_records = message_body.get('Records', [])
-            
-            for s3_record in s3_records:
+
+            for s3_record in message_body.get('Records', []):
                 s3_info = s3_record['s3']
-                bucket_name = s3_info['bucket']['name']
-                object_key = s3_info['object']['key']
-                
-                print(f'Processing: s3://{bucket_name}/{object_key}')
-                
-                process_image(bucket_name, object_key)
-                
-                processed_count += 1
-                
+                work_items.append((
+                    message_id,
+                    s3_info['bucket']['name'],
+                    s3_info['object']['key'],
+                    s3_record.get('eventTime', '')
+                ))
+
         except Exception as e:
-            print(f'Error processing record: {str(e)}')
-            failed_count += 1
-    
-    return success_response({
-        'message': f'Processed {processed_count} images, {failed_count} failed'
+            logger.error('Error parsing record %s: %s', message_id, e)
+            failed_message_ids.add(message_id)
+
+    processed_count = 0
+    failed_count = len(failed_message_ids)
+    deduplicated_count = 0
+    rejections: Counter[str] = Counter()
+    notifications: List[Dict[str, Any]] = []
+    batch_start = time.perf_counter()
+
+    # Uploads from different users run in parallel; one user's uploads
+    # share the same profiles/{user_id}.* keys, so they run one after
+    # another, oldest first, and the newest picture is written last.
+    by_user: Dict[str, List[WorkItem]] = {}
+    for item in work_items:
+        upload_key = parse_upload_key(item[2])
+        by_user.setdefault(upload_key.user_id if upload_key else item[2], []).append(item)
+
+    with ThreadPoolExecutor(max_workers=max(1, MAX_CONCURRENCY)) as executor:
+        futures = [executor.submit(_process_in_order, items) for items in by_user.values()]
+
+        for future in futures:
+            for message_id, result in future.result():
+                if isinstance(result, RejectedImage):
+                    # Not retried: redelivery would fail the same way
+                    logger.info('Rejected record %s: %s', message_id, result)
+                    rejections[result.reason] += 1
+                elif isinstance(result, Exception):
+                    logger.error('Error processing record %s: %s', message_id, result)
+                    failed_count += 1
+                    failed_message_ids.add(message_id)
+                else:
+                    outcome, notification = result
+                    if outcome == 'deduplicated':
+                        deduplicated_count += 1
+                    if notification:
+                        notifications.append(notification)
+                    processed_count += 1
+
+    # Notify once every image in the batch is uploaded, off the per-image path
+    if SNS_TOPIC_ARN and notifications:
+        with metrics.phase('Notify'):
+            publish_notifications(sns, SNS_TOPIC_ARN, notifications)
+
+    batch_ms = (time.perf_counter() - batch_start) * 1000
+    metrics.count('Images', processed_count)
+    metrics.count('Deduplicated', deduplicated_count)
+    metrics.count('Rejected', sum(rejections.values()))
+    metrics.count('Failed', failed_count)
+    dedup_skip_rate = deduplicated_count / processed_count if processed_count else 0.0
+    logger.info(
+        'Batch complete: %d processed, %d failed in %.0f ms', processed_count, failed_count, batch_ms,
+        deduplicated=deduplicated_count,
+        dedupSkipRate=round(dedup_skip_rate, 2),
+        rejected=dict(rejections),
+        objects=len(work_items),
+        concurrency=MAX_CONCURRENCY
+    )
+
+    # Only the failed messages are returned to the queue for redelivery.
+    # Requires ReportBatchItemFailures on the SQS event source mapping.
+    response = success_response({
+        'message': (
+            f'Processed {processed_count} images, {failed_count} failed, '
+            f'{sum(rejections.values())} rejected'
+        ),
+        'rejected': dict(rejections),
+        'deduplicated': deduplicated_count,
+        'dedupSkipRate': round(dedup_skip_rate, 4)
     })
+    response['batchItemFailures'] = [
+        {'itemIdentifier': message_id} for message_id in sorted(failed_message_ids)
+    ]
+    return response
 
 
-def process_image(source_bucket: str, source_key: str) -> None:
+def _process_in_order(
+        items: List[WorkItem]
+) -> List[Tuple[str, Union[Tuple[str, Optional[Dict[str, Any]]], Exception]]]:
+    """
+    Processes one user's uploads sequentially by event time.
+
+    Returns:
+        (messageId, process_image outcome or the exception it raised) per item
+    """
+    results: List[Tuple[str, Union[Tuple[str, Optional[Dict[str, Any]]], Exception]]] = []
+    for message_id, bucket_name, object_key, _ in sorted(items, key=lambda item: (item[3], item[2])):
+        try:
+            results.append((message_id, _timed_process_image(bucket_name, object_key)))
+        except Exception as e:
+            results.append((message_id, e))
+    return results
+
+
+def _timed_process_image(source_bucket: str, source_key: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Runs process_image and logs how long the object took.
+
+    Returns:
+        process_image outcome
+    """
+    logger.info('Processing: s3://%s/%s', source_bucket, source_key)
+    start = time.perf_counter()
+
+    try:
+        return process_image(source_bucket, source_key)
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info('Timing: %s took %.0f ms', source_key, elapsed_ms)
+
+
+def process_image(source_bucket: str, source_key: str) -> Tuple[str, Optional[Dict[str, Any]]]:
     """
     Downloads, processes, and uploads an image.
     
     Steps:
-    1. Download from S3 raw bucket
-    2. Resize to max dimensions (maintaining aspect ratio)
-    3. Optimize quality
-    4. Convert to WebP (smaller file size)
-    5. Upload to processed bucket
+    1. Ranged GET of the header; reject oversized or disallowed uploads
+    2. Stream from S3 raw bucket into a reusable buffer
+    3. Skip to 7 if the same bytes were already processed with these settings
+    4. Decode once (at reduced scale for fast tiers)
+    5. Resize to every rendition size (maintaining aspect ratio)
+    6. Flatten transparency at output size, encode each rendition format
+       (WebP, JPEG, optionally AVIF) and upload concurrently
+    7. Build the SNS notification (published per batch by the handler)
+    
+    Returns:
+        ('processed' or 'deduplicated' if decode/encode was skipped,
+        notification payload or None if SNS isn't configured)
     """
-    print(f'Downloading: {source_key}')
+    # uploads/user-123/20260108-235731.png or
+    # uploads/2026/01/08/user-123/20260108-235731.png
+    upload_key = parse_upload_key(source_key)
+    if not upload_key:
+        raise RejectedImage('key', f'{source_key} is not an upload key')
+    user_id = upload_key.user_id
     
-    response = s3.get_object(Bucket=source_bucket, Key=source_key)
-    image_data = response['Body'].read()
+    with metrics.phase('Preflight'):
+        header = inspect_upload(s3, source_bucket, source_key)
+    check_limits(
+        source_key, header.format, header.width, header.height, header.total_bytes,
+        MAX_SOURCE_BYTES, MAX_SOURCE_PIXELS, ALLOWED_FORMATS
+    )
     
-    img = Image.open(BytesIO(image_data))
+    if header.complete:
+        # Small upload: the ranged GET already returned all of it
+        source = memoryview(header.data)
+    else:
+        logger.info('Downloading: %s (%s bytes)', source_key, header.total_bytes)
+        # Stream into this worker's reusable buffer and decode straight from it
+        with metrics.phase('Download'):
+            source = download_to_buffer(s3, source_bucket, source_key)
+    metrics.add('BytesIn', len(source), 'Bytes')
     
-    if img.mode in ('RGBA', 'LA', 'P'):
-        background = Image.new('RGB', img.size, (255, 255, 255))
-        if img.mode == 'P':
-            img = img.convert('RGBA')
-        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-        img = background
+    # Generate destination keys
+    # → profiles/user-123.webp (primary), profiles/user-123/96.webp, ...
+    dest_keys = [
+        (rendition, rendition.key(user_id, primary=index == 0))
+        for index, rendition in enumerate(RENDITIONS)
+    ]
+    dest_key = dest_keys[0][1]
     
-    img.thumbnail(MAX_SIZE, Image.Resampling.LANCZOS)
+    with metrics.phase('Dedup'):
+        content_hash = source_hash(source)
+        metadata = build_metadata(content_hash, SETTINGS_FINGERPRINT)
+        primary_metadata = find_duplicate(s3, PROCESSED_BUCKET, dest_key, content_hash, SETTINGS_FINGERPRINT) # type: ignore
+        refreshed = primary_metadata is not None and refresh(
+            s3, PROCESSED_BUCKET, dest_keys, metadata, {'CacheControl': CACHE_CONTROL}, primary_metadata # type: ignore
+        )
     
-    print(f'Resized to: {img.size}')
+    if refreshed:
+        logger.info('Duplicate upload, refreshed: %s → %s', source_key, dest_key)
+        return 'deduplicated', _build_notification(user_id, source_key, dest_keys, deduplicated=True)
+    if primary_metadata is not None:
+        logger.info('Duplicate upload with missing renditions, re-encoding: %s', source_key)
     
-    buffer = BytesIO()
-    img.save(buffer, format='WebP', quality=QUALITY, method=6)
-    buffer.seek(0)
+    with metrics.phase('Decode'):
+        img = Image.open(MemoryViewReader(source))
+        if header.format is None:
+            # Header wasn't found in the ranged GET; Image.open only reads the
+            # header, so this still runs before any pixels are decoded
+            check_limits(
+                source_key, (img.format or '').lower(), img.width, img.height, len(source),
+                MAX_SOURCE_BYTES, MAX_SOURCE_PIXELS, ALLOWED_FORMATS
+            )
+        apply_draft(img, MAX_EDGE, RESIZE_TIER)
+        # Pillow decodes lazily; load here so the pixels are decoded
+        # inside this phase rather than by the first resize
+        img.load()
+        img = prepare(img)
+    decoded_bytes = img.width * img.height * len(img.getbands())
     
-    # Generate destination key (replace extension with .webp)
-    # uploads/user-123/20260108-235731.png → profiles/user-123.webp
-    user_id = source_key.split('/')[1]  # Extract user-123 from path
-    dest_key = f'profiles/{user_id}.webp'
+    # Resizing to every rendition size and encoding
+    with metrics.phase('Encode'):
+        outputs = render(img, RENDITIONS, RESIZE_TIER, ENCODE_SETTINGS)
+    del img
     
-    print(f'Uploading to: {dest_key}')
+    with metrics.phase('Upload'), ThreadPoolExecutor(max_workers=len(outputs)) as executor:
+        futures = [
+            executor.submit(
+                upload_buffer,
+                s3,
+                buffer,
+                PROCESSED_BUCKET, # type: ignore
+                key,
+                {
+                    'ContentType': rendition.content_type,
+                    'CacheControl': CACHE_CONTROL,
+                    # Record the encoder parameters chosen for this rendition
+                    'Metadata': {**metadata, **encoder_metadata},
+                },
+                MULTIPART_THRESHOLD
+            )
+            for (rendition, buffer, encoder_metadata), (_, key) in zip(outputs, dest_keys)
+        ]
+        for future in futures:
+            future.result()
     
-    s3.put_object(
-        Bucket=PROCESSED_BUCKET, # type: ignore
-        Key=dest_key,
-        Body=buffer.getvalue(),
-        ContentType='image/webp',
-        CacheControl='max-age=31536000',  # Cache for 1 year
+    encoded_bytes = sum(buffer.getbuffer().nbytes for _, buffer, _ in outputs)
+    metrics.add('BytesOut', encoded_bytes, 'Bytes')
+    logger.info(
+        'Memory: %s', source_key,
+        sourceBytes=len(source),
+        decodedBytes=decoded_bytes,
+        encodedBytes=encoded_bytes,
+        peakRssMb=round(peak_rss_mb(), 1)
     )
     
-    print(f'Successfully processed: {source_key} → {dest_key}')
+    logger.info('Successfully processed: %s → %s (+%s renditions)', source_key, dest_key, len(outputs) - 1)
+    
+    return 'processed', _build_notification(user_id, source_key, dest_keys)
 
-    if SNS_TOPIC_ARN:
-        try:
-            # Build public image URL
-            image_url = f'https://{PROCESSED_BUCKET}.s3.amazonaws.com/{dest_key}'
-            
-            sns.publish(
-                TopicArn=SNS_TOPIC_ARN,
-                Subject=f'Profile image processed for {user_id}',
-                Message=json.dumps({
-                    'userId': user_id,
-                    'imageUrl': image_url,
-                    'sourceKey': source_key,
-                    'processedKey': dest_key,
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }, indent=2)
-            )
-            
-            print(f'SNS notification sent for {user_id}')
-            
-        except Exception as e:
-            print(f'SNS publish error: {str(e)}')
+
+def _build_notification(
+        user_id: str,
+        source_key: str,
+        dest_keys: List[Tuple[Rendition, str]],
+        deduplicated: bool = False
+) -> Optional[Dict[str, Any]]:
+    """Builds the processed image SNS message payload"""
+    if not SNS_TOPIC_ARN:
+        return None
+
+    # Build public image URL
+    dest_key = dest_keys[0][1]
+    image_url = f'https://{PROCESSED_BUCKET}.s3.amazonaws.com/{dest_key}'
+
+    return {
+        'userId': user_id,
+        'imageUrl': image_url,
+        'sourceKey': source_key,
+        'processedKey': dest_key,
+        'renditions': [
+            {
+                'size': rendition.size,
+                'format': rendition.format,
+                'key': key,
+                'url': f'https://{PROCESSED_BUCKET}.s3.amazonaws.com/{key}'
+            }
+            for rendition, key in dest_keys
+        ],
+        'deduplicated': deduplicated,
+        'timestamp': datetime.now(timezone.utc).isoformat()
+    }
@@ -0,0 +1,62 @@
+"""
+Batched SNS notifications for processed images
+"""
+from __future__ import annotations
+import json
+from typing import Dict, Any, List, TYPE_CHECKING
+if TYPE_CHECKING:
+    from mypy_boto3_sns import SNSClient
+
+from shared.python.logger import logger
+
+# SNS PublishBatch accepts at most 10 entries per call
+MAX_BATCH_ENTRIES = 10
+
+
+def publish_notifications(sns: SNSClient, topic_arn: str, notifications: List[Dict[str, Any]]) -> int:
+    """
+    Publishes notifications in batches of 10 with compact JSON.
+    Entries the batch API reports as failed are retried one at a time.
+
+    Args:
+        sns: SNS client
+        topic_arn: Topic to publish to
+        notifications: Message payloads; each must include userId
+
+    Returns:
+        Number of notifications that could not be delivered
+    """
+    undelivered = 0
+
+    for start in range(0, len(notifications), MAX_BATCH_ENTRIES):
+        batch = notifications[start:start + MAX_BATCH_ENTRIES]
+        entries = {
+            str(index): {
+                'Id': str(index),
+                'Subject': f'Profile image processed for {notification["userId"]}',
+                'Message': json.dumps(notification, separators=(',', ':')),
+            }
+            for index, notification in enumerate(batch)
+        }
+
+        try:
+            response = sns.publish_batch(
+                TopicArn=topic_arn,
+                PublishBatchRequestEntries=list(entries.values())  # type: ignore[arg-type]
+            )
+            failed_ids = [failure['Id'] for failure in response.get('Failed', [])]
+        except Exception as e:
+            logger.error('SNS publish batch error: %s', e)
+            failed_ids = list(entries)
+
+        for entry_id in failed_ids:
+            entry = entries[entry_id]
+            try:
+                sns.publish(TopicArn=topic_arn, Subject=entry['Subject'], Message=entry['Message'])
+            except Exception as e:
+                logger.error('SNS publish error: %s', e)
+                undelivered += 1
+
+        logger.info('SNS notifications sent: %s batched, %s retried', len(batch) - len(failed_ids), len(failed_ids))
+
+    return undelivered
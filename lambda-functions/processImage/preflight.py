@@ -0,0 +1,195 @@
+"""
+Header-first inspection of uploads before the full download
+"""
+from __future__ import annotations
+import struct
+from dataclasses import dataclass
+from typing import Optional, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+# First ranged GET, then one larger retry for JPEGs with big EXIF/ICC/XMP
+# segments ahead of the frame header.
+HEAD_BYTES = 64 * 1024
+MAX_HEAD_BYTES = 512 * 1024
+
+JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}
+
+
+class RejectedImage(Exception):
+    """Upload failed pre-flight checks and should not be processed or retried"""
+
+    def __init__(self, reason: str, detail: str):
+        super().__init__(f'{reason}: {detail}')
+        self.reason = reason
+
+
+@dataclass
+class ImageHeader:
+    """What the pre-flight stage learned about an upload"""
+
+    format: Optional[str]
+    width: int
+    height: int
+    total_bytes: int
+    data: bytes
+
+    @property
+    def complete(self) -> bool:
+        """True if the ranged GET already returned the whole object"""
+        return len(self.data) >= self.total_bytes
+
+
+def parse_dimensions(data: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    Reads format and pixel dimensions from the start of an image file
+
+    Args:
+        data: Leading bytes of the file
+
+    Returns:
+        (format, width, height), or None if the format isn't recognised or
+        the header extends past the supplied bytes
+    """
+    try:
+        if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR':
+            width, height = struct.unpack('>II', data[16:24])
+            return 'png', width, height
+
+        if data[:6] in (b'GIF87a', b'GIF89a'):
+            width, height = struct.unpack('<HH', data[6:10])
+            return 'gif', width, height
+
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            return _parse_webp(data)
+
+        if data[:2] == b'\xff\xd8':
+            return _parse_jpeg(data)
+
+    except struct.error:
+        return None
+
+    return None
+
+
+def _parse_webp(data: bytes) -> Optional[Tuple[str, int, int]]:
+    chunk = data[12:16]
+
+    if chunk == b'VP8 ' and data[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', data[26:30])
+        return 'webp', width & 0x3FFF, height & 0x3FFF
+
+    if chunk == b'VP8L' and data[20:21] == b'\x2f':
+        b0, b1, b2, b3 = data[21:25]
+        width = 1 + (b0 | (b1 & 0x3F) << 8)
+        height = 1 + (b1 >> 6 | b2 << 2 | (b3 & 0x0F) << 10)
+        return 'webp', width, height
+
+    if chunk == b'VP8X':
+        width = 1 + int.from_bytes(data[24:27], 'little')
+        height = 1 + int.from_bytes(data[27:30], 'little')
+        return 'webp', width, height
+
+    return None
+
+
+def _parse_jpeg(data: bytes) -> Optional[Tuple[str, int, int]]:
+    position = 2
+
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+
+        marker = data[position + 1]
+
+        # Fill bytes and standalone markers carry no length
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            position += 2
+            continue
+
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH', data[position + 5:position + 9])
+            return 'jpeg', width, height
+
+        (length,) = struct.unpack('>H', data[position + 2:position + 4])
+        position += 2 + length
+
+    return None
+
+
+def _ranged_get(s3: S3Client, bucket: str, key: str, size: int) -> Tuple[bytes, int]:
+    from botocore.exceptions import ClientError
+
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{size - 1}')
+    except ClientError as e:
+        # S3 answers any range on a zero-byte object with 416 InvalidRange
+        if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+            raise RejectedImage('empty', f'{key} is 0 bytes')
+        raise
+    data = response['Body'].read()
+
+    # 'bytes 0-65535/1234567' → 1234567
+    content_range = response.get('ContentRange', '')
+    total = int(content_range.rsplit('/', 1)[-1]) if '/' in content_range else len(data)
+    return data, total
+
+
+def inspect_upload(s3: S3Client, bucket: str, key: str) -> ImageHeader:
+    """
+    Fetches just enough of an upload to identify its format and dimensions
+
+    Returns:
+        Header info. format is None if the header couldn't be located within
+        MAX_HEAD_BYTES; callers fall back to checking after Image.open.
+
+    Raises:
+        RejectedImage: If the upload is empty or isn't a supported image
+    """
+    data, total = _ranged_get(s3, bucket, key, HEAD_BYTES)
+    parsed = parse_dimensions(data)
+
+    if parsed is None and len(data) < total and data[:2] == b'\xff\xd8':
+        data, total = _ranged_get(s3, bucket, key, MAX_HEAD_BYTES)
+        parsed = parse_dimensions(data)
+
+    if parsed is None:
+        if len(data) >= total:
+            raise RejectedImage('unidentified', f'{key} is not a supported image')
+        return ImageHeader(None, 0, 0, total, data)
+
+    fmt, width, height = parsed
+    return ImageHeader(fmt, width, height, total, data)
+
+
+def check_limits(
+        key: str,
+        fmt: Optional[str],
+        width: int,
+        height: int,
+        total_bytes: int,
+        max_bytes: int,
+        max_pixels: int,
+        allowed_formats: Tuple[str, ...]
+) -> None:
+    """
+    Raises RejectedImage if an upload is over the byte/pixel limits or in a
+    disallowed format
+    """
+    if total_bytes > max_bytes:
+        raise RejectedImage('too-large', f'{key} is {total_bytes} bytes (limit {max_bytes})')
+
+    if fmt is not None and fmt not in allowed_formats:
+        raise RejectedImage('format', f'{key} is {fmt} (allowed {", ".join(allowed_formats)})')
+
+    if width * height > max_pixels:
+        raise RejectedImage(
+            'too-many-pixels',
+            f'{key} is {width}x{height} (limit {max_pixels} pixels)'
+        )
@@ -0,0 +1,175 @@
+"""
+Rendition table for processed profile images
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, Any, List, Tuple
+
+from shared.python.lazy_imports import lazy_import
+from shared.python.logger import logger
+
+from encoding import EncodeSettings, encode_webp_adaptive
+from resize import ResizeTier, RESIZE_TIERS, downscale
+
+Image = lazy_import('PIL.Image')
+features = lazy_import('PIL.features')
+
+# format name -> (Pillow format, content type, file extension, save options)
+FORMATS: Dict[str, Tuple[str, str, str, Dict[str, Any]]] = {
+    'webp': ('WebP', 'image/webp', 'webp', {'quality': 85, 'method': 6}),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'avif': ('AVIF', 'image/avif', 'avif', {'quality': 60, 'speed': 6}),
+}
+
+DEFAULT_RENDITIONS = '512:webp'
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """One output size/format produced from a source image"""
+
+    size: int
+    format: str
+
+    @property
+    def content_type(self) -> str:
+        return FORMATS[self.format][1]
+
+    @property
+    def extension(self) -> str:
+        return FORMATS[self.format][2]
+
+    def key(self, user_id: str, primary: bool = False) -> str:
+        """
+        Destination key for this rendition
+
+        The primary rendition keeps the original profiles/{user_id}.webp
+        location so existing clients don't need to change.
+        """
+        if primary:
+            return f'profiles/{user_id}.{self.extension}'
+        return f'profiles/{user_id}/{self.size}.{self.extension}'
+
+
+def parse_renditions(spec: str) -> List[Rendition]:
+    """
+    Parse a rendition table like '512:webp,512:jpeg,192:webp,96:webp'
+
+    Args:
+        spec: Comma separated size:format entries. The first entry is the
+            primary rendition.
+
+    Returns:
+        Renditions in table order, skipping formats this Pillow build
+        can't encode
+
+    Raises:
+        ValueError: If an entry is malformed or no usable entries remain
+    """
+    renditions: List[Rendition] = []
+
+    for entry in spec.split(','):
+        entry = entry.strip().lower()
+        if not entry:
+            continue
+
+        size, _, fmt = entry.partition(':')
+        fmt = fmt or 'webp'
+
+        if fmt not in FORMATS or not size.isdigit() or int(size) <= 0:
+            raise ValueError(f'Invalid rendition: {entry}')
+
+        if fmt == 'avif' and not features.check('avif'):
+            logger.warning('AVIF not supported by this Pillow build, skipping %s', entry)
+            continue
+
+        rendition = Rendition(int(size), fmt)
+        if rendition not in renditions:
+            renditions.append(rendition)
+
+    if not renditions:
+        raise ValueError(f'No usable renditions in: {spec}')
+
+    return renditions
+
+
+def prepare(img: Image.Image) -> Image.Image:
+    """
+    Normalises the decoded image to a mode that resizes correctly.
+
+    Alpha is kept here (Pillow premultiplies it while resampling) and only
+    flattened once the image is down to output size, so the full resolution
+    source is never copied onto a background.
+    """
+    if img.mode == 'P':
+        return img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    if img.mode not in ('RGB', 'RGBA', 'LA', 'L'):
+        return img.convert('RGB')
+    return img
+
+
+def flatten(img: Image.Image) -> Image.Image:
+    """Composites transparent images onto white at their current (output) size"""
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def render(
+        img: Image.Image,
+        renditions: List[Rendition],
+        tier: ResizeTier = RESIZE_TIERS['high'],
+        encode_settings: EncodeSettings = EncodeSettings()
+) -> List[Tuple[Rendition, BytesIO, Dict[str, str]]]:
+    """
+    Produces every rendition from a single decoded image.
+
+    Sizes are generated largest first and each smaller size is resampled
+    from the previous one instead of the full resolution source.
+
+    Args:
+        img: Decoded source image (see prepare)
+        renditions: Rendition table
+        tier: Resize quality tier
+        encode_settings: Fixed or adaptive WebP encoding
+
+    Returns:
+        (rendition, encoded buffer, encoder metadata) in table order
+    """
+    encoded: Dict[Rendition, Tuple[BytesIO, Dict[str, str]]] = {}
+    current = img
+    largest_area = 0
+
+    for size in sorted({r.size for r in renditions}, reverse=True):
+        current = downscale(current, size, tier)
+
+        logger.info('Resized to: %s', current.size)
+        output = flatten(current)
+        largest_area = largest_area or output.width * output.height
+
+        for rendition in renditions:
+            if rendition.size != size:
+                continue
+
+            pil_format, _, _, options = FORMATS[rendition.format]
+
+            if rendition.format == 'webp' and encode_settings.mode == 'adaptive':
+                # Scale the byte budget down with the pixel count
+                target_bytes = encode_settings.target_bytes * output.width * output.height // largest_area
+                encoded[rendition] = encode_webp_adaptive(output, target_bytes, encode_settings)
+                logger.info('Adaptive WebP %s: %s', size, encoded[rendition][1])
+                continue
+
+            buffer = BytesIO()
+            output.save(buffer, format=pil_format, **options)
+            buffer.seek(0)
+            encoded[rendition] = (buffer, {
+                f'encoder-{name}': str(value) for name, value in options.items()
+            })
+
+    return [(rendition, *encoded[rendition]) for rendition in renditions]
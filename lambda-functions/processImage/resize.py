@@ -0,0 +1,100 @@
+"""
+Downscaling quality tiers for processed profile images
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+from shared.python.logger import logger
+
+# Image.Resampling.LANCZOS, spelled out so defining the tiers doesn't load Pillow
+LANCZOS = 1
+
+
+@dataclass(frozen=True)
+class ResizeTier:
+    """
+    How aggressively a large source is reduced before the final resample
+
+    draft_gap: Decode JPEGs at a reduced DCT scale (1/2, 1/4, 1/8) that still
+        leaves at least this many times the largest target size. None decodes
+        at full resolution.
+    reducing_gap: Integer-factor reduce() before the final resample while the
+        image stays at least this many times the target size. None resamples
+        straight from the decoded image.
+    """
+
+    name: str
+    draft_gap: Optional[float]
+    reducing_gap: Optional[float]
+    resample: int = LANCZOS
+
+
+RESIZE_TIERS: Dict[str, ResizeTier] = {
+    # Full resolution decode + LANCZOS, the original behaviour
+    'high': ResizeTier('high', draft_gap=None, reducing_gap=None),
+    # Visually indistinguishable at avatar sizes, large latency/RSS win
+    'balanced': ResizeTier('balanced', draft_gap=2.0, reducing_gap=3.0),
+    # Smallest decode and reduce margin, slight loss of fine detail
+    'fast': ResizeTier('fast', draft_gap=1.0, reducing_gap=1.5),
+}
+
+
+def get_tier(name: str) -> ResizeTier:
+    """
+    Look up a resize tier by name
+
+    Raises:
+        ValueError: If the tier doesn't exist
+    """
+    tier = RESIZE_TIERS.get(name.strip().lower())
+    if not tier:
+        raise ValueError(f'Invalid resize tier: {name}. Allowed: {", ".join(RESIZE_TIERS)}')
+    return tier
+
+
+def fit_within(size: Tuple[int, int], max_edge: int) -> Tuple[int, int]:
+    """
+    Size that fits inside a max_edge square keeping aspect ratio (never upscales)
+    """
+    width, height = size
+    scale = min(max_edge / width, max_edge / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def apply_draft(img: Image.Image, max_edge: int, tier: ResizeTier) -> None:
+    """
+    Configures reduced-scale decoding before the image is loaded.
+
+    Only codecs with native scaled decoding (JPEG) are affected; for every
+    other format this is a no-op. Must be called before img.load().
+    """
+    if tier.draft_gap is None:
+        return
+
+    target_width, target_height = fit_within(img.size, max_edge)
+    requested = (
+        int(target_width * tier.draft_gap),
+        int(target_height * tier.draft_gap)
+    )
+
+    original_size = img.size
+    if img.draft(None, requested) is not None and img.size != original_size:
+        logger.info('Draft decode: %s → %s', original_size, img.size)
+
+
+def downscale(img: Image.Image, max_edge: int, tier: ResizeTier) -> Image.Image:
+    """
+    Downscales an image to fit a max_edge square
+
+    Returns:
+        Resized image, or the same image if it already fits
+    """
+    target = fit_within(img.size, max_edge)
+    if target == img.size:
+        return img
+
+    return img.resize(target, tier.resample, reducing_gap=tier.reducing_gap)
@@ -0,0 +1,130 @@
+"""
+Copy-free download/upload helpers for the image pipeline
+"""
+from __future__ import annotations
+import io
+import resource
+import threading
+from typing import Any, Dict, TYPE_CHECKING
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+CHUNK_SIZE = 256 * 1024
+
+_local = threading.local()
+
+
+class MemoryViewReader(io.RawIOBase):
+    """
+    Read-only seekable file object over a memoryview.
+
+    io.BytesIO copies anything that isn't bytes, so this lets Pillow read
+    straight out of the reusable download buffer.
+    """
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        size = min(len(b), len(self._view) - self._pos)
+        if size <= 0:
+            return 0
+        b[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        else:
+            raise ValueError(f'Invalid whence: {whence}')
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def _get_buffer(size: int) -> bytearray:
+    """
+    Per-thread download buffer, grown to the largest object seen and reused
+    for every later object handled by the same worker thread
+    """
+    buffer: bytearray | None = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(max(size, len(buffer or b'') * 2))
+        _local.buffer = buffer
+    return buffer
+
+
+def download_to_buffer(s3: S3Client, bucket: str, key: str) -> memoryview:
+    """
+    Streams an S3 object into the calling thread's reusable buffer
+
+    Returns:
+        View over exactly the object's bytes. Only valid until the same
+        thread downloads another object.
+    """
+    response = s3.get_object(Bucket=bucket, Key=key)
+    length = response['ContentLength']
+    view = memoryview(_get_buffer(length))
+
+    position = 0
+    for chunk in response['Body'].iter_chunks(CHUNK_SIZE):
+        view[position:position + len(chunk)] = chunk
+        position += len(chunk)
+
+    return view[:position]
+
+
+def upload_buffer(
+        s3: S3Client,
+        buffer: io.BytesIO,
+        bucket: str,
+        key: str,
+        extra_args: Dict[str, Any],
+        multipart_threshold: int
+) -> None:
+    """
+    Uploads an encoded buffer without materialising another copy of it
+
+    Outputs at or above multipart_threshold go through a multipart upload.
+    """
+    size = buffer.seek(0, io.SEEK_END)
+    buffer.seek(0)
+
+    if size >= multipart_threshold:
+        # boto3.s3.transfer pulls in all of boto3; only large outputs need it
+        from boto3.s3.transfer import TransferConfig
+
+        s3.upload_fileobj(
+            buffer,
+            bucket,
+            key,
+            ExtraArgs=extra_args,  # type: ignore[arg-type]
+            Config=TransferConfig(
+                multipart_threshold=multipart_threshold,
+                multipart_chunksize=max(multipart_threshold, 5 * 1024 * 1024),
+                use_threads=False
+            )
+        )
+    else:
+        s3.put_object(Bucket=bucket, Key=key, Body=buffer, **extra_args)
+
+
+def peak_rss_mb() -> float:
+    """Process peak resident memory (MB) so far"""
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,315 @@
+from __future__ import annotations
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
+from botocore.exceptions import ClientError
+if TYPE_CHECKING:
+    from mypy_boto3_ses import SESClient
+    from mypy_boto3_sqs import SQSClient
+
+from shared.python.responses import success_response, error_response
+from shared.python.env_config import get_optional_env
+from shared.python.aws_clients import lazy_client
+from shared.python.email_templates import (
+    render_email, resolve_locale, ses_message, ses_template_name, sync_ses_templates
+)
+from shared.python.email_outbox import EmailJob, decode_job
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+from shared.python.profiling import profiler
+
+from rate_limit import TokenBucket
+
+SEND_CONCURRENCY = int(get_optional_env('SEND_CONCURRENCY', '4'))
+ses: SESClient = lazy_client('ses', max_pool_connections=max(1, SEND_CONCURRENCY))
+sqs: SQSClient = lazy_client('sqs')
+
+SENDER_EMAIL = get_optional_env('SENDER_EMAIL')
+
+
+def _account_send_rate() -> float:
+    """SES_SEND_RATE if set, else the account's MaxSendRate (sandbox: 1/s)"""
+    configured = get_optional_env('SES_SEND_RATE')
+    if configured:
+        return float(configured)
+    try:
+        return float(ses.get_send_quota()['MaxSendRate'])
+    except Exception as e:
+        logger.warning('Send quota lookup failed, assuming 1/s: %s', e)
+        return 1.0
+
+
+# Shared by all send threads and kept across warm invocations; built on the
+# first batch so the quota lookup stays off the cold start. Run this
+# consumer with reserved concurrency 1 so the bucket is the only sender.
+_bucket: Optional[TokenBucket] = None
+# With a prefix set, jobs go out through SendBulkTemplatedEmail using the
+# SES templates published by {"action": "syncTemplates"} ({prefix}-{kind}-
+# {locale}), up to 50 recipients (and no more than one second of send rate)
+# per call. Without one, each job is rendered and sent on its own.
+SES_TEMPLATE_PREFIX = get_optional_env('SES_TEMPLATE_PREFIX')
+MAX_BULK_SIZE = 50
+# Throttled sends are retried in-process this many times, then handed back
+# to SQS with an exponentially growing visibility timeout
+SEND_ATTEMPTS = 3
+RETRY_BASE_S = 0.2
+REDELIVERY_BASE_S = 30
+THROTTLE_CODES = ('Throttling', 'ThrottlingException', 'TooManyRequestsException')
+# Bulk statuses worth retrying in-process
+RETRYABLE_STATUSES = ('AccountThrottled', 'TransientFailure', 'Failed')
+# Bulk statuses that can never succeed for this recipient and are dropped.
+# Anything else (quota, paused sending, missing template or MAIL FROM) is
+# handed back to SQS so it is redelivered and ends in the DLQ if it persists.
+PERMANENT_STATUSES = ('MessageRejected', 'InvalidParameterValue')
+
+Outcome = str  # 'sent' | 'retry' | 'dropped'
+
+
+@metrics.handler
+@logger.handler
+@profiler.handler
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Drains the email outbox queue (SQS trigger, ReportBatchItemFailures).
+    Sends are paced by a token bucket at the account's send rate; throttled
+    messages are retried with backoff and then redelivered by SQS.
+    Invoke with {"action": "syncTemplates"} after a deploy to publish the
+    SES templates used for bulk sends.
+    """
+    logger.event(event)
+
+    if event.get('action') == 'syncTemplates':
+        return _sync_templates()
+
+    if not SENDER_EMAIL:
+        logger.error('SENDER_EMAIL not configured')
+        return error_response('Email service not configured')
+
+    records = event.get('Records', [])
+
+    if not records:
+        logger.info('No records to process')
+        return success_response({'message': 'No records'})
+
+    send_rate = _get_bucket().rate
+    bulk_size = max(1, min(MAX_BULK_SIZE, int(send_rate)))
+    batch_start = time.perf_counter()
+    now_ms = int(time.time() * 1000)
+    jobs: List[Tuple[Dict[str, Any], EmailJob]] = []
+    outcomes: Dict[str, Outcome] = {}
+    queue_latencies_ms: List[int] = []
+
+    for record in records:
+        message_id = record.get('messageId', '')
+        try:
+            jobs.append((record, decode_job(record['body'])))
+        except Exception as e:
+            # Redelivery would fail the same way
+            logger.info('Dropping malformed job %s: %s', message_id, e)
+            outcomes[message_id] = 'dropped'
+            continue
+
+        sent_ms = int(record.get('attributes', {}).get('SentTimestamp', now_ms))
+        queue_latencies_ms.append(now_ms - sent_ms)
+
+    with ThreadPoolExecutor(max_workers=max(1, SEND_CONCURRENCY)) as executor:
+        futures = []
+
+        if SES_TEMPLATE_PREFIX:
+            groups: Dict[str, List[Tuple[Dict[str, Any], EmailJob]]] = {}
+            for record, job in jobs:
+                template = ses_template_name(SES_TEMPLATE_PREFIX, job.kind, resolve_locale(job.kind, job.locale))
+                groups.setdefault(template, []).append((record, job))
+
+            for template, batch in groups.items():
+                for start in range(0, len(batch), bulk_size):
+                    futures.append(executor.submit(_send_bulk, template, batch[start:start + bulk_size]))
+        else:
+            futures.extend(executor.submit(_send_single, record, job) for record, job in jobs)
+
+        for future in futures:
+            outcomes.update(future.result())
+
+    retry_records = [record for record in records if outcomes.get(record.get('messageId', '')) == 'retry']
+    for record in retry_records:
+        _delay_redelivery(record)
+
+    batch_s = time.perf_counter() - batch_start
+    sent = sum(1 for outcome in outcomes.values() if outcome == 'sent')
+    dropped = sum(1 for outcome in outcomes.values() if outcome == 'dropped')
+    latencies = sorted(queue_latencies_ms)
+    summary = {
+        'sent': sent,
+        'retried': len(retry_records),
+        'dropped': dropped,
+        'sendsPerSecond': round(sent / batch_s, 2) if batch_s else 0.0,
+        'sendRateLimit': send_rate,
+        'queueLatencyMsP50': latencies[len(latencies) // 2] if latencies else 0,
+        'queueLatencyMsMax': latencies[-1] if latencies else 0,
+        'batchMs': round(batch_s * 1000)
+    }
+    logger.info('Batch complete', **summary)
+    metrics.count('Sent', sent)
+    metrics.count('Retried', len(retry_records))
+    metrics.count('Dropped', dropped)
+    metrics.add('QueueLatencyMaxMs', summary['queueLatencyMsMax'], 'Milliseconds')
+
+    response = success_response({'message': f'{sent} sent', **summary})
+    response['batchItemFailures'] = [{'itemIdentifier': record['messageId']} for record in retry_records]
+    return response
+
+
+def _get_bucket() -> TokenBucket:
+    """
+    The send rate limiter, created on first use. The handler calls this
+    before starting send threads, so they never race to create it.
+    """
+    global _bucket
+    if _bucket is None:
+        _bucket = TokenBucket(_account_send_rate())
+    return _bucket
+
+
+def _sync_templates() -> Dict[str, Any]:
+    if not SES_TEMPLATE_PREFIX:
+        return error_response('SES_TEMPLATE_PREFIX not configured')
+
+    try:
+        names = sync_ses_templates(ses, SES_TEMPLATE_PREFIX)
+    except Exception as e:
+        logger.error('Template sync error: %s', e)
+        return error_response('Failed to sync email templates')
+
+    logger.info('Synced %s SES templates', len(names))
+    return success_response({'message': f'Synced {len(names)} templates', 'templates': names})
+
+
+def _is_throttle(error: ClientError) -> bool:
+    return error.response.get('Error', {}).get('Code') in THROTTLE_CODES
+
+
+def _backoff(attempt: int) -> None:
+    """Sleep and drain the bucket so every sender slows down, not just this one"""
+    delay_s = RETRY_BASE_S * (2 ** attempt)
+    _get_bucket().penalize(delay_s)
+    with metrics.phase('Backoff'):
+        time.sleep(delay_s)
+
+
+def _send_single(record: Dict[str, Any], job: EmailJob) -> Dict[str, Outcome]:
+    message_id = record.get('messageId', '')
+
+    try:
+        with metrics.phase('Render'):
+            message = render_email(job.kind, job.data, job.locale)
+    except (KeyError, ValueError) as e:
+        logger.info('Dropping job %s with bad template data: %s', message_id, e)
+        return {message_id: 'dropped'}
+
+    for attempt in range(SEND_ATTEMPTS):
+        with metrics.phase('RateLimitWait'):
+            _get_bucket().acquire()
+        try:
+            with metrics.phase('Send'):
+                ses.send_email(
+                    Source=SENDER_EMAIL,  # type: ignore
+                    Destination={'ToAddresses': [job.to]},
+                    Message=ses_message(message)  # type: ignore[arg-type]
+                )
+            return {message_id: 'sent'}
+        except ClientError as e:
+            if not _is_throttle(e):
+                code = e.response.get('Error', {}).get('Code')
+                logger.error('SES error for %s: %s', message_id, e)
+                # Rejected addresses won't succeed on redelivery
+                return {message_id: 'dropped' if code == 'MessageRejected' else 'retry'}
+            _backoff(attempt)
+        except Exception as e:
+            logger.error('SES error for %s: %s', message_id, e)
+            return {message_id: 'retry'}
+
+    return {message_id: 'retry'}
+
+
+def _send_bulk(template: str, batch: List[Tuple[Dict[str, Any], EmailJob]]) -> Dict[str, Outcome]:
+    """One SendBulkTemplatedEmail per attempt; each recipient costs one send"""
+    # Every job stays 'retry' until a returned status says otherwise, so a
+    # job SES reports nothing for is never acked unsent
+    outcomes: Dict[str, Outcome] = {record.get('messageId', ''): 'retry' for record, _ in batch}
+    pending = batch
+
+    for attempt in range(SEND_ATTEMPTS):
+        with metrics.phase('RateLimitWait'):
+            _get_bucket().acquire(len(pending))
+        try:
+            with metrics.phase('Send'):
+                response = ses.send_bulk_templated_email(
+                    Source=SENDER_EMAIL,  # type: ignore
+                    Template=template,
+                    DefaultTemplateData='{}',
+                    Destinations=[
+                        {
+                            'Destination': {'ToAddresses': [job.to]},
+                            'ReplacementTemplateData': json.dumps(job.data, separators=(',', ':'))
+                        }
+                        for _, job in pending
+                    ]
+                )
+        except ClientError as e:
+            if not _is_throttle(e):
+                logger.error('SES bulk error: %s', e)
+                break
+            _backoff(attempt)
+            continue
+        except Exception as e:
+            logger.error('SES bulk error: %s', e)
+            break
+
+        statuses = response.get('Status', [])
+        retry: List[Tuple[Dict[str, Any], EmailJob]] = pending[len(statuses):]
+        for (record, job), status in zip(pending, statuses):
+            message_id = record.get('messageId', '')
+            code = status.get('Status')
+            if code == 'Success':
+                outcomes[message_id] = 'sent'
+            elif code in RETRYABLE_STATUSES:
+                retry.append((record, job))
+            elif code in PERMANENT_STATUSES:
+                logger.info('SES bulk status for %s: %s %s', message_id, code, status.get("Error", ""))
+                outcomes[message_id] = 'dropped'
+            else:
+                # Left as 'retry' for SQS redelivery
+                logger.warning('SES bulk status for %s: %s %s', message_id, code, status.get("Error", ""))
+
+        pending = retry
+        if not pending:
+            return outcomes
+        _backoff(attempt)
+
+    return outcomes
+
+
+def _queue_url(event_source_arn: str) -> Optional[str]:
+    """arn:aws:sqs:{region}:{account}:{name} -> queue URL"""
+    parts = event_source_arn.split(':')
+    if len(parts) != 6:
+        return None
+    return f'https://sqs.{parts[3]}.amazonaws.com/{parts[4]}/{parts[5]}'
+
+
+def _delay_redelivery(record: Dict[str, Any]) -> None:
+    """Back off redelivery exponentially with the message's receive count"""
+    queue_url = _queue_url(record.get('eventSourceARN', ''))
+    if not queue_url:
+        return
+
+    receive_count = int(record.get('attributes', {}).get('ApproximateReceiveCount', '1'))
+    try:
+        sqs.change_message_visibility(
+            QueueUrl=queue_url,
+            ReceiptHandle=record['receiptHandle'],
+            VisibilityTimeout=min(900, REDELIVERY_BASE_S * 2 ** (receive_count - 1))
+        )
+    except Exception as e:
+        logger.error('Visibility change failed for %s: %s', record.get("messageId"), e)
@@ -0,0 +1,66 @@
+"""
+Thread-safe token bucket for pacing SES sends
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Refills at `rate` tokens per second up to `capacity`. acquire() blocks
+    until enough tokens are available, so callers on any number of threads
+    together never exceed the rate (after an initial burst of `capacity`).
+
+    Args:
+        rate: Tokens added per second (the SES MaxSendRate)
+        capacity: Burst size; defaults to one second's worth
+    """
+
+    def __init__(self, rate: float, capacity: float = 0):
+        self.rate = max(rate, 0.01)
+        self.capacity = max(capacity or rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Take tokens, waiting for them if needed. Requests larger than the
+        capacity are taken in capacity-sized steps.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+
+        while tokens > 0:
+            step = min(tokens, self.capacity)
+            waited += self._take(step)
+            tokens -= step
+
+        return waited
+
+    def _take(self, tokens: float) -> float:
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait_s = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait_s)
+            waited += wait_s
+
+    def penalize(self, seconds: float) -> None:
+        """Drain the bucket after SES reports throttling despite pacing"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
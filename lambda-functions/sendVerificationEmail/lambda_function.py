@@ -1,32 +1,74 @@
+from __future__ import annotations
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 import json
+import math
 import os
 import secrets
-from typing import Dict, Any
-import boto3
-from mypy_boto3_ses import SESClient
+import time
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
+from botocore.exceptions import ClientError
+if TYPE_CHECKING:
+    from mypy_boto3_ses import SESClient
+    from mypy_boto3_sqs import SQSClient
 
-dynamodb = boto3.resource('dynamodb') # type: ignore
-ses: SESClient = boto3.client('ses') # type: ignore
+from shared.python.aws_clients import lazy_client, lazy_resource
+from shared.python.email_templates import VERIFY_EMAIL, render_email, ses_message
+from shared.python.email_outbox import enqueue_email
+from shared.python.verification_tokens import issue_token, is_signed_token, parse_signing_keys
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+from shared.python.profiling import profiler
+
+dynamodb = lazy_resource('dynamodb')
+ses: SESClient = lazy_client('ses')
+sqs: SQSClient = lazy_client('sqs')
 
 USERS_TABLE = os.environ.get('USERS_TABLE', 'Users')
 VERIFICATION_TOKENS_TABLE = os.environ.get('VERIFICATION_TOKENS_TABLE', 'VerificationTokens')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL')
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+# When set, emails go through the outbox queue (sendQueuedEmails) instead
+# of a direct SES call
+EMAIL_QUEUE_URL = os.environ.get('EMAIL_QUEUE_URL')
+# 'table' stores a random token in VERIFICATION_TOKENS_TABLE; 'signed' issues
+# a stateless HMAC token that verifyEmail checks without a lookup
+VERIFICATION_TOKEN_FORMAT = os.environ.get('VERIFICATION_TOKEN_FORMAT', 'table')
+# "kid:secret,kid:secret" - first key signs, all keys verify
+VERIFICATION_TOKEN_KEYS = parse_signing_keys(os.environ.get('VERIFICATION_TOKEN_KEYS'))
+# One email per user per cooldown; repeats inside it get a 429 with
+# Retry-After and never reach DynamoDB's token table or SES
+RESEND_COOLDOWN_SECONDS = int(os.environ.get('RESEND_COOLDOWN_SECONDS', '60'))
+# A resend reuses the user's current token while it has at least this long
+# left, instead of minting and storing a new one
+TOKEN_REUSE_MIN_SECONDS = int(os.environ.get('TOKEN_REUSE_MIN_SECONDS', '3600'))
+# Per-user issuance row in the tokens table: current token, its expiry and
+# the last send time. Deleted by verifyEmail, expired like any token row.
+ISSUED_TOKEN_PREFIX = 'user#'
+ISSUE_CACHE_SIZE = 1024
 ALLOWED_ORIGINS = [
     'http://localhost:3000',
     'https://hodlersim.app',
 ]
 
+# userId -> (email, epoch seconds of the last send) for sends made by this
+# container, oldest first; lets retries skip DynamoDB entirely
+_recent_sends: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+# Per-container dedup counters, logged with every request
+_dedup_stats = {'requests': 0, 'cacheHits': 0, 'cooldownHits': 0, 'tokensReused': 0, 'tokensIssued': 0}
+
+@metrics.handler
+@logger.handler
+@profiler.handler
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Generates verification token and sends verification email.
     Called by: registerUser (initial), resendVerification (resend)
     """
-    print('Event: ', json.dumps(event))
+    logger.event(event)
 
     if not SENDER_EMAIL:
-        print('ERROR: SENDER_EMAIL not configured')
+        logger.error('SENDER_EMAIL not configured')
         return {
             'statusCode': 500,
             'body': json.dumps({'error': 'Email service not configured'})
@@ -37,6 +79,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         user_id = body.get('userId')
         email = body.get('email')
         username = body.get('username')
+        locale = body.get('locale')
 
         if not user_id or not email or not username:
             return {
@@ -44,35 +87,60 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                  'body': json.dumps({'error': 'userId, email, and username required'})
             }
     except Exception as e:
-        print(f'Parse error: {str(e)}')
+        logger.error('Parse error: %s', e)
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'Invalid request body'})
         }
     
-    token = secrets.token_urlsafe(32)
-
-    expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
+    _dedup_stats['requests'] += 1
+    now = time.time()
 
-    tokens_table = dynamodb.Table(VERIFICATION_TOKENS_TABLE)
+    retry_after = _cached_cooldown(user_id, email, now)
+    if retry_after is not None:
+        _dedup_stats['cacheHits'] += 1
+        metrics.count('Deduplicated')
+        _log_dedup_stats()
+        return _cooldown_response(retry_after)
 
     try:
-        tokens_table.put_item(
-            Item={
-                'token': token,
-                'userId': user_id,
-                'email': email,
-                'expiresAt': expires_at.isoformat(),
-                'createdAt': datetime.now(timezone.utc).isoformat()
-            }
-        )
-        print(f'Token stored for user: {user_id}')
+        with metrics.phase('Claim'):
+            retry_after, previous = _claim_send(user_id, email, username, now)
     except Exception as e:
-        print(f'Dynamo error: {str(e)}')
+        logger.error('Dynamo error: %s', e)
         return {
             'statusCode': 500,
             'body': json.dumps({'error': 'Failed to generate verification token'})
         }
+
+    if retry_after is not None:
+        _dedup_stats['cooldownHits'] += 1
+        metrics.count('Deduplicated')
+        _log_dedup_stats()
+        _remember_send(user_id, email, now - (RESEND_COOLDOWN_SECONDS - retry_after))
+        return _cooldown_response(retry_after)
+
+    token = _reusable_token(previous, email, now)
+
+    if token:
+        _dedup_stats['tokensReused'] += 1
+        metrics.count('TokensReused')
+        logger.info('Reusing current token for user: %s', user_id)
+    else:
+        try:
+            with metrics.phase('TokenIssue'):
+                token = _issue_new_token(user_id, email, username)
+            _dedup_stats['tokensIssued'] += 1
+            metrics.count('TokensIssued')
+        except Exception as e:
+            logger.error('Token issue error: %s', e)
+            _release_send(user_id, now)
+            return {
+                'statusCode': 500,
+                'body': json.dumps({'error': 'Failed to generate verification token'})
+            }
+
+    _log_dedup_stats()
     
     origin = event.get('headers', {}).get('origin') or event.get('headers', {}).get('Origin')
 
@@ -80,46 +148,48 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         frontend_url = origin
     else:
         frontend_url = FRONTEND_URL
-        print(f'WARNING: Untrusted origin blocked: {origin}')
+        logger.warning('Untrusted origin blocked: %s', origin)
     
     verify_url = f'{frontend_url}/verify?token={token}'
 
-    try:
-        email_body = f"""
-Hello {username},
-
-Thank you for signing up for Hodler!
+    if EMAIL_QUEUE_URL:
+        try:
+            with metrics.phase('Enqueue'):
+                message_id = enqueue_email(sqs, EMAIL_QUEUE_URL, VERIFY_EMAIL, email, {
+                    'username': username,
+                    'verifyUrl': verify_url
+                }, locale)
+            logger.info('Verification email queued: %s', message_id)
+            _remember_send(user_id, email, now)
 
-Please verify your email address by clicking the link below:
-
-{verify_url}
-
-This link will expire in 24 hours.
-
-If you didn't create an account, you can safely ignore this email.
-
-Happy trading!
-- The Hodler Team
-        """
-
-        response = ses.send_email(
-            Source=SENDER_EMAIL,
-            Destination={'ToAddresses': [email]},
-            Message={
-                'Subject': {
-                    'Data': 'Verify your Hodler account',
-                    'Charset': 'UTF-8'
+            return {
+                'statusCode': 202,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
                 },
-                'Body': {
-                    'Text': {
-                        'Data': email_body,
-                        'Charset': 'UTF-8'
-                    }
-                }
+                'body': json.dumps({
+                    'message': 'Verification email queued',
+                    'messageId': message_id
+                })
             }
-        )
+        except Exception as e:
+            # Fall through to a direct send so the email still goes out
+            logger.error('Outbox enqueue error: %s', e)
+
+    try:
+        with metrics.phase('Render'):
+            message = render_email(VERIFY_EMAIL, {'username': username, 'verifyUrl': verify_url}, locale)
 
-        print(f'SES response: {response}')
+        with metrics.phase('Send'):
+            response = ses.send_email(
+                Source=SENDER_EMAIL,
+                Destination={'ToAddresses': [email]},
+                Message=ses_message(message)  # type: ignore[arg-type]
+            )
+
+        logger.info('SES response: %s', response)
+        _remember_send(user_id, email, now)
 
         return {
             'statusCode': 200,
@@ -134,7 +204,8 @@ Happy trading!
         }
     
     except Exception as e:
-        print(f'SES error: {str(e)}')
+        logger.error('SES error: %s', e)
+        _release_send(user_id, now)
         return {
             'statusCode': 500,
             'headers': {
@@ -142,4 +213,179 @@ Happy trading!
                 'Access-Control-Allow-Origin': '*'
             },
             'body': json.dumps({'error': 'Failed to send verification email'})
-        }
\ No newline at end of file
+        }
+
+def _cached_cooldown(user_id: str, email: str, now: float) -> Optional[int]:
+    """Seconds left on a cooldown this container already knows about"""
+    entry = _recent_sends.get(user_id)
+    if entry is None:
+        return None
+
+    cached_email, sent_at = entry
+    remaining = sent_at + RESEND_COOLDOWN_SECONDS - now
+    if remaining <= 0 or cached_email != email:
+        del _recent_sends[user_id]
+        return None
+    return max(1, math.ceil(remaining))
+
+
+def _remember_send(user_id: str, email: str, sent_at: float) -> None:
+    _recent_sends[user_id] = (email, sent_at)
+    _recent_sends.move_to_end(user_id)
+    while len(_recent_sends) > ISSUE_CACHE_SIZE:
+        _recent_sends.popitem(last=False)
+
+
+def _claim_send(user_id: str, email: str, username: str, now: float) -> Tuple[Optional[int], Dict[str, Any]]:
+    """
+    Records this send on the user's issuance row, unless one already went to
+    the same address within the cooldown. Concurrent duplicates race on the
+    condition, so only one of them gets through.
+
+    Returns:
+        (seconds left on the cooldown, {}) when inside it,
+        otherwise (None, the issuance row as it was before this send)
+    """
+    tokens_table = dynamodb.Table(VERIFICATION_TOKENS_TABLE)
+    sent_at = int(now)
+
+    try:
+        response = tokens_table.update_item(
+            Key={'token': f'{ISSUED_TOKEN_PREFIX}{user_id}'},
+            UpdateExpression=(
+                'SET lastSentAt = :now, userId = :userId, email = :email, username = :username, '
+                '#ttl = if_not_exists(#ttl, :ttl) ADD sendCount :one'
+            ),
+            ConditionExpression='attribute_not_exists(lastSentAt) OR lastSentAt <= :cutoff OR email <> :email',
+            ExpressionAttributeNames={'#ttl': 'ttl'},
+            ExpressionAttributeValues={
+                ':now': sent_at,
+                ':cutoff': sent_at - RESEND_COOLDOWN_SECONDS,
+                ':userId': user_id,
+                ':email': email,
+                ':username': username,
+                ':ttl': sent_at + 24 * 3600,
+                ':one': 1
+            },
+            ReturnValues='ALL_OLD',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        last_sent = int(e.response.get('Item', {}).get('lastSentAt', {}).get('N', sent_at))  # type: ignore[union-attr]
+        return max(1, last_sent + RESEND_COOLDOWN_SECONDS - sent_at), {}
+
+    return None, response.get('Attributes', {})
+
+
+def _release_send(user_id: str, now: float) -> None:
+    """Undo a claim whose email never went out, so a retry isn't blocked"""
+    tokens_table = dynamodb.Table(VERIFICATION_TOKENS_TABLE)
+    try:
+        tokens_table.update_item(
+            Key={'token': f'{ISSUED_TOKEN_PREFIX}{user_id}'},
+            UpdateExpression='REMOVE lastSentAt',
+            ConditionExpression='lastSentAt = :now',
+            ExpressionAttributeValues={':now': int(now)}
+        )
+    except Exception as e:
+        logger.error('Send claim release error: %s', e)
+
+
+def _reusable_token(previous: Dict[str, Any], email: str, now: float) -> Optional[str]:
+    """The user's current token if it's for this address, of the configured format and not about to expire"""
+    token = previous.get('currentToken')
+    if not token or previous.get('email') != email:
+        return None
+    if is_signed_token(token) != (VERIFICATION_TOKEN_FORMAT == 'signed'):
+        return None
+
+    try:
+        expires_at = datetime.fromisoformat(str(previous['expiresAt']).replace('Z', '+00:00'))
+    except (KeyError, ValueError):
+        return None
+
+    if expires_at.timestamp() - now < TOKEN_REUSE_MIN_SECONDS:
+        return None
+    return token
+
+
+def _issue_new_token(user_id: str, email: str, username: str) -> str:
+    """
+    Mints a token in the configured format and records it as the user's
+    current one
+
+    Raises:
+        Exception: If the token can't be signed or stored
+    """
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
+    tokens_table = dynamodb.Table(VERIFICATION_TOKENS_TABLE)
+
+    if VERIFICATION_TOKEN_FORMAT == 'signed':
+        token = issue_token(
+            VERIFICATION_TOKEN_KEYS, user_id, email, username, int(expires_at.timestamp())
+        )
+        logger.info('Signed token issued for user: %s', user_id)
+    else:
+        token = secrets.token_urlsafe(32)
+        tokens_table.put_item(
+            Item={
+                'token': token,
+                'userId': user_id,
+                'email': email,
+                'username': username,
+                'expiresAt': expires_at.isoformat(),
+                # Native DynamoDB TTL attribute (epoch seconds)
+                'ttl': int(expires_at.timestamp()),
+                'createdAt': datetime.now(timezone.utc).isoformat()
+            }
+        )
+        logger.info('Token stored for user: %s', user_id)
+
+    try:
+        tokens_table.update_item(
+            Key={'token': f'{ISSUED_TOKEN_PREFIX}{user_id}'},
+            UpdateExpression='SET currentToken = :token, expiresAt = :expiresAt, #ttl = :ttl',
+            ExpressionAttributeNames={'#ttl': 'ttl'},
+            ExpressionAttributeValues={
+                ':token': token,
+                ':expiresAt': expires_at.isoformat(),
+                ':ttl': int(expires_at.timestamp())
+            }
+        )
+    except Exception as e:
+        # The token still works; the next resend just won't reuse it
+        logger.error('Issuance record error: %s', e)
+
+    return token
+
+
+def _cooldown_response(retry_after: int) -> Dict[str, Any]:
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Retry-After': str(retry_after)
+        },
+        'body': json.dumps({
+            'error': f'Verification email already sent. Try again in {retry_after} seconds.',
+            'retryAfter': retry_after,
+            'deduplicated': True
+        })
+    }
+
+
+def _log_dedup_stats() -> None:
+    """Container-lifetime dedup rates, one log line per request"""
+    requests = _dedup_stats['requests']
+    duplicates = _dedup_stats['cacheHits'] + _dedup_stats['cooldownHits']
+    issued = _dedup_stats['tokensReused'] + _dedup_stats['tokensIssued']
+    logger.info(
+        'Dedup stats',
+        **_dedup_stats,
+        duplicateRate=round(duplicates / requests, 3) if requests else 0.0,
+        cacheHitRate=round(_dedup_stats['cacheHits'] / requests, 3) if requests else 0.0,
+        tokenReuseRate=round(_dedup_stats['tokensReused'] / issued, 3) if issued else 0.0
+    )
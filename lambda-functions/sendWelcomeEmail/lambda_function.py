@@ -1,25 +1,34 @@
-from typing import Dict, Any
-import boto3
-from mypy_boto3_ses import SESClient
+from __future__ import annotations
+from typing import Dict, Any, TYPE_CHECKING
+if TYPE_CHECKING:
+    from mypy_boto3_ses import SESClient
 
 from shared.python.responses import success_response, error_response, validation_error
 from shared.python.validation import parse_request_body
 from shared.python.env_config import get_optional_env
+from shared.python.aws_clients import lazy_client
+from shared.python.email_templates import WELCOME_EMAIL, render_email, ses_message
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+from shared.python.profiling import profiler
 
-ses: SESClient = boto3.client('ses')  # type: ignore
+ses: SESClient = lazy_client('ses')
 
 SENDER_EMAIL = get_optional_env('SENDER_EMAIL')
 
 
+@metrics.handler
+@logger.handler
+@profiler.handler
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Sends welcome email after user verifies their account.
     Called by: verifyEmail Lambda after successful verification
     """
-    print('Event:', event)
+    logger.event(event)
     
     if not SENDER_EMAIL:
-        print('ERROR: SENDER_EMAIL not configured')
+        logger.error('SENDER_EMAIL not configured')
         return error_response('Email service not configured')
     
     body = parse_request_body(event)
@@ -33,42 +42,17 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return validation_error('Email and username required')
     
     try:
-        email_body = f"""
-Hello {username},
-
-Welcome to Hodler!
-
-Your email has been successfully verified and your account is now active.
-
-Get started:
-- Practice trading without risking real money
-- Compete on the global leaderboard
-- Build your trading skills and confidence
-
-Ready to start trading? Log in at https://hodlersim.app
-
-Happy trading!
-- The Hodler Team
-        """
+        with metrics.phase('Render'):
+            message = render_email(WELCOME_EMAIL, {'username': username}, body.get('locale'))
         
-        response = ses.send_email(
-            Source=SENDER_EMAIL,
-            Destination={'ToAddresses': [email]},
-            Message={
-                'Subject': {
-                    'Data': 'Welcome to Hodler!',
-                    'Charset': 'UTF-8'
-                },
-                'Body': {
-                    'Text': {
-                        'Data': email_body,
-                        'Charset': 'UTF-8'
-                    }
-                }
-            }
-        )
+        with metrics.phase('Send'):
+            response = ses.send_email(
+                Source=SENDER_EMAIL,
+                Destination={'ToAddresses': [email]},
+                Message=ses_message(message)  # type: ignore[arg-type]
+            )
         
-        print(f'SES MessageId: {response["MessageId"]}')
+        logger.info('SES MessageId: %s', response["MessageId"])
         
         return success_response({
             'message': 'Welcome email sent',
@@ -76,5 +60,5 @@ Happy trading!
         })
         
     except Exception as e:
-        print(f'SES error: {str(e)}')
+        logger.error('SES error: %s', e)
         return error_response('Failed to send welcome email')
\ No newline at end of file
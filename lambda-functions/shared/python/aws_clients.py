@@ -0,0 +1,149 @@
+"""
+Lazily created, per-container AWS clients with tuned botocore settings
+
+Handlers bind module-level names with lazy_client / lazy_resource instead
+of calling boto3 at import time. The real client is built on first use
+(so services a code path never touches cost nothing at cold start) and is
+then shared by every caller in the container, reusing its connection
+pool across warm invocations.
+
+Defaults (override per client, or container-wide with the env vars):
+    max_pool_connections  BOTO_MAX_POOL_CONNECTIONS  10 (match worker threads)
+    connect_timeout       BOTO_CONNECT_TIMEOUT       2 seconds
+    read_timeout          BOTO_READ_TIMEOUT          10 seconds
+    retries               BOTO_MAX_ATTEMPTS          adaptive mode, 5 attempts in total
+    tcp_keepalive                                    on
+"""
+from __future__ import annotations
+import threading
+from typing import Any, Dict, Optional, Tuple, TYPE_CHECKING
+
+from shared.python.env_config import get_optional_env
+from shared.python.lazy_imports import lazy_import
+
+if TYPE_CHECKING:
+    from botocore.config import Config
+
+# Not loaded until the first client is built
+boto3 = lazy_import('boto3')
+
+_lock = threading.Lock()
+_session: Optional[boto3.session.Session] = None
+_clients: Dict[Tuple[Any, ...], Any] = {}
+_resources: Dict[Tuple[Any, ...], Any] = {}
+
+
+def client_config(**overrides: Any) -> Config:
+    """
+    Tuned botocore Config
+
+    Args:
+        overrides: Any botocore Config option, e.g. max_pool_connections=16
+
+    Returns:
+        Config with the container defaults and overrides applied
+    """
+    from botocore.config import Config
+
+    settings: Dict[str, Any] = {
+        'max_pool_connections': int(get_optional_env('BOTO_MAX_POOL_CONNECTIONS', '10')),
+        'connect_timeout': float(get_optional_env('BOTO_CONNECT_TIMEOUT', '2')),
+        'read_timeout': float(get_optional_env('BOTO_READ_TIMEOUT', '10')),
+        'retries': {
+            'mode': 'adaptive',
+            'total_max_attempts': int(get_optional_env('BOTO_MAX_ATTEMPTS', '5'))
+        },
+        'tcp_keepalive': True
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def get_session() -> boto3.session.Session:
+    """The container's boto3 session (also the source of credentials)"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = boto3.session.Session()
+    return _session
+
+
+def _cache_key(service_name: str, endpoint_url: Optional[str], overrides: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (service_name, endpoint_url, repr(sorted(overrides.items())))
+
+
+def get_client(service_name: str, endpoint_url: Optional[str] = None, **overrides: Any) -> Any:
+    """
+    Cached low-level client; built on the first call for a given
+    service, endpoint and overrides
+
+    Args:
+        service_name: e.g. 's3', 'ses'
+        endpoint_url: Non-default endpoint (local stand-ins)
+        overrides: botocore Config options (see client_config)
+    """
+    key = _cache_key(service_name, endpoint_url, overrides)
+    client = _clients.get(key)
+    if client is None:
+        session = get_session()
+        # Sessions aren't safe for concurrent client creation
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = session.client(  # type: ignore[call-overload]
+                    service_name, endpoint_url=endpoint_url, config=client_config(**overrides)
+                )
+                _clients[key] = client
+    return client
+
+
+def get_resource(service_name: str, endpoint_url: Optional[str] = None, **overrides: Any) -> Any:
+    """Cached service resource; same arguments as get_client"""
+    key = _cache_key(service_name, endpoint_url, overrides)
+    resource = _resources.get(key)
+    if resource is None:
+        session = get_session()
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = session.resource(  # type: ignore[call-overload]
+                    service_name, endpoint_url=endpoint_url, config=client_config(**overrides)
+                )
+                _resources[key] = resource
+    return resource
+
+
+class _Lazy:
+    """Stands in for a client or resource and builds it on first attribute access"""
+
+    def __init__(self, factory: Any, service_name: str, endpoint_url: Optional[str], overrides: Dict[str, Any]):
+        self._factory = factory
+        self._args = (service_name, endpoint_url)
+        self._overrides = overrides
+        self._target: Any = None
+
+    def __getattr__(self, name: str) -> Any:
+        target = self._target
+        if target is None:
+            target = self._factory(*self._args, **self._overrides)
+            self._target = target
+        return getattr(target, name)
+
+    def __repr__(self) -> str:
+        state = 'created' if self._target is not None else 'not created'
+        return f'<lazy {self._args[0]} ({state})>'
+
+
+def lazy_client(service_name: str, endpoint_url: Optional[str] = None, **overrides: Any) -> Any:
+    """
+    Module-level client placeholder, e.g.
+
+        s3: S3Client = lazy_client('s3', max_pool_connections=16)
+    """
+    return _Lazy(get_client, service_name, endpoint_url, overrides)
+
+
+def lazy_resource(service_name: str, endpoint_url: Optional[str] = None, **overrides: Any) -> Any:
+    """Module-level resource placeholder; same arguments as lazy_client"""
+    return _Lazy(get_resource, service_name, endpoint_url, overrides)
@@ -0,0 +1,55 @@
+"""
+Resumable job checkpoints stored as JSON objects in S3
+"""
+from __future__ import annotations
+import json
+from typing import Dict, Any, Optional, TYPE_CHECKING
+from botocore.exceptions import ClientError
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+
+def load_checkpoint(s3: S3Client, bucket: str, key: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a saved checkpoint
+
+    Args:
+        s3: S3 client
+        bucket: Bucket holding the checkpoint
+        key: Checkpoint object key
+
+    Returns:
+        Checkpoint state, or None if there is no checkpoint
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+
+    state: Dict[str, Any] = json.loads(response['Body'].read())
+    return state
+
+
+def save_checkpoint(s3: S3Client, bucket: str, key: str, state: Dict[str, Any]) -> None:
+    """
+    Save checkpoint state so a timed-out run can resume
+
+    Args:
+        s3: S3 client
+        bucket: Bucket holding the checkpoint
+        key: Checkpoint object key
+        state: JSON-serializable job state
+    """
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(state, separators=(',', ':')).encode(),
+        ContentType='application/json'
+    )
+
+
+def clear_checkpoint(s3: S3Client, bucket: str, key: str) -> None:
+    """Remove the checkpoint once a job has run to completion"""
+    s3.delete_object(Bucket=bucket, Key=key)
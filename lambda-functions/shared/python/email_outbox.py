@@ -0,0 +1,95 @@
+"""
+Email outbox: producers enqueue compact jobs on SQS and sendQueuedEmails
+drains them at the SES account's send rate
+
+Job body: {"k": kind, "to": address, "d": template values, "t": enqueued ms,
+           "l": locale (optional)}
+"""
+from __future__ import annotations
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, TYPE_CHECKING
+if TYPE_CHECKING:
+    from mypy_boto3_sqs import SQSClient
+
+from shared.python.email_templates import EMAIL_KINDS
+
+
+@dataclass(frozen=True)
+class EmailJob:
+    """Decoded outbox job"""
+
+    kind: str
+    to: str
+    data: Dict[str, Any]
+    enqueued_ms: int
+    locale: Optional[str] = None
+
+
+def encode_job(
+        kind: str,
+        to: str,
+        data: Dict[str, Any],
+        enqueued_ms: int,
+        locale: Optional[str] = None
+) -> str:
+    """Compact JSON body for one email job"""
+    job: Dict[str, Any] = {'k': kind, 'to': to, 'd': data, 't': enqueued_ms}
+    if locale:
+        job['l'] = locale
+    return json.dumps(job, separators=(',', ':'))
+
+
+def decode_job(body: str) -> EmailJob:
+    """
+    Parse an SQS message body into a job
+
+    Raises:
+        ValueError: If the body isn't a valid job
+    """
+    try:
+        raw = json.loads(body)
+        job = EmailJob(
+            kind=raw['k'],
+            to=raw['to'],
+            data=raw.get('d') or {},
+            enqueued_ms=int(raw.get('t', 0)),
+            locale=raw.get('l')
+        )
+    except (KeyError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f'Malformed email job: {e}') from e
+
+    if job.kind not in EMAIL_KINDS or not job.to:
+        raise ValueError(f'Invalid email job: kind={job.kind}')
+
+    return job
+
+
+def enqueue_email(
+        sqs: SQSClient,
+        queue_url: str,
+        kind: str,
+        to: str,
+        data: Dict[str, Any],
+        locale: Optional[str] = None
+) -> str:
+    """
+    Put one email job on the outbox queue
+
+    Args:
+        sqs: SQS client
+        queue_url: Outbox queue URL
+        kind: Email kind (see email_templates)
+        to: Recipient address
+        data: Template values
+        locale: Recipient locale, if known
+
+    Returns:
+        SQS MessageId
+    """
+    response = sqs.send_message(
+        QueueUrl=queue_url,
+        MessageBody=encode_job(kind, to, data, int(time.time() * 1000), locale)
+    )
+    return response['MessageId']
@@ -0,0 +1,316 @@
+"""
+Precompiled transactional email templates (subject, text and HTML parts
+per locale)
+
+Templates use {{name}} placeholders. Each part is compiled once per
+container into its static fragments and variable names, so rendering is a
+single join; values are HTML-escaped in the HTML part only. The same
+sources are published as SES templates (sync_ses_templates) so bulk sends
+only carry the per-recipient variables.
+"""
+from __future__ import annotations
+import html
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from mypy_boto3_ses import SESClient
+
+VERIFY_EMAIL = 'verify'
+WELCOME_EMAIL = 'welcome'
+EMAIL_KINDS = (VERIFY_EMAIL, WELCOME_EMAIL)
+DEFAULT_LOCALE = 'en'
+PLACEHOLDER = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+_HTML_LAYOUT = (
+    '<!DOCTYPE html><html><body style="margin:0;padding:24px;background:#f4f5f7;'
+    'font-family:Helvetica,Arial,sans-serif;color:#1f2328">'
+    '<div style="max-width:560px;margin:0 auto;background:#fff;border-radius:8px;padding:32px">'
+    '{body}'
+    '<p style="margin-top:32px">{signoff}<br>- {team}</p>'
+    '</div></body></html>'
+)
+_BUTTON = (
+    '<p><a href="{href}" style="display:inline-block;padding:12px 24px;background:#2f6feb;'
+    'color:#fff;border-radius:6px;text-decoration:none">{label}</a></p>'
+)
+
+# (kind, locale) -> subject, text, html sources
+TEMPLATES: Dict[Tuple[str, str], Dict[str, str]] = {
+    (VERIFY_EMAIL, 'en'): {
+        'subject': 'Verify your Hodler account',
+        'text': """
+Hello {{username}},
+
+Thank you for signing up for Hodler!
+
+Please verify your email address by clicking the link below:
+
+{{verifyUrl}}
+
+This link will expire in 24 hours.
+
+If you didn't create an account, you can safely ignore this email.
+
+Happy trading!
+- The Hodler Team
+        """,
+        'html': _HTML_LAYOUT.format(
+            body=(
+                '<p>Hello {{username}},</p>'
+                '<p>Thank you for signing up for Hodler!</p>'
+                '<p>Please verify your email address by clicking the button below:</p>'
+                + _BUTTON.format(href='{{verifyUrl}}', label='Verify email')
+                + '<p>This link will expire in 24 hours.</p>'
+                '<p>If you didn\'t create an account, you can safely ignore this email.</p>'
+            ),
+            signoff='Happy trading!',
+            team='The Hodler Team'
+        )
+    },
+    (VERIFY_EMAIL, 'es'): {
+        'subject': 'Verifica tu cuenta de Hodler',
+        'text': """
+Hola {{username}},
+
+¡Gracias por registrarte en Hodler!
+
+Verifica tu dirección de correo haciendo clic en el siguiente enlace:
+
+{{verifyUrl}}
+
+Este enlace caduca en 24 horas.
+
+Si no creaste una cuenta, puedes ignorar este correo.
+
+¡Felices operaciones!
+- El equipo de Hodler
+        """,
+        'html': _HTML_LAYOUT.format(
+            body=(
+                '<p>Hola {{username}},</p>'
+                '<p>¡Gracias por registrarte en Hodler!</p>'
+                '<p>Verifica tu dirección de correo con el siguiente botón:</p>'
+                + _BUTTON.format(href='{{verifyUrl}}', label='Verificar correo')
+                + '<p>Este enlace caduca en 24 horas.</p>'
+                '<p>Si no creaste una cuenta, puedes ignorar este correo.</p>'
+            ),
+            signoff='¡Felices operaciones!',
+            team='El equipo de Hodler'
+        )
+    },
+    (WELCOME_EMAIL, 'en'): {
+        'subject': 'Welcome to Hodler!',
+        'text': """
+Hello {{username}},
+
+Welcome to Hodler!
+
+Your email has been successfully verified and your account is now active.
+
+Get started:
+- Practice trading without risking real money
+- Compete on the global leaderboard
+- Build your trading skills and confidence
+
+Ready to start trading? Log in at https://hodlersim.app
+
+Happy trading!
+- The Hodler Team
+        """,
+        'html': _HTML_LAYOUT.format(
+            body=(
+                '<p>Hello {{username}},</p>'
+                '<p>Welcome to Hodler!</p>'
+                '<p>Your email has been successfully verified and your account is now active.</p>'
+                '<p>Get started:</p><ul>'
+                '<li>Practice trading without risking real money</li>'
+                '<li>Compete on the global leaderboard</li>'
+                '<li>Build your trading skills and confidence</li></ul>'
+                + _BUTTON.format(href='https://hodlersim.app', label='Start trading')
+            ),
+            signoff='Happy trading!',
+            team='The Hodler Team'
+        )
+    },
+    (WELCOME_EMAIL, 'es'): {
+        'subject': '¡Bienvenido a Hodler!',
+        'text': """
+Hola {{username}},
+
+¡Bienvenido a Hodler!
+
+Tu correo ha sido verificado y tu cuenta ya está activa.
+
+Para empezar:
+- Practica trading sin arriesgar dinero real
+- Compite en la clasificación global
+- Desarrolla tus habilidades y tu confianza
+
+¿Listo para empezar? Inicia sesión en https://hodlersim.app
+
+¡Felices operaciones!
+- El equipo de Hodler
+        """,
+        'html': _HTML_LAYOUT.format(
+            body=(
+                '<p>Hola {{username}},</p>'
+                '<p>¡Bienvenido a Hodler!</p>'
+                '<p>Tu correo ha sido verificado y tu cuenta ya está activa.</p>'
+                '<p>Para empezar:</p><ul>'
+                '<li>Practica trading sin arriesgar dinero real</li>'
+                '<li>Compite en la clasificación global</li>'
+                '<li>Desarrolla tus habilidades y tu confianza</li></ul>'
+                + _BUTTON.format(href='https://hodlersim.app', label='Empezar')
+            ),
+            signoff='¡Felices operaciones!',
+            team='El equipo de Hodler'
+        )
+    },
+}
+
+
+class CompiledTemplate:
+    """
+    One template part split into static fragments and variable names.
+    fragments always has one more entry than names.
+    """
+
+    def __init__(self, source: str, escape: Optional[Callable[[str], str]] = None):
+        pieces = PLACEHOLDER.split(source)
+        self.fragments: Tuple[str, ...] = tuple(pieces[0::2])
+        self.names: Tuple[str, ...] = tuple(pieces[1::2])
+        self.escape = escape
+
+    def render(self, data: Dict[str, Any]) -> str:
+        """
+        Raises:
+            KeyError: If a variable is missing from data
+        """
+        out: List[str] = [self.fragments[0]]
+        for name, fragment in zip(self.names, self.fragments[1:]):
+            value = str(data[name])
+            out.append(self.escape(value) if self.escape else value)
+            out.append(fragment)
+        return ''.join(out)
+
+
+@dataclass(frozen=True)
+class RenderedEmail:
+    """Rendered parts ready for SES"""
+
+    subject: str
+    text: str
+    html: str
+
+
+@dataclass(frozen=True)
+class _CompiledEmail:
+    subject: CompiledTemplate
+    text: CompiledTemplate
+    html: CompiledTemplate
+
+
+_compiled: Dict[Tuple[str, str], _CompiledEmail] = {}
+
+
+def resolve_locale(kind: str, locale: Optional[str]) -> str:
+    """
+    Best available locale for a kind: exact match, then the language
+    ('es-MX' -> 'es'), then DEFAULT_LOCALE
+
+    Raises:
+        ValueError: If kind is unknown
+    """
+    if kind not in EMAIL_KINDS:
+        raise ValueError(f'Unknown email kind: {kind}. Allowed: {", ".join(EMAIL_KINDS)}')
+
+    for candidate in ((locale or '').lower(), (locale or '').lower().split('-')[0]):
+        if candidate and (kind, candidate) in TEMPLATES:
+            return candidate
+    return DEFAULT_LOCALE
+
+
+def _get_compiled(kind: str, locale: str) -> _CompiledEmail:
+    # Compiled on first use and kept for the life of the container; a
+    # race between threads only compiles the same template twice
+    compiled = _compiled.get((kind, locale))
+    if compiled is None:
+        source = TEMPLATES[(kind, locale)]
+        compiled = _CompiledEmail(
+            subject=CompiledTemplate(source['subject']),
+            text=CompiledTemplate(source['text']),
+            html=CompiledTemplate(source['html'], escape=html.escape)
+        )
+        _compiled[(kind, locale)] = compiled
+    return compiled
+
+
+def render_email(kind: str, data: Dict[str, Any], locale: Optional[str] = None) -> RenderedEmail:
+    """
+    Render all parts of an email
+
+    Args:
+        kind: 'verify' (needs username, verifyUrl) or 'welcome' (needs username)
+        data: Template values
+        locale: e.g. 'en', 'es', 'es-MX'; falls back to DEFAULT_LOCALE
+
+    Returns:
+        Subject, text and HTML parts
+
+    Raises:
+        ValueError: If kind is unknown
+        KeyError: If a template value is missing
+    """
+    compiled = _get_compiled(kind, resolve_locale(kind, locale))
+    return RenderedEmail(
+        subject=compiled.subject.render(data),
+        text=compiled.text.render(data),
+        html=compiled.html.render(data)
+    )
+
+
+def ses_message(email: RenderedEmail) -> Dict[str, Any]:
+    """SendEmail Message with both body parts"""
+    return {
+        'Subject': {'Data': email.subject, 'Charset': 'UTF-8'},
+        'Body': {
+            'Text': {'Data': email.text, 'Charset': 'UTF-8'},
+            'Html': {'Data': email.html, 'Charset': 'UTF-8'}
+        }
+    }
+
+
+def ses_template_name(prefix: str, kind: str, locale: str) -> str:
+    """Name of the SES template for a kind and resolved locale"""
+    return f'{prefix}-{kind}-{locale}'
+
+
+def _to_handlebars(source: str, escaped: bool) -> str:
+    # SES templates are Handlebars: {{x}} HTML-escapes, {{{x}}} doesn't
+    return PLACEHOLDER.sub(r'{{\1}}' if escaped else r'{{{\1}}}', source)
+
+
+def sync_ses_templates(ses: SESClient, prefix: str) -> List[str]:
+    """
+    Create or update an SES template for every (kind, locale)
+
+    Returns:
+        Template names written
+    """
+    names: List[str] = []
+
+    for (kind, locale), source in TEMPLATES.items():
+        template = {
+            'TemplateName': ses_template_name(prefix, kind, locale),
+            'SubjectPart': _to_handlebars(source['subject'], escaped=False),
+            'TextPart': _to_handlebars(source['text'], escaped=False),
+            'HtmlPart': _to_handlebars(source['html'], escaped=True)
+        }
+        try:
+            ses.update_template(Template=template)  # type: ignore[arg-type]
+        except ses.exceptions.TemplateDoesNotExistException:
+            ses.create_template(Template=template)  # type: ignore[arg-type]
+        names.append(template['TemplateName'])
+
+    return names
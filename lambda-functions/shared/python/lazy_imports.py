@@ -0,0 +1,63 @@
+"""
+Deferred imports for heavy dependencies (boto3, Pillow, PyJWT, pydantic)
+
+lazy_import() returns the module object straight away but only executes it
+on first attribute access, so a cold start that returns early (bad config,
+missing auth header) never pays for it. Set LAZY_IMPORTS=false to import
+everything eagerly, e.g. to compare cold starts with benchmark_cold_start.py.
+
+Attribute reads are what trigger the load (setting an attribute doesn't),
+so keep lazily imported names out of module-level expressions (class
+defaults) and annotations (use `from __future__ import annotations`), or
+they load at import anyway. Call ensure_loaded() before fanning out to
+threads; LazyLoader is only safe for concurrent first access from
+Python 3.13.
+"""
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+
+from shared.python.env_config import get_optional_env
+
+LAZY_IMPORTS = get_optional_env('LAZY_IMPORTS', 'true').lower() != 'false'
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Import a module on first use
+
+    Args:
+        name: Absolute module name, e.g. 'PIL.Image' (parent packages are
+            imported eagerly)
+
+    Raises:
+        ModuleNotFoundError: If the module can't be found
+    """
+    if name in sys.modules:
+        # Not import_module: its __spec__ check would load a lazy module
+        return sys.modules[name]
+    if not LAZY_IMPORTS:
+        return importlib.import_module(name)
+
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def ensure_loaded(module: ModuleType) -> ModuleType:
+    """Finish loading a lazy_import() module now, e.g. before starting worker threads"""
+    # Any attribute read runs a pending lazy load; a no-op for loaded modules
+    getattr(module, '__name__')
+    return module
@@ -0,0 +1,191 @@
+"""
+Structured, buffered logging for Lambda handlers
+
+Each line is one JSON object (level, msg, requestId, coldStart, extra
+fields). Messages use %-style arguments that are only formatted when the
+level is enabled. Inside a handler wrapped with @logger.handler, lines
+are buffered and written in one go when the invocation ends (or the
+buffer fills); outside one (module import) they're written immediately.
+Lines still buffered when Lambda kills a timed-out invocation are lost,
+so long-running jobs should keep LOG_BUFFER_LINES modest.
+
+Full event dumps are sampled: logger.event() always logs a compact
+summary but the whole (redacted) event only for LOG_EVENT_SAMPLE_RATE of
+invocations, or always at DEBUG. Values under secret-looking keys
+(authorization, token, password, ...) and bearer/JWT strings are redacted
+from events, formatted messages and extra fields.
+
+Settings: LOG_LEVEL (INFO), LOG_EVENT_SAMPLE_RATE (0.01), LOG_BUFFER_LINES (500)
+"""
+import functools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, TypeVar
+
+from shared.python.env_config import get_optional_env
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+REDACTED = '[REDACTED]'
+SECRET_KEY = re.compile(
+    r'authorization|cookie|password|passwd|secret|token|signature|credential|api[-_]?key|session',
+    re.IGNORECASE
+)
+SECRET_VALUE = re.compile(
+    r'(Bearer\s+|[?&]token=)[\w\-.~+/%]+=*|eyJ[\w-]+\.[\w-]+\.[\w-]*|v1\.[\w-]+\.[\w-]+\.[\w-]+'
+)
+# Event dumps stop descending here; deeper values are elided
+MAX_DEPTH = 8
+
+Handler = TypeVar('Handler', bound=Callable[..., Any])
+
+
+def redact(value: Any, depth: int = 0) -> Any:
+    """
+    Copy of value with secrets masked: strings under secret-looking keys,
+    bearer tokens, token query parameters, JWTs and signed tokens
+    """
+    if depth > MAX_DEPTH:
+        return '...'
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if isinstance(item, str) and item and SECRET_KEY.search(str(key)) else redact(item, depth + 1)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item, depth + 1) for item in value]
+    if isinstance(value, str):
+        return SECRET_VALUE.sub(lambda match: (match.group(1) or '') + REDACTED, value)
+    return value
+
+
+def _summarize(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Cheap event shape: trigger type, record count, route"""
+    summary: Dict[str, Any] = {}
+    records = event.get('Records')
+    if isinstance(records, list):
+        summary['records'] = len(records)
+        if records and isinstance(records[0], dict):
+            summary['source'] = records[0].get('eventSource') or records[0].get('EventSource')
+    method = event.get('httpMethod') or event.get('requestContext', {}).get('http', {}).get('method')
+    if method:
+        summary['method'] = method
+        summary['path'] = event.get('path') or event.get('rawPath')
+    if not summary:
+        summary['keys'] = sorted(event)[:20]
+    return summary
+
+
+class StructuredLogger:
+    """Process-wide logger; see the module docstring"""
+
+    def __init__(self) -> None:
+        self.level = LEVELS.get(get_optional_env('LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+        self.event_sample_rate = float(get_optional_env('LOG_EVENT_SAMPLE_RATE', '0.01'))
+        self.buffer_lines = max(1, int(get_optional_env('LOG_BUFFER_LINES', '500')))
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._buffering = False
+        self._context: Dict[str, Any] = {}
+        self._cold = True
+
+    def enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.level
+
+    def _log(self, level: str, msg: str, args: Any, fields: Dict[str, Any]) -> None:
+        if LEVELS[level] < self.level:
+            return
+
+        if args:
+            try:
+                msg = msg % args
+            except (TypeError, ValueError):
+                msg = f'{msg} {args!r}'
+            msg = redact(msg)
+
+        record: Dict[str, Any] = {'level': level, 'msg': msg, **self._context}
+        if fields:
+            record.update(redact(fields))
+        line = json.dumps(record, default=str, ensure_ascii=False)
+
+        with self._lock:
+            if not self._buffering:
+                sys.stdout.write(line + '\n')
+                return
+            self._buffer.append(line)
+            if len(self._buffer) >= self.buffer_lines:
+                self._flush_locked()
+
+    def debug(self, msg: str, *args: Any, **fields: Any) -> None:
+        self._log('DEBUG', msg, args, fields)
+
+    def info(self, msg: str, *args: Any, **fields: Any) -> None:
+        self._log('INFO', msg, args, fields)
+
+    def warning(self, msg: str, *args: Any, **fields: Any) -> None:
+        self._log('WARNING', msg, args, fields)
+
+    def error(self, msg: str, *args: Any, **fields: Any) -> None:
+        self._log('ERROR', msg, args, fields)
+
+    def event(self, event: Any) -> None:
+        """Log the invocation event: a summary always, the full redacted event when sampled"""
+        if not isinstance(event, dict):
+            self.info('Event', eventType=type(event).__name__)
+            return
+
+        if self.enabled('DEBUG') or random.random() < self.event_sample_rate:
+            self._log('INFO', 'Event', (), {'event': event, 'sampled': True})
+        else:
+            self._log('INFO', 'Event', (), {'event': _summarize(event)})
+
+    def _flush_locked(self) -> None:
+        if self._buffer:
+            sys.stdout.write('\n'.join(self._buffer) + '\n')
+            sys.stdout.flush()
+            self._buffer.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def start(self, context: Any) -> None:
+        """Begin buffering for one invocation"""
+        with self._lock:
+            self._context = {
+                'requestId': getattr(context, 'aws_request_id', None),
+                'coldStart': self._cold
+            }
+            self._cold = False
+            self._buffering = True
+
+    def end(self) -> None:
+        """Write everything buffered during the invocation"""
+        with self._lock:
+            self._flush_locked()
+            self._buffering = False
+            self._context = {}
+
+    def handler(self, func: Handler) -> Handler:
+        """Decorator for lambda_handler: buffers its lines and flushes them once at the end"""
+
+        @functools.wraps(func)
+        def wrapper(event: Any, context: Any) -> Any:
+            self.start(context)
+            start = time.perf_counter()
+            try:
+                return func(event, context)
+            except Exception as e:
+                self.error('Unhandled error: %s', e, errorType=type(e).__name__)
+                raise
+            finally:
+                self.debug('Invocation finished', durationMs=round((time.perf_counter() - start) * 1000, 1))
+                self.end()
+
+        return wrapper  # type: ignore[return-value]
+
+
+logger = StructuredLogger()
@@ -0,0 +1,142 @@
+"""
+Per-invocation metrics in CloudWatch embedded metric format (EMF)
+
+Inside a handler wrapped with @metrics.handler, phase timers, counts and
+byte totals accumulate and are written as one EMF JSON line to stdout
+when the invocation ends. CloudWatch Logs extracts the metrics from it,
+so there are no PutMetricData calls.
+
+    with metrics.phase('Download'):
+        ...
+    metrics.count('Images')
+    metrics.add('BytesIn', len(data), 'Bytes')
+
+Every invocation reports DurationMs, ColdStart (1 or 0), Errors
+(unhandled exceptions and 5xx responses) and, for event source batches,
+Records. A phase timed repeatedly (per record,
+or from worker threads) is summed, so phases can add up to more than
+DurationMs when they run concurrently. Metrics are dimensioned by
+FunctionName; the request id is attached as a property.
+
+Settings: METRICS_NAMESPACE (Hodler), METRICS_ENABLED (true)
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Tuple, TypeVar
+
+from shared.python.env_config import get_optional_env
+
+# CloudWatch accepts at most 100 metrics per EMF directive
+MAX_METRICS = 100
+
+Handler = TypeVar('Handler', bound=Callable[..., Any])
+
+
+def _is_server_error(response: Any) -> bool:
+    status = response.get('statusCode') if isinstance(response, dict) else None
+    return isinstance(status, int) and status >= 500
+
+
+class Metrics:
+    """Process-wide metrics recorder; see the module docstring"""
+
+    def __init__(self) -> None:
+        self.namespace = get_optional_env('METRICS_NAMESPACE', 'Hodler')
+        self.enabled = get_optional_env('METRICS_ENABLED', 'true').lower() != 'false'
+        self._lock = threading.Lock()
+        self._values: Dict[str, Tuple[float, str]] = {}
+        self._properties: Dict[str, Any] = {}
+        self._cold = True
+
+    def add(self, name: str, value: float, unit: str = 'Count') -> None:
+        """Add value to a metric for this invocation"""
+        with self._lock:
+            current, _ = self._values.get(name, (0, unit))
+            self._values[name] = (current + value, unit)
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.add(name, value, 'Count')
+
+    def set_property(self, name: str, value: Any) -> None:
+        """Attach a non-metric field to this invocation's EMF line"""
+        with self._lock:
+            self._properties[name] = value
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a block as the {name}Ms metric"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(f'{name}Ms', (time.perf_counter() - start) * 1000, 'Milliseconds')
+
+    def _start(self, event: Any, context: Any) -> None:
+        with self._lock:
+            self._values = {'ColdStart': (1 if self._cold else 0, 'Count'), 'Errors': (0, 'Count')}
+            self._properties = {
+                'FunctionName': getattr(context, 'function_name', None)
+                or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local'),
+                'requestId': getattr(context, 'aws_request_id', None)
+            }
+            self._cold = False
+
+        records = event.get('Records') if isinstance(event, dict) else None
+        if isinstance(records, list):
+            self.count('Records', len(records))
+
+    def _emit(self) -> None:
+        with self._lock:
+            values, self._values = self._values, {}
+            properties, self._properties = self._properties, {}
+
+        if not self.enabled or not values:
+            return
+
+        names = list(values)[:MAX_METRICS]
+        record: Dict[str, Any] = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [['FunctionName']],
+                    'Metrics': [{'Name': name, 'Unit': values[name][1]} for name in names]
+                }]
+            },
+            **properties
+        }
+        for name in names:
+            value = values[name][0]
+            record[name] = round(value, 3) if isinstance(value, float) else value
+
+        sys.stdout.write(json.dumps(record, default=str) + '\n')
+        sys.stdout.flush()
+
+    def handler(self, func: Handler) -> Handler:
+        """Decorator for lambda_handler: records the invocation and writes its EMF line"""
+
+        @functools.wraps(func)
+        def wrapper(event: Any, context: Any) -> Any:
+            self._start(event, context)
+            start = time.perf_counter()
+            try:
+                response = func(event, context)
+                if _is_server_error(response):
+                    self.count('Errors')
+                return response
+            except Exception:
+                self.count('Errors')
+                raise
+            finally:
+                self.add('DurationMs', (time.perf_counter() - start) * 1000, 'Milliseconds')
+                self._emit()
+
+        return wrapper  # type: ignore[return-value]
+
+
+metrics = Metrics()
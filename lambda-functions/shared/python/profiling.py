@@ -0,0 +1,194 @@
+"""
+Opt-in profiling of production invocations
+
+@profiler.handler wraps lambda_handler with cProfile (cpu), tracemalloc
+(memory) or both, for every invocation or a sampled fraction of them.
+Each profiled invocation writes a compact JSON report (top functions by
+own time, peak traced memory and the top sites of memory still allocated
+when the handler returns) and, for cpu, the raw pstats dump for
+snakeviz/pstats:
+
+    {output}/{function}/{yyyy}/{mm}/{dd}/{hhmmss}-{requestId}.json|.prof
+
+Off by default. Profiling slows the invocation it samples (tracemalloc
+by far the most) and the report is written before the handler returns,
+so keep PROFILE_SAMPLE_RATE low under real load. On Python 3.12+
+cProfile also sees worker threads (processImage's pools); on older
+interpreters only the handler thread is profiled.
+
+Settings:
+    PROFILE_MODE: off, cpu, memory or both (off)
+    PROFILE_SAMPLE_RATE: fraction of invocations profiled once on (1.0)
+    PROFILE_OUTPUT: s3://bucket/prefix or a local directory (/tmp/profiles)
+    PROFILE_TOP: rows kept per table (25)
+"""
+from __future__ import annotations
+import functools
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from shared.python.env_config import get_optional_env
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+
+MODES = ('off', 'cpu', 'memory', 'both')
+# Frames kept per allocation trace; 1 groups sites by the allocating line
+TRACEMALLOC_FRAMES = 1
+
+Handler = TypeVar('Handler', bound=Callable[..., Any])
+
+
+def _parse_output(output: str) -> Tuple[Optional[str], str]:
+    """'s3://bucket/prefix' -> (bucket, prefix); a local path -> (None, path)"""
+    if output.startswith('s3://'):
+        bucket, _, prefix = output[len('s3://'):].partition('/')
+        return bucket, prefix.strip('/')
+    return None, output
+
+
+def _cpu_summary(profile: Any, top: int) -> Dict[str, Any]:
+    """Top functions by own time from a finished cProfile run"""
+    import pstats
+
+    stats = pstats.Stats(profile)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)  # type: ignore[attr-defined]
+    return {
+        'totalCalls': stats.total_calls,  # type: ignore[attr-defined]
+        'totalMs': round(stats.total_tt * 1000, 1),  # type: ignore[attr-defined]
+        'topFunctions': [
+            {
+                'function': f'{filename}:{line}({name})',
+                'calls': calls,
+                'ownMs': round(own * 1000, 2),
+                'cumulativeMs': round(cumulative * 1000, 2)
+            }
+            for (filename, line, name), (_, calls, own, cumulative, _) in rows[:top]
+        ]
+    }
+
+
+def _memory_summary(snapshot: Any, peak: int, top: int) -> Dict[str, Any]:
+    """Top allocation sites still live when the handler returns"""
+    sites = snapshot.statistics('lineno')
+    return {
+        'peakBytes': peak,
+        'topSites': [
+            {
+                'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                'bytes': stat.size,
+                'count': stat.count
+            }
+            for stat in sites[:top]
+        ]
+    }
+
+
+class Profiler:
+    """Process-wide profiling hook; see the module docstring"""
+
+    def __init__(self) -> None:
+        mode = get_optional_env('PROFILE_MODE', 'off').lower()
+        self.mode = mode if mode in MODES else 'off'
+        self.sample_rate = float(get_optional_env('PROFILE_SAMPLE_RATE', '1.0'))
+        self.bucket, self.prefix = _parse_output(get_optional_env('PROFILE_OUTPUT', '/tmp/profiles'))
+        self.top = int(get_optional_env('PROFILE_TOP', '25'))
+
+    def _sampled(self) -> bool:
+        return self.mode != 'off' and random.random() < self.sample_rate
+
+    def _write(self, name: str, body: bytes, content_type: str) -> str:
+        if self.bucket:
+            from shared.python.aws_clients import get_client
+
+            key = f'{self.prefix}/{name}' if self.prefix else name
+            get_client('s3').put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+            return f's3://{self.bucket}/{key}'
+
+        path = os.path.join(self.prefix, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(body)
+        return path
+
+    def _save(self, context: Any, report: Dict[str, Any], profile: Any) -> None:
+        function = getattr(context, 'function_name', None) or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+        request_id = getattr(context, 'aws_request_id', None) or 'local'
+        now = datetime.now(timezone.utc)
+        base = f'{function}/{now:%Y/%m/%d/%H%M%S}-{request_id}'
+
+        written: List[str] = []
+        written.append(self._write(
+            f'{base}.json',
+            json.dumps({'function': function, 'requestId': request_id, **report}, separators=(',', ':')).encode(),
+            'application/json'
+        ))
+        if profile is not None:
+            import marshal
+
+            # Same format as pstats.Stats.dump_stats
+            profile.create_stats()
+            written.append(self._write(f'{base}.prof', marshal.dumps(profile.stats), 'application/octet-stream'))
+
+        logger.info('Profile written', mode=self.mode, files=written)
+
+    def _run(self, func: Callable[..., Any], event: Any, context: Any) -> Any:
+        import tracemalloc
+
+        profile = None
+        if self.mode in ('cpu', 'both'):
+            import cProfile
+
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Another profiler already owns the interpreter's hook
+                logger.warning('CPU profiling unavailable: %s', e)
+                profile = None
+        tracing = self.mode in ('memory', 'both') and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+        start = time.perf_counter()
+        try:
+            return func(event, context)
+        finally:
+            if profile is not None:
+                profile.disable()
+            report: Dict[str, Any] = {
+                'mode': self.mode,
+                'durationMs': round((time.perf_counter() - start) * 1000, 1)
+            }
+
+            try:
+                if profile is not None:
+                    report['cpu'] = _cpu_summary(profile, self.top)
+                if tracing:
+                    _, peak = tracemalloc.get_traced_memory()
+                    report['memory'] = _memory_summary(tracemalloc.take_snapshot(), peak, self.top)
+                self._save(context, report, profile)
+                metrics.count('Profiled')
+            except Exception as e:
+                # Never fail the invocation over its profile
+                logger.warning('Profile not written: %s', e)
+            finally:
+                if tracing:
+                    tracemalloc.stop()
+
+    def handler(self, func: Handler) -> Handler:
+        """Decorator for lambda_handler: profiles sampled invocations"""
+
+        @functools.wraps(func)
+        def wrapper(event: Any, context: Any) -> Any:
+            if not self._sampled():
+                return func(event, context)
+            return self._run(func, event, context)
+
+        return wrapper  # type: ignore[return-value]
+
+
+profiler = Profiler()
@@ -1,32 +1,158 @@
 """
 Standard HTTP responses for Lambda functions
+
+Bodies are serialized with orjson when it's installed (add it to the
+function's requirements.txt) and the stdlib json module otherwise; both
+write Decimal (DynamoDB numbers) as int/float and date/datetime as ISO 8601.
+Header sets are built once and shared between responses.
+
+Pass the Lambda event as `request` to let a response use it: with
+GZIP_RESPONSES=true, bodies of at least GZIP_MIN_BYTES are gzipped for
+clients that accept it. Compression is off by default: API Gateway REST
+APIs only decode isBase64Encoded bodies for configured binary media types
+(HTTP APIs always do), so turn it on only once the API has them.
 """
+import base64
+import gzip
 import json
+from datetime import date, datetime
+from decimal import Decimal
 from typing import Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the function's requirements
+    orjson = None
+
+from shared.python.env_config import get_optional_env
+
+GZIP_RESPONSES = get_optional_env('GZIP_RESPONSES', 'false').lower() == 'true'
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+
+
+class _FrozenHeaders(dict):  # type: ignore[type-arg]
+    """A dict (so the runtime can serialize it) that refuses changes"""
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError('Shared response headers are read-only; copy them first')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _readonly  # type: ignore[assignment]
+
+    def __reduce__(self) -> Any:
+        # copy/deepcopy/pickle produce a plain, mutable dict
+        return (dict, (dict(self),))
+
+
+JSON_HEADERS = _FrozenHeaders({
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+})
+# Bodies that could have been compressed vary on Accept-Encoding either way
+VARY_JSON_HEADERS = _FrozenHeaders({
+    **JSON_HEADERS,
+    'Vary': 'Accept-Encoding'
+})
+GZIP_JSON_HEADERS = _FrozenHeaders({
+    **VARY_JSON_HEADERS,
+    'Content-Encoding': 'gzip'
+})
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+# Both backends write compact UTF-8 and send datetimes through _default,
+# so a body doesn't depend on which one is installed
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def to_json(data: Any) -> str:
+        """Serialize a response body"""
+        return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS).decode()
+else:
+    def to_json(data: Any) -> str:
+        """Serialize a response body"""
+        return json.dumps(data, default=_default, separators=(',', ':'), ensure_ascii=False)
+
+
+def _request_header(request: Dict[str, Any], name: str) -> str:
+    """Header value from a REST (any case) or HTTP API (lower case) event"""
+    headers = request.get('headers') or {}
+    value = headers.get(name) or headers.get(name.lower())
+    if value is None:
+        for key, candidate in headers.items():
+            if key.lower() == name.lower():
+                return candidate or ''
+    return value or ''
+
+
+def _accepts_gzip(request: Dict[str, Any]) -> bool:
+    for coding in _request_header(request, 'Accept-Encoding').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() == 'gzip':
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def json_response(
+        data: Any,
+        status_code: int = 200,
+        request: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    JSON response, negotiated against the request when one is given
+
+    Args:
+        data: Response body
+        status_code: HTTP status code
+        request: Lambda proxy event, for Accept-Encoding
+
+    Returns:
+        Formatted Lambda response
+    """
+    body = to_json(data)
+    encoded = body.encode()
+    response: Dict[str, Any] = {'statusCode': status_code}
+
+    compressible = GZIP_RESPONSES and request is not None and len(encoded) >= GZIP_MIN_BYTES
+
+    if compressible and _accepts_gzip(request):  # type: ignore[arg-type]
+        headers = GZIP_JSON_HEADERS
+        # mtime=0 keeps the output (and any cache keyed on it) deterministic
+        response['body'] = base64.b64encode(gzip.compress(encoded, GZIP_LEVEL, mtime=0)).decode()
+        response['isBase64Encoded'] = True
+    else:
+        headers = VARY_JSON_HEADERS if compressible else JSON_HEADERS
+        response['body'] = body
+
+    response['headers'] = headers
+    return response
+
+
 def success_response(
         data: Dict[str, Any],
-        status_code: int = 200
+        status_code: int = 200,
+        request: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """
     Standard success response
-    
+
     Args:
         data: Response data to return
         status_code: HTTP status code (default 200)
-    
+        request: Lambda proxy event, to enable compression
+
     Returns:
         Formatted Lambda response
     """
 
-    return {
-        'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps(data)
-    }
+    return json_response(data, status_code, request)
 
 def error_response(
         error_message: str,
@@ -35,12 +161,12 @@ def error_response(
 ) -> Dict[str, Any]:
     """
     Standard error response
-    
+
     Args:
         error_message: User-facing error message
         status_code: HTTP status code
         details: Optional technical details (for logging)
-    
+
     Returns:
         Formatted Lambda error response
     """
@@ -52,11 +178,8 @@ def error_response(
 
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps(body)
+        'headers': JSON_HEADERS,
+        'body': to_json(body)
     }
 
 def validation_error(error_message: str) -> Dict[str, Any]:
@@ -86,4 +209,4 @@ def conflict_error(error_message: str) -> Dict[str, Any]:
 
 def gone_error(error_message: str) -> Dict[str, Any]:
     """Gone (410) response - for expired resources"""
-    return error_response(error_message, 410)
\ No newline at end of file
+    return error_response(error_message, 410)
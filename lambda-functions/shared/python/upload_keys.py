@@ -0,0 +1,103 @@
+"""
+Raw upload key layout (and size limits) shared by generateUploadUrl,
+processImage and cleanupOldUploads
+
+Layouts:
+    flat:  uploads/{user_id}/{timestamp}.{ext}
+    dated: uploads/{yyyy}/{mm}/{dd}/{user_id}/{timestamp}.{ext}
+
+Keys issued together in one batch share a timestamp and get a -{n}
+sequence suffix ({timestamp}-{n}.{ext}).
+
+Both layouts are always accepted when parsing so keys written before a
+layout switch keep working during migration.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+UPLOAD_PREFIX = 'uploads/'
+LAYOUTS = ('flat', 'dated')
+# Largest single-request upload generateUploadUrl presigns
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+# Largest multipart upload (large camera originals) generateUploadUrl
+# presigns, and the largest source processImage accepts by default, so
+# nothing is uploaded only to be rejected
+MAX_MULTIPART_UPLOAD_BYTES = 50 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class UploadKey:
+    """Parsed raw upload key"""
+
+    user_id: str
+    filename: str
+    partition: Optional[date] = None
+
+
+def build_upload_key(
+        user_id: str,
+        extension: str,
+        now: datetime,
+        layout: str = 'flat',
+        sequence: Optional[int] = None
+) -> str:
+    """
+    Build the S3 key for a new raw upload
+
+    Args:
+        user_id: Uploading user
+        extension: File extension without dot
+        now: Upload time (UTC)
+        layout: 'flat' or 'dated'
+        sequence: Position within a batch, keeps same-second keys unique
+
+    Returns:
+        S3 object key
+
+    Raises:
+        ValueError: If layout is unknown
+    """
+    timestamp = now.strftime('%Y%m%d-%H%M%S')
+    if sequence is not None:
+        timestamp = f'{timestamp}-{sequence}'
+
+    if layout == 'flat':
+        return f'{UPLOAD_PREFIX}{user_id}/{timestamp}.{extension}'
+    if layout == 'dated':
+        return f'{UPLOAD_PREFIX}{now:%Y/%m/%d}/{user_id}/{timestamp}.{extension}'
+
+    raise ValueError(f'Invalid upload key layout: {layout}. Allowed: {", ".join(LAYOUTS)}')
+
+
+def parse_upload_key(key: str) -> Optional[UploadKey]:
+    """
+    Parse a raw upload key in either layout
+
+    Args:
+        key: S3 object key
+
+    Returns:
+        Parsed key, or None if it isn't a recognised upload key
+    """
+    if not key.startswith(UPLOAD_PREFIX):
+        return None
+
+    parts = key[len(UPLOAD_PREFIX):].split('/')
+
+    if len(parts) == 5 and all(part.isdigit() for part in parts[:3]):
+        try:
+            partition = date(int(parts[0]), int(parts[1]), int(parts[2]))
+        except ValueError:
+            return None
+        return UploadKey(user_id=parts[3], filename=parts[4], partition=partition)
+
+    if len(parts) == 2 and parts[0] and parts[1]:
+        return UploadKey(user_id=parts[0], filename=parts[1])
+
+    return None
+
+
+def is_partition_segment(segment: str, length: int) -> bool:
+    """True if a prefix segment is a numeric date partition (yyyy, mm or dd)"""
+    return len(segment) == length and segment.isdigit()
@@ -0,0 +1,167 @@
+"""
+Stateless signed email verification tokens
+
+Format: v1.{key_id}.{payload}.{signature}
+    payload:   base64url JSON {"u": userId, "e": email, "n": username,
+               "x": expiry (epoch seconds), "j": nonce}
+    signature: base64url HMAC-SHA256 over "v1.{key_id}.{payload}"
+
+The payload is signed, not encrypted: it only carries what the recipient
+already knows. Keys are configured as "kid:secret,kid:secret"; the first
+key signs, every listed key verifies, so a new key is rolled out by
+prepending it and the old one is dropped once its tokens have expired.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+TOKEN_VERSION = 'v1'
+NONCE_BYTES = 9
+
+
+class InvalidTokenError(ValueError):
+    """Token is malformed, signed with an unknown key or tampered with"""
+
+
+class ExpiredTokenError(InvalidTokenError):
+    """Token signature is valid but it has expired"""
+
+
+@dataclass(frozen=True)
+class SignedToken:
+    """Verified token claims"""
+
+    user_id: str
+    email: str
+    username: str
+    expires_at: int
+    nonce: str
+
+
+def is_signed_token(token: str) -> bool:
+    """True if token is in the signed format (table tokens have no dots)"""
+    return token.startswith(f'{TOKEN_VERSION}.')
+
+
+def parse_signing_keys(spec: Optional[str]) -> Dict[str, bytes]:
+    """
+    Parse "kid:secret,kid:secret" into an ordered {kid: secret} map
+
+    Raises:
+        ValueError: If an entry is malformed
+    """
+    keys: Dict[str, bytes] = {}
+
+    for entry in (spec or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        key_id, sep, secret = entry.partition(':')
+        if not sep or not key_id or not secret or '.' in key_id:
+            raise ValueError(f'Invalid signing key entry for key id: {key_id or "?"}')
+        keys[key_id] = secret.encode()
+
+    return keys
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(secret: bytes, message: str) -> str:
+    return _b64encode(hmac.new(secret, message.encode(), hashlib.sha256).digest())
+
+
+def issue_token(
+        keys: Dict[str, bytes],
+        user_id: str,
+        email: str,
+        username: str,
+        expires_at: int
+) -> str:
+    """
+    Sign a verification token with the active (first) key
+
+    Args:
+        keys: Signing keys from parse_signing_keys
+        user_id: User to verify
+        email: Address the token was sent to
+        username: For the welcome email
+        expires_at: Expiry in epoch seconds
+
+    Returns:
+        URL-safe token
+
+    Raises:
+        ValueError: If no signing key is configured
+    """
+    if not keys:
+        raise ValueError('No verification token signing key configured')
+
+    key_id, secret = next(iter(keys.items()))
+    claims = {
+        'u': user_id,
+        'e': email,
+        'n': username,
+        'x': expires_at,
+        'j': _b64encode(secrets.token_bytes(NONCE_BYTES))
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    message = f'{TOKEN_VERSION}.{key_id}.{payload}'
+
+    return f'{message}.{_sign(secret, message)}'
+
+
+def verify_token(keys: Dict[str, bytes], token: str, now: int) -> SignedToken:
+    """
+    Check a token's signature and expiry without any I/O
+
+    Args:
+        keys: Verification keys from parse_signing_keys
+        token: Token from the verification link
+        now: Current time in epoch seconds
+
+    Returns:
+        Verified claims
+
+    Raises:
+        ExpiredTokenError: If the signature is valid but the token expired
+        InvalidTokenError: If the token is malformed or the signature fails
+    """
+    parts = token.split('.')
+    if len(parts) != 4 or parts[0] != TOKEN_VERSION:
+        raise InvalidTokenError('Malformed token')
+
+    _, key_id, payload, signature = parts
+    secret = keys.get(key_id)
+    if secret is None:
+        raise InvalidTokenError(f'Unknown signing key: {key_id}')
+
+    expected = _sign(secret, f'{TOKEN_VERSION}.{key_id}.{payload}')
+    if not hmac.compare_digest(expected, signature):
+        raise InvalidTokenError('Bad signature')
+
+    try:
+        claims = json.loads(_b64decode(payload))
+        verified = SignedToken(
+            user_id=str(claims['u']),
+            email=str(claims['e']),
+            username=str(claims.get('n') or 'User'),
+            expires_at=int(claims['x']),
+            nonce=str(claims['j'])
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidTokenError(f'Bad payload: {e}') from e
+
+    if now > verified.expires_at:
+        raise ExpiredTokenError('Token expired')
+
+    return verified
@@ -1,11 +1,9 @@
+from __future__ import annotations
 from datetime import datetime, timezone
-from typing import Dict, Any
-import boto3
-import jwt
-from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
+from typing import Dict, Any, TYPE_CHECKING
 from botocore.exceptions import ClientError
-from pydantic import ValidationError
-from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource, Table
+if TYPE_CHECKING:
+    from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource, Table
 
 from shared.python.responses import (
     success_response,
@@ -16,15 +14,19 @@ from shared.python.responses import (
 )
 from shared.python.validation import parse_request_body
 from shared.python.env_config import get_optional_env
+from shared.python.aws_clients import lazy_resource
+from shared.python.lazy_imports import lazy_import
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+from shared.python.profiling import profiler
 
-from models import (
-    UpdateProfileRequest,
-    User,
-    TokenPayload,
-)
+# PyJWT and pydantic (through the models) load on first use, so requests
+# rejected before token verification never import them
+jwt = lazy_import("jwt")
+pydantic = lazy_import("pydantic")
+models = lazy_import("models")
 
-dynamodb: DynamoDBServiceResource = boto3.resource("dynamodb") # type: ignore
-table: Table = dynamodb.Table("Users")
+dynamodb: DynamoDBServiceResource = lazy_resource("dynamodb")
 
 JWT_SECRET = get_optional_env("JWT_SECRET", "dev-secret-change-in-production")
 
@@ -39,27 +41,31 @@ def extract_token(event: Dict[str, Any]) -> str:
     return auth_header.replace("Bearer ", "")
 
 
-def verify_token(token: str) -> TokenPayload:
+def verify_token(token: str) -> models.TokenPayload:
     """Verify JWT token and return decoded payload"""
     try:
         decoded = jwt.decode(token, JWT_SECRET, algorithms=["HS256"]) # type: ignore
-        return TokenPayload(**decoded)
-    except ExpiredSignatureError:
+        return models.TokenPayload(**decoded)
+    except jwt.ExpiredSignatureError:
         raise ValueError("Token expired")
-    except InvalidTokenError:
+    except jwt.InvalidTokenError:
         raise ValueError("Invalid token")
 
 
+@metrics.handler
+@logger.handler
+@profiler.handler
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    print("Event:", event)
+    logger.event(event)
     
     try:
-        token = extract_token(event)
-        token_payload = verify_token(token)
+        with metrics.phase("Auth"):
+            token = extract_token(event)
+            token_payload = verify_token(token)
     except ValueError as e:
         return unauthorized_error(str(e))
     except Exception as e:
-        print(f"Auth error: {str(e)}")
+        logger.error('Auth error: %s', e)
         return unauthorized_error("Authentication failed")
     
     path_params = event.get("pathParameters", {})
@@ -76,27 +82,29 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return validation_error("Invalid JSON")
     
     try:
-        update_request = UpdateProfileRequest(**body)
-    except ValidationError as e:
+        update_request = models.UpdateProfileRequest(**body)
+    except pydantic.ValidationError as e:
         return error_response("Validation failed", 400, str(e.errors()))
     
     # Update user profile in DynamoDB
     try:
-        response = table.update_item(
-            Key={"userId": user_id},
-            UpdateExpression="SET username = :username, updatedAt = :updatedAt",
-            ExpressionAttributeValues={
-                ":username": update_request.username,
-                ":updatedAt": datetime.now(timezone.utc).isoformat(),
-            },
-            ReturnValues="ALL_NEW",
-        )
+        table: Table = dynamodb.Table("Users")
+        with metrics.phase("ProfileUpdate"):
+            response = table.update_item(
+                Key={"userId": user_id},
+                UpdateExpression="SET username = :username, updatedAt = :updatedAt",
+                ExpressionAttributeValues={
+                    ":username": update_request.username,
+                    ":updatedAt": datetime.now(timezone.utc).isoformat(),
+                },
+                ReturnValues="ALL_NEW",
+            )
         
         updated_user_data = response.get("Attributes", {})
-        updated_user = User(**updated_user_data)  # type: ignore[arg-type]
+        updated_user = models.User(**updated_user_data)  # type: ignore[arg-type]
         
         user_dict = updated_user.model_dump(exclude={"passwordHash"})
-        user_response = User(**user_dict)
+        user_response = models.User(**user_dict)
         
         return success_response({
             "message": "Profile updated successfully",
@@ -104,11 +112,11 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         })
         
     except ClientError as e:
-        print(f"DynamoDB error: {str(e)}")
+        logger.error('DynamoDB error: %s', e)
         return error_response("Failed to update profile")
-    except ValidationError as e:
-        print(f"User model validation error: {str(e)}")
+    except pydantic.ValidationError as e:
+        logger.error('User model validation error: %s', e)
         return error_response("Invalid user data from database")
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.error('Error: %s', e)
         return error_response("Internal server error")
\ No newline at end of file
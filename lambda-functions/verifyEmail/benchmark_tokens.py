@@ -0,0 +1,62 @@
+"""
+Compare verification token lookup cost: signed tokens vs the tokens table
+
+Signed tokens are checked in memory. The table path needs a GetItem per
+click; pass --table to time real GetItem round-trips against a
+VerificationTokens table (a missing key is fine, latency is the same).
+Not packaged with the Lambda.
+
+Usage:
+    python benchmark_tokens.py [--runs 20000] [--table VerificationTokens --lookups 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from shared.python.verification_tokens import issue_token, parse_signing_keys, verify_token
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20_000)
+    parser.add_argument('--table', help='Also time GetItem against this DynamoDB table')
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    # Two keys, signing with the newest, as during a rotation
+    keys = parse_signing_keys('k2:new-secret-value,k1:old-secret-value')
+    expires_at = int(time.time()) + 86400
+    tokens = [
+        issue_token(keys, f'user-{i}', f'user{i}@example.com', f'user{i}', expires_at)
+        for i in range(100)
+    ]
+    now = int(time.time())
+
+    start = time.perf_counter()
+    for i in range(args.runs):
+        verify_token(keys, tokens[i % len(tokens)], now)
+    signed_us = (time.perf_counter() - start) / args.runs * 1_000_000
+
+    print(f'token length: {len(tokens[0])} chars')
+    print(f'signed verify:  {signed_us:8.1f} us/token  {1_000_000 / signed_us:10.0f} tokens/s per core')
+
+    if args.table:
+        import boto3
+
+        table = boto3.resource('dynamodb').Table(args.table)
+        table.get_item(Key={'token': 'warmup'})
+
+        start = time.perf_counter()
+        for i in range(args.lookups):
+            table.get_item(Key={'token': f'benchmark-missing-{i}'})
+        table_us = (time.perf_counter() - start) / args.lookups * 1_000_000
+
+        print(f'table GetItem:  {table_us:8.1f} us/token  {1_000_000 / table_us:10.0f} tokens/s per thread')
+        print(f'signed tokens are {table_us / signed_us:.0f}x cheaper to check')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
+from __future__ import annotations
+import time
 from datetime import datetime, timezone
-from typing import Dict, Any, cast
-import boto3
-from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource, Table
-from mypy_boto3_lambda import LambdaClient
+from typing import Dict, Any, List, Optional, Tuple, cast, TYPE_CHECKING
+from botocore.exceptions import ClientError
+if TYPE_CHECKING:
+    from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource, Table
+    from mypy_boto3_lambda import LambdaClient
+    from mypy_boto3_sqs import SQSClient
 import json
 
 from shared.python.responses import (
@@ -13,22 +17,52 @@ from shared.python.responses import (
     validation_error
 )
 from shared.python.env_config import get_optional_env
+from shared.python.aws_clients import lazy_client, lazy_resource
+from shared.python.email_templates import WELCOME_EMAIL
+from shared.python.email_outbox import enqueue_email
+from shared.python.verification_tokens import (
+    ExpiredTokenError,
+    InvalidTokenError,
+    is_signed_token,
+    parse_signing_keys,
+    verify_token
+)
+from shared.python.logger import logger
+from shared.python.metrics import metrics
+from shared.python.profiling import profiler
 
-dynamodb: DynamoDBServiceResource = boto3.resource('dynamodb')  # type: ignore
-lambda_client: LambdaClient = boto3.client('lambda')  # type: ignore
+dynamodb: DynamoDBServiceResource = lazy_resource('dynamodb')
+lambda_client: LambdaClient = lazy_client('lambda')
+sqs: SQSClient = lazy_client('sqs')
 
 USERS_TABLE = get_optional_env('USERS_TABLE', 'Users')
 VERIFICATION_TOKENS_TABLE = get_optional_env('VERIFICATION_TOKENS_TABLE', 'VerificationTokens')
 WELCOME_EMAIL_LAMBDA = get_optional_env('WELCOME_EMAIL_LAMBDA_ARN')
+# Outbox queue drained by sendQueuedEmails; takes precedence over invoking
+# the welcome email Lambda
+EMAIL_QUEUE_URL = get_optional_env('EMAIL_QUEUE_URL')
+# Same "kid:secret,..." list as sendVerificationEmail; keep retired keys
+# listed until the tokens they signed have expired
+VERIFICATION_TOKEN_KEYS = parse_signing_keys(get_optional_env('VERIFICATION_TOKEN_KEYS'))
+# Signed tokens leave a "used#{nonce}" marker in the tokens table, expired
+# by DynamoDB TTL on the "ttl" attribute
+USED_TOKEN_PREFIX = 'used#'
+# Per-user issuance rows written by sendVerificationEmail; removed on
+# verification so a later resend can't reuse a consumed token
+ISSUED_TOKEN_PREFIX = 'user#'
 
 
+@metrics.handler
+@logger.handler
+@profiler.handler
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Verifies email token and marks user as verified.
     Called when user clicks verification link from email.
     Idempotent: Safe to call multiple times with same token.
+    Accepts both table-backed tokens and stateless signed tokens (v1.*).
     """
-    print('Event:', event)
+    logger.event(event)
     
     query_params = event.get('queryStringParameters') or {}  # type: ignore
     token: str | None = query_params.get('token')  # type: ignore
@@ -36,16 +70,22 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     if not token:
         return validation_error('Verification token required')
     
-    tokens_table: Table = dynamodb.Table(VERIFICATION_TOKENS_TABLE)
-    users_table: Table = dynamodb.Table(USERS_TABLE)
+    if is_signed_token(token):
+        metrics.set_property('tokenType', 'signed')
+        return _verify_signed_token(token)
+    metrics.set_property('tokenType', 'table')
     
-    user: Dict[str, Any] = {}
+    if token.startswith((USED_TOKEN_PREFIX, ISSUED_TOKEN_PREFIX)):
+        return not_found_error('Invalid or expired verification token')
+    
+    tokens_table: Table = dynamodb.Table(VERIFICATION_TOKENS_TABLE)
     
     try:
-        response = tokens_table.get_item(Key={'token': token})  # type: ignore[arg-type]
+        with metrics.phase('TokenRead'):
+            response = tokens_table.get_item(Key={'token': token})  # type: ignore[arg-type]
         
         if 'Item' not in response:
-            print(f'Token not found: {token}')
+            logger.info('Token not found', token=token)
             
             # Token not found - check if this was already verified
             # (Idempotent behavior: don't fail if already successful)
@@ -56,11 +96,14 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         user_id = cast(str, token_data['userId'])
         email = cast(str, token_data['email'])
         expires_at = cast(str, token_data['expiresAt'])
+        # Stored on the token at issue time; tokens issued before that
+        # fall back to a user lookup when the welcome email is sent
+        username = cast(Optional[str], token_data.get('username'))
         
-        print(f'Token found for user: {user_id}')
+        logger.info('Token found for user: %s', user_id)
         
     except Exception as e:
-        print(f'DynamoDB get error: {str(e)}')
+        logger.error('DynamoDB get error: %s', e)
         return error_response('Failed to verify token')
     
     try:
@@ -68,74 +111,248 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         now = datetime.now(timezone.utc)
         
         if now > expires_at_dt:
-            print(f'Token expired: {token}')
+            logger.info('Token expired', token=token)
             tokens_table.delete_item(Key={'token': token})  # type: ignore[arg-type]
             return gone_error('Verification token expired. Please request a new one.')
             
     except Exception as e:
-        print(f'Date parsing error: {str(e)}')
+        logger.error('Date parsing error: %s', e)
     
+    # Mark the user verified and consume the token in one transaction.
+    # The user update only applies to an existing, unverified user and the
+    # token delete only to a token that is still there, so two concurrent
+    # clicks can't both succeed and the outcome is read off the conditions.
     try:
-        user_response = users_table.get_item(Key={'userId': user_id})  # type: ignore[arg-type]
-        user = user_response.get('Item', {})
+        with metrics.phase('UserUpdate'):
+            dynamodb.meta.client.transact_write_items(
+                TransactItems=[
+                    _verify_user_item(user_id),
+                    {
+                        'Delete': {
+                            'TableName': VERIFICATION_TOKENS_TABLE,
+                            'Key': {'token': {'S': token}},
+                            'ConditionExpression': 'attribute_exists(#token)',
+                            'ExpressionAttributeNames': {'#token': 'token'}
+                        }
+                    },
+                    _delete_issuance_item(user_id)
+                ]
+            )
+        logger.info('User verified and token deleted: %s', user_id)
+        
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+            logger.error('DynamoDB transaction error: %s', e)
+            return error_response('Failed to verify user')
+        
+        user_reason, token_reason = _cancellation_reasons(e)
         
-        if user.get('verified'):
-            print(f'User already verified (idempotent): {user_id}')
+        if user_reason.get('Code') == 'ConditionalCheckFailed':
+            if 'Item' not in user_reason:
+                logger.info('User not found for token: %s', user_id)
+                return not_found_error('Invalid or expired verification token')
+            
+            logger.info('User already verified (idempotent): %s', user_id)
             
             try:
                 tokens_table.delete_item(Key={'token': token})  # type: ignore[arg-type]
-                print(f'Token deleted (cleanup): {token}')
-            except Exception as e:
-                print(f'Token cleanup error: {str(e)}')
+                logger.info('Token deleted (cleanup)', token=token)
+            except Exception as cleanup_error:
+                logger.error('Token cleanup error: %s', cleanup_error)
             
             return success_response({
                 'message': 'Email already verified',
                 'userId': user_id
             })
-            
+        
+        if token_reason.get('Code') == 'ConditionalCheckFailed':
+            # A concurrent click consumed the token and verified the user
+            logger.info('Token already consumed (idempotent): %s', user_id)
+            return success_response({
+                'message': 'Email already verified',
+                'userId': user_id
+            })
+        
+        logger.info('DynamoDB transaction cancelled: %s %s', user_reason, token_reason)
+        return error_response('Failed to verify user')
+    
     except Exception as e:
-        print(f'User lookup error: {str(e)}')
+        logger.error('DynamoDB transaction error: %s', e)
+        return error_response('Failed to verify user')
     
+    with metrics.phase('WelcomeEmail'):
+        _send_welcome_email(user_id, email, username)
+    
+    return success_response({
+        'message': 'Email verified successfully',
+        'userId': user_id
+    })
+
+
+def _verify_signed_token(token: str) -> Dict[str, Any]:
+    """
+    Signed-token path: signature and expiry are checked in memory, then the
+    user is marked verified together with a single-use marker for the
+    token's nonce. No reads at all; the marker expires with the token.
+    """
     try:
-        users_table.update_item(
-            Key={'userId': user_id},  # type: ignore[arg-type]
-            UpdateExpression='SET verified = :verified, updatedAt = :updatedAt',
-            ExpressionAttributeValues={
-                ':verified': True,
-                ':updatedAt': datetime.now(timezone.utc).isoformat()
-            }
-        )
-        print(f'User verified: {user_id}')
+        with metrics.phase('TokenRead'):
+            claims = verify_token(VERIFICATION_TOKEN_KEYS, token, int(time.time()))
+    except ExpiredTokenError:
+        logger.info('Signed token expired')
+        return gone_error('Verification token expired. Please request a new one.')
+    except InvalidTokenError as e:
+        logger.info('Signed token rejected: %s', e)
+        return not_found_error('Invalid or expired verification token')
+    
+    logger.info('Signed token valid for user: %s', claims.user_id)
+    
+    try:
+        with metrics.phase('UserUpdate'):
+            dynamodb.meta.client.transact_write_items(
+                TransactItems=[
+                    _verify_user_item(claims.user_id, claims.email),
+                    {
+                        'Put': {
+                            'TableName': VERIFICATION_TOKENS_TABLE,
+                            'Item': {
+                                'token': {'S': f'{USED_TOKEN_PREFIX}{claims.nonce}'},
+                                'userId': {'S': claims.user_id},
+                                'ttl': {'N': str(claims.expires_at)}
+                            },
+                            'ConditionExpression': 'attribute_not_exists(#token)',
+                            'ExpressionAttributeNames': {'#token': 'token'}
+                        }
+                    },
+                    _delete_issuance_item(claims.user_id)
+                ]
+            )
+        logger.info('User verified with signed token: %s', claims.user_id)
         
-    except Exception as e:
-        print(f'DynamoDB update error: {str(e)}')
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+            logger.error('DynamoDB transaction error: %s', e)
+            return error_response('Failed to verify user')
+        
+        user_reason, marker_reason = _cancellation_reasons(e)
+        
+        if user_reason.get('Code') == 'ConditionalCheckFailed':
+            user = user_reason.get('Item')
+            if not user:
+                logger.info('User not found for token: %s', claims.user_id)
+                return not_found_error('Invalid or expired verification token')
+            if not user.get('verified', {}).get('BOOL'):
+                # Email changed since the token was issued
+                logger.info('Token email no longer matches user: %s', claims.user_id)
+                return not_found_error('Invalid or expired verification token')
+            
+            logger.info('User already verified (idempotent): %s', claims.user_id)
+            return success_response({
+                'message': 'Email already verified',
+                'userId': claims.user_id
+            })
+        
+        if marker_reason.get('Code') == 'ConditionalCheckFailed':
+            logger.info('Token already used (idempotent): %s', claims.user_id)
+            return success_response({
+                'message': 'Email already verified',
+                'userId': claims.user_id
+            })
+        
+        logger.info('DynamoDB transaction cancelled: %s %s', user_reason, marker_reason)
         return error_response('Failed to verify user')
     
-    try:
-        tokens_table.delete_item(Key={'token': token})  # type: ignore[arg-type]
-        print(f'Token deleted: {token}')
     except Exception as e:
-        print(f'Token deletion error: {str(e)}')
+        logger.error('DynamoDB transaction error: %s', e)
+        return error_response('Failed to verify user')
     
-    if WELCOME_EMAIL_LAMBDA:
-        try:
-            username = user.get('username', 'User')  # Already fetched above
-            
-            lambda_client.invoke(
-                FunctionName=WELCOME_EMAIL_LAMBDA,
-                InvocationType='Event',
-                Payload=json.dumps({
-                    'body': json.dumps({
-                        'email': email,
-                        'username': username
-                    })
-                })
-            )
-            print(f'Welcome email Lambda invoked for: {email}')
-        except Exception as e:
-            print(f'Welcome email error: {str(e)}')
+    with metrics.phase('WelcomeEmail'):
+        _send_welcome_email(claims.user_id, claims.email, claims.username)
     
     return success_response({
         'message': 'Email verified successfully',
-        'userId': user_id
+        'userId': claims.user_id
     })
+
+
+def _verify_user_item(user_id: str, email: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Transaction item that marks an existing, unverified user verified.
+    With email, the user's current address must also match. Returns the
+    old item on condition failure so the caller can tell why.
+    """
+    condition = 'attribute_exists(userId) AND NOT verified = :verified'
+    values: Dict[str, Any] = {
+        ':verified': {'BOOL': True},
+        ':updatedAt': {'S': datetime.now(timezone.utc).isoformat()}
+    }
+    if email is not None:
+        condition += ' AND email = :email'
+        values[':email'] = {'S': email}
+    
+    return {
+        'Update': {
+            'TableName': USERS_TABLE,
+            'Key': {'userId': {'S': user_id}},
+            'UpdateExpression': 'SET verified = :verified, updatedAt = :updatedAt',
+            'ConditionExpression': condition,
+            'ExpressionAttributeValues': values,
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        }
+    }
+
+
+def _delete_issuance_item(user_id: str) -> Dict[str, Any]:
+    """Unconditional transaction item removing the user's issuance row"""
+    return {
+        'Delete': {
+            'TableName': VERIFICATION_TOKENS_TABLE,
+            'Key': {'token': {'S': f'{ISSUED_TOKEN_PREFIX}{user_id}'}}
+        }
+    }
+
+
+def _send_welcome_email(user_id: str, email: str, username: Optional[str]) -> None:
+    """Fire-and-forget welcome email; failures are logged only"""
+    if not EMAIL_QUEUE_URL and not WELCOME_EMAIL_LAMBDA:
+        return
+    
+    try:
+        if username is None:
+            username = _lookup_username(user_id)
+        
+        if EMAIL_QUEUE_URL:
+            message_id = enqueue_email(sqs, EMAIL_QUEUE_URL, WELCOME_EMAIL, email, {'username': username})
+            logger.info('Welcome email queued for: %s (%s)', email, message_id)
+            return
+        
+        lambda_client.invoke(
+            FunctionName=WELCOME_EMAIL_LAMBDA,
+            InvocationType='Event',
+            Payload=json.dumps({
+                'body': json.dumps({
+                    'email': email,
+                    'username': username
+                })
+            })
+        )
+        logger.info('Welcome email Lambda invoked for: %s', email)
+    except Exception as e:
+        logger.error('Welcome email error: %s', e)
+
+
+def _cancellation_reasons(error: ClientError) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(user update, token write) cancellation reasons of a cancelled transaction"""
+    reasons: List[Dict[str, Any]] = list(error.response.get('CancellationReasons', []))  # type: ignore[arg-type]
+    reasons += [{}] * (2 - len(reasons))
+    return reasons[0], reasons[1]
+
+
+def _lookup_username(user_id: str) -> str:
+    """Username for tokens issued before usernames were stored on the token"""
+    users_table: Table = dynamodb.Table(USERS_TABLE)
+    response = users_table.get_item(
+        Key={'userId': user_id},  # type: ignore[arg-type]
+        ProjectionExpression='username'
+    )
+    return cast(str, response.get('Item', {}).get('username', 'User'))